@@ -0,0 +1 @@
+# Chat module
@@ -0,0 +1,215 @@
+"""
+Hub du chat temps réel
+
+- Diffusion en mémoire aux WebSockets de l'événement connectées à ce worker
+  (une file d'envoi par connexion : un client lent ne ralentit pas les autres)
+- Diffusion aux autres workers / réplicas via le bus core.pubsub
+  (Postgres LISTEN/NOTIFY)
+- Enregistrement des messages par lots (un INSERT pour tous les messages
+  reçus pendant CHAT_FLUSH_INTERVAL)
+
+Variables d'environnement :
+    CHAT_FLUSH_INTERVAL : délai max avant enregistrement, en secondes (défaut 0.5)
+"""
+import os
+import json
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set
+from uuid import UUID
+
+from fastapi import WebSocket
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+
+from core.pubsub import pubsub
+
+logger = logging.getLogger(__name__)
+
+# Sujet des messages du chat sur le bus pub/sub
+PUBSUB_TOPIC = "chat"
+MAX_MESSAGE_LENGTH = 1000
+# Messages en attente d'envoi par connexion ; au-delà, le client est déconnecté
+SEND_QUEUE_SIZE = 200
+# Taille de lot qui déclenche un enregistrement immédiat
+FLUSH_BATCH_SIZE = 200
+# Messages gardés en mémoire si la base est indisponible
+MAX_PENDING_MESSAGES = 10000
+
+
+class ChatConnection:
+    """Une WebSocket connectée et sa file d'envoi"""
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.writer = asyncio.create_task(self._write())
+
+    async def _write(self):
+        try:
+            while True:
+                text = await self.queue.get()
+                if text is None:
+                    break
+                await self.websocket.send_text(text)
+        except Exception:
+            # Connexion fermée : la boucle de réception s'en apercevra
+            pass
+
+    def send(self, text: str) -> bool:
+        """Ajoute un message à la file ; False si le client ne suit pas"""
+        try:
+            self.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self):
+        self.writer.cancel()
+
+
+class ChatHub:
+    """Salons de chat par événement pour ce worker"""
+
+    def __init__(self):
+        self._rooms: Dict[UUID, Set[ChatConnection]] = {}
+        self._pending: List[Dict] = []
+        self._flush_wakeup: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self.stats = {"messages": 0, "persisted": 0, "slow_disconnects": 0}
+
+    # --- Cycle de vie ---
+
+    def _ensure_started(self):
+        """Démarre les tâches de fond au premier usage (dans la boucle asyncio)"""
+        if self._flush_task is None:
+            self._flush_wakeup = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Arrête l'enregistrement par lots et enregistre les messages en attente"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    # --- Connexions ---
+
+    def join(self, event_id: UUID, websocket: WebSocket) -> ChatConnection:
+        self._ensure_started()
+        connection = ChatConnection(websocket)
+        room = self._rooms.setdefault(event_id, set())
+        if not room:
+            pubsub.subscribe(event_id, self._on_message)
+        room.add(connection)
+        return connection
+
+    def leave(self, event_id: UUID, connection: ChatConnection):
+        connection.close()
+        room = self._rooms.get(event_id)
+        if room is not None and connection in room:
+            room.discard(connection)
+            if not room:
+                del self._rooms[event_id]
+                pubsub.unsubscribe(event_id, self._on_message)
+
+    def connection_count(self) -> int:
+        return sum(len(room) for room in self._rooms.values())
+
+    def _on_message(self, topic: str, data: Dict):
+        """Message du bus (ce worker ou un autre) : envoi aux connexions locales"""
+        if topic != PUBSUB_TOPIC:
+            return
+        event_id = UUID(data["event_id"])
+        text = json.dumps({"type": "message", **data}, ensure_ascii=False)
+        for connection in list(self._rooms.get(event_id, ())):
+            if not connection.send(text):
+                self.stats["slow_disconnects"] += 1
+                logger.warning(f"Chat client too slow for event {event_id}, disconnecting")
+                self.leave(event_id, connection)
+                asyncio.create_task(connection.websocket.close(code=1008))
+
+    # --- Messages ---
+
+    async def post(self, event_id: UUID, sender_name: str, message: str) -> Dict:
+        """
+        Publie un message sur le bus (connexions locales immédiatement,
+        autres workers via NOTIFY) ; l'enregistrement en base suit par lot.
+        """
+        self._ensure_started()
+        data = {
+            "id": str(uuid.uuid4()),
+            "event_id": str(event_id),
+            "sender_name": sender_name,
+            "message": message[:MAX_MESSAGE_LENGTH],
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.stats["messages"] += 1
+
+        pubsub.publish(event_id, PUBSUB_TOPIC, data)
+
+        if len(self._pending) < MAX_PENDING_MESSAGES:
+            self._pending.append(data)
+        else:
+            logger.error("Chat persistence backlog full, message not saved")
+        if len(self._pending) >= FLUSH_BATCH_SIZE:
+            self._flush_wakeup.set()
+
+        return data
+
+    # --- Enregistrement par lots ---
+
+    async def _flush_loop(self):
+        interval = float(os.environ.get("CHAT_FLUSH_INTERVAL", 0.5))
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Enregistre les messages en attente (un seul INSERT)"""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        try:
+            await run_in_threadpool(_insert_messages, batch)
+            self.stats["persisted"] += len(batch)
+        except IntegrityError as e:
+            # Événement supprimé entre-temps : le lot ne passera jamais
+            logger.error(f"Chat batch dropped ({len(batch)} messages): {e}")
+        except Exception as e:
+            logger.error(f"Chat persistence failed ({len(batch)} messages): {e}")
+            # Réessayé au prochain lot
+            self._pending = (batch + self._pending)[:MAX_PENDING_MESSAGES]
+
+
+def _insert_messages(batch: List[Dict]):
+    """INSERT groupé des messages (session dédiée, hors requête)"""
+    from sqlalchemy import insert
+    from core.database import SessionLocal
+    from core.models import ChatMessage
+
+    rows = [
+        {
+            "id": UUID(data["id"]),
+            "event_id": UUID(data["event_id"]),
+            "sender_name": data["sender_name"],
+            "message": data["message"],
+            "created_at": datetime.fromisoformat(data["created_at"]),
+        }
+        for data in batch
+    ]
+    db = SessionLocal()
+    try:
+        db.execute(insert(ChatMessage), rows)
+        db.commit()
+    finally:
+        db.close()
+
+
+hub = ChatHub()
@@ -0,0 +1,167 @@
+"""
+Routes pour le chat des invités
+
+- WS   /ws/events/{id}/chat?name=...  : connexion temps réel
+- POST /api/events/{id}/chat          : envoyer un message (sans WebSocket)
+- GET  /api/events/{id}/chat          : historique paginé par curseur
+"""
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from core.database import get_db, SessionLocal
+from core.models import Event, ChatMessage
+from core.schemas import ChatMessageCreate, ChatMessageResponse, ChatHistoryResponse
+from .hub import hub, MAX_MESSAGE_LENGTH
+
+router = APIRouter()
+ws_router = APIRouter()
+
+
+def _get_chat_event(event_id: UUID, db: Session) -> Event:
+    """Charge l'événement et vérifie que le chat est activé"""
+    event = db.query(Event).filter(Event.id == event_id).first()
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    chat_config = event.config.get('modules', {}).get('chat', {})
+    if not chat_config.get('enabled', False):
+        raise HTTPException(status_code=403, detail="Chat module is not enabled")
+
+    return event
+
+
+def _check_chat_enabled(event_id: UUID) -> Optional[HTTPException]:
+    """Même vérification, hors requête HTTP (connexion WebSocket)"""
+    db = SessionLocal()
+    try:
+        _get_chat_event(event_id, db)
+        return None
+    except HTTPException as e:
+        return e
+    finally:
+        db.close()
+
+
+# Curseur "<microsecondes depuis l'epoch>_<id>" : sans caractère à échapper dans l'URL
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _encode_cursor(message: ChatMessage) -> str:
+    created_at = message.created_at
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return f"{(created_at - _EPOCH) // timedelta(microseconds=1)}_{message.id}"
+
+
+def _decode_cursor(cursor: str):
+    try:
+        micros, message_id = cursor.split("_", 1)
+        return _EPOCH + timedelta(microseconds=int(micros)), UUID(message_id)
+    except (ValueError, OverflowError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@ws_router.websocket("/ws/events/{event_id}/chat")
+async def chat_websocket(
+    websocket: WebSocket,
+    event_id: UUID,
+    name: str = Query(..., min_length=1, max_length=200)
+):
+    """
+    Chat temps réel (depuis l'app mobile)
+
+    Le client envoie {"message": "..."} (ou du texte brut) et reçoit
+    {"type": "message", id, event_id, sender_name, message, created_at}
+    pour chaque message de l'événement, y compris les siens.
+
+    Événement introuvable ou chat désactivé : la connexion est acceptée
+    puis fermée avec le code 4000 + code HTTP (4404, 4403) et le détail.
+    """
+    error = await run_in_threadpool(_check_chat_enabled, event_id)
+
+    # Accepter avant de fermer : une fermeture avant accept() est une
+    # réponse HTTP 403 et le client ne verrait ni le code ni la raison
+    await websocket.accept()
+    if error:
+        # Codes 4xxx : erreurs applicatives (4000 + code HTTP)
+        await websocket.close(code=4000 + error.status_code, reason=error.detail)
+        return
+
+    connection = hub.join(event_id, websocket)
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                data = json.loads(raw)
+                text = data.get("message", "") if isinstance(data, dict) else str(data)
+            except ValueError:
+                text = raw
+            if not isinstance(text, str):
+                connection.send(json.dumps({
+                    "type": "error",
+                    "detail": "Le message doit être du texte"
+                }))
+                continue
+            text = text.strip()
+            if not text:
+                continue
+            if len(text) > MAX_MESSAGE_LENGTH:
+                connection.send(json.dumps({
+                    "type": "error",
+                    "detail": f"Message trop long ({MAX_MESSAGE_LENGTH} caractères max)"
+                }))
+                continue
+            await hub.post(event_id, name, text)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.leave(event_id, connection)
+
+
+@router.post("/{event_id}/chat", response_model=ChatMessageResponse, status_code=201)
+async def send_chat_message(
+    event_id: UUID,
+    message_data: ChatMessageCreate,
+    db: Session = Depends(get_db)
+):
+    """Envoyer un message sans WebSocket (diffusé aux clients connectés)"""
+    _get_chat_event(event_id, db)
+    return await hub.post(event_id, message_data.sender_name, message_data.message)
+
+
+@router.get("/{event_id}/chat", response_model=ChatHistoryResponse)
+async def list_chat_messages(
+    event_id: UUID,
+    before: Optional[str] = Query(None, description="Curseur next_cursor de la page précédente"),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """
+    Historique du chat, du plus récent au plus ancien
+
+    Pagination par curseur (created_at, id) : stable même quand de
+    nouveaux messages arrivent pendant le défilement.
+    """
+    _get_chat_event(event_id, db)
+
+    query = db.query(ChatMessage).filter(ChatMessage.event_id == event_id)
+    if before:
+        created_at, message_id = _decode_cursor(before)
+        query = query.filter(
+            tuple_(ChatMessage.created_at, ChatMessage.id) < tuple_(created_at, message_id)
+        )
+
+    messages = query.order_by(
+        ChatMessage.created_at.desc(), ChatMessage.id.desc()
+    ).limit(limit).all()
+
+    return ChatHistoryResponse(
+        messages=messages,
+        next_cursor=_encode_cursor(messages[-1]) if len(messages) == limit else None
+    )
@@ -91,6 +91,7 @@ from playlist.routes import router as playlist_router
 from sub_events.routes import router as sub_events_router
 from groups.routes import router as groups_router
 from uploads.routes import router as uploads_router
+from chat.routes import router as chat_router, ws_router as chat_ws_router
 
 
 # Créer les tables au démarrage
@@ -110,12 +111,46 @@ async def create_tables():
         
         engine = create_engine(db_url)
         Base.metadata.create_all(bind=engine)
+
+        # Colonnes et index ajoutés aux tables existantes (idempotent)
+        upgrade_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db", "upgrade.sql")
+        with open(upgrade_path) as f, engine.begin() as connection:
+            connection.exec_driver_sql(f.read())
         print("✅ Database tables created/verified")
     except Exception as e:
         print(f"⚠️ Database table creation error: {e}")
         # Ne pas bloquer le démarrage
 
 
+@app.on_event("startup")
+async def start_pubsub():
+    """Connexion LISTEN/NOTIFY du worker (temps réel entre workers)"""
+    from core.pubsub import pubsub
+    pubsub.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    """Arrête les workers d'arrière-plan"""
+    from photos.processing import shutdown as shutdown_photo_processing
+    from notifications.dispatcher import shutdown as shutdown_notification_dispatch
+    from core.storage import get_storage
+    from core.pubsub import pubsub
+    from chat.hub import hub as chat_hub
+    from notifications.opens import open_counter
+    from notifications.subscriptions import topic_batcher
+    shutdown_photo_processing()
+    shutdown_notification_dispatch()
+    get_storage().shutdown()
+    # Enregistre les derniers messages du chat
+    await chat_hub.stop()
+    # Enregistre les dernières ouvertures de notifications
+    await open_counter.stop()
+    # Envoie les derniers abonnements aux topics
+    await topic_batcher.stop()
+    await pubsub.stop()
+
+
 # Enregistrement des routes
 app.include_router(events_router, prefix="/api/events", tags=["events"])
 app.include_router(seating_router, prefix="/api/events", tags=["seating"])
@@ -128,3 +163,18 @@ app.include_router(playlist_router, prefix="/api/events", tags=["playlist"])
 app.include_router(sub_events_router, prefix="/api/events", tags=["sub-events"])
 app.include_router(groups_router, prefix="/api/events", tags=["invitation-groups"])
 app.include_router(uploads_router, prefix="/api", tags=["uploads"])
+app.include_router(chat_router, prefix="/api/events", tags=["chat"])
+app.include_router(chat_ws_router, tags=["chat"])
+
+
+# Fichiers médias servis directement en stockage local (dev / tests).
+# Backend résolu au démarrage : importer l'app (scripts, outils) ne le configure pas.
+@app.on_event("startup")
+async def mount_local_media():
+    from fastapi.staticfiles import StaticFiles
+    from core.storage import get_storage, LocalStorage
+    
+    storage = get_storage()
+    if isinstance(storage, LocalStorage):
+        os.makedirs(storage.root, exist_ok=True)
+        app.mount("/media", StaticFiles(directory=storage.root), name="media")
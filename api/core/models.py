@@ -101,8 +101,15 @@ class Photo(Base):
     uploaded_by = Column(String(200))  # nom de l'invité
     url = Column(String(500), nullable=False)
     thumbnail_url = Column(String(500))
+    storage_key = Column(String(500))  # clé dans le backend de stockage (local / Cloudinary)
+    variants = Column(JSONB)  # {"thumb": {"width", "height", "webp": {...}, "jpeg": {...}}, ...}
+    content_hash = Column(String(64))  # SHA-256 du fichier original (dédoublonnage)
+    width = Column(Integer)  # dimensions affichées (orientation EXIF comprise)
+    height = Column(Integer)
+    placeholder = Column(Text)  # aperçu flou (data URI WebP, ~300 octets)
     caption = Column(Text)
     approved = Column(Boolean, default=True)
+    published_at = Column(DateTime(timezone=True))  # date d'approbation (curseur du flux de la galerie)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relation
@@ -110,6 +117,8 @@ class Photo(Base):
 
     __table_args__ = (
         Index('idx_photos_event', 'event_id'),
+        Index('idx_photos_event_hash', 'event_id', 'content_hash', unique=True),
+        Index('idx_photos_event_published', 'event_id', 'published_at'),
     )
 
 
@@ -167,7 +176,11 @@ class PushNotification(Base):
     message = Column(Text, nullable=False)
     scheduled_at = Column(DateTime(timezone=True))
     sent_at = Column(DateTime(timezone=True))
-    status = Column(String(20), default='draft')  # draft, scheduled, sent, failed
+    status = Column(String(20), default='draft')  # draft, scheduled, queued, retrying, sent, failed, dead
+    attempts = Column(Integer, nullable=False, default=0)  # envois tentés
+    next_attempt_at = Column(DateTime(timezone=True))  # prochain essai (statut retrying)
+    last_error = Column(Text)
+    retry_tokens = Column(JSONB(none_as_null=True))  # tokens à renvoyer au prochain essai (null = toute la cible)
     opened_count = Column(Integer, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -177,6 +190,7 @@ class PushNotification(Base):
 
     __table_args__ = (
         Index('idx_notifications_event', 'event_id'),
+        Index('idx_notifications_status_next_attempt', 'status', 'next_attempt_at'),
     )
 
 
@@ -215,9 +229,49 @@ class ChatMessage(Base):
 
     __table_args__ = (
         Index('idx_chat_event', 'event_id'),
+        Index('idx_chat_event_created', 'event_id', 'created_at'),
     )
 
 
+class GuestQuotaCounter(Base):
+    """Compteurs d'envois par invité (quotas photos / suggestions sans COUNT)"""
+    __tablename__ = "guest_quota_counters"
+
+    event_id = Column(UUID(as_uuid=True), ForeignKey("events.id", ondelete="CASCADE"), primary_key=True)
+    kind = Column(String(30), primary_key=True)  # photos, playlist
+    guest = Column(String(200), primary_key=True)  # uploaded_by / guest_name
+    used = Column(Integer, nullable=False, default=0)
+
+
+class DeviceToken(Base):
+    """Appareils abonnés aux notifications (token FCM), rattachés à l'invité si connu"""
+    __tablename__ = "device_tokens"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    event_id = Column(UUID(as_uuid=True), ForeignKey("events.id", ondelete="CASCADE"), nullable=False)
+    guest_id = Column(UUID(as_uuid=True), ForeignKey("guests.id", ondelete="SET NULL"), nullable=True)
+    token = Column(String(500), nullable=False)
+    platform = Column(String(20))  # ios, android
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    guest = relationship("Guest")
+
+    __table_args__ = (
+        Index('idx_device_tokens_event_token', 'event_id', 'token', unique=True),
+        Index('idx_device_tokens_guest', 'guest_id'),
+    )
+
+
+class NotificationOpen(Base):
+    """Ouvertures de notifications : un appareil n'est compté qu'une fois par notification"""
+    __tablename__ = "notification_opens"
+
+    notification_id = Column(UUID(as_uuid=True), ForeignKey("push_notifications.id", ondelete="CASCADE"), primary_key=True)
+    token = Column(String(500), primary_key=True)  # token FCM de l'appareil
+    opened_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 # ============================================================================
 # NOUVEAUX MODÈLES POUR LE MARIAGE - GROUPES D'INVITATION
 # ============================================================================
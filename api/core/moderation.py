@@ -0,0 +1,35 @@
+"""
+Modération groupée - sélection commune aux photos et au livre d'or
+"""
+from uuid import UUID
+from fastapi import HTTPException
+
+from core.schemas import BulkModerationRequest
+
+
+def moderation_filters(model, event_id: UUID, data: BulkModerationRequest) -> list:
+    """
+    Conditions WHERE d'une modération groupée : liste d'ids et/ou
+    éléments en attente créés avant pending_before (les deux se cumulent).
+
+    Les conditions liées à l'action (ex. approved == False pour approve)
+    sont ajoutées par l'appelant.
+
+    reject masque des éléments approuvés : il ne s'applique pas aux
+    éléments en attente (déjà masqués), qui se vident avec delete.
+    """
+    if not data.ids and data.pending_before is None:
+        raise HTTPException(status_code=400, detail="Provide ids or pending_before")
+    if data.action == "reject" and data.pending_before is not None:
+        raise HTTPException(
+            status_code=400,
+            detail="Pending items are already hidden: use delete with pending_before"
+        )
+
+    filters = [model.event_id == event_id]
+    if data.ids:
+        filters.append(model.id.in_(data.ids))
+    if data.pending_before is not None:
+        filters.append(model.approved == False)
+        filters.append(model.created_at < data.pending_before)
+    return filters
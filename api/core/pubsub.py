@@ -0,0 +1,211 @@
+"""
+Bus pub/sub entre workers, sur Postgres LISTEN/NOTIFY
+
+Les fonctionnalités temps réel (chat, flux de la galerie...) publient des
+messages par événement ; chaque worker reçoit ceux des événements pour
+lesquels il a des abonnés locaux :
+
+- un canal Postgres par événement (LISTEN à la première souscription
+  locale, UNLISTEN à la dernière) ; les messages qui ne concernent pas un
+  événement utilisent un canal nommé (clé str au lieu de l'UUID)
+- une seule connexion asyncpg par worker, rétablie automatiquement
+- les abonnés locaux sont appelés directement à la publication ; l'écho
+  NOTIFY du worker émetteur est ignoré
+
+Sans asyncpg (ou sans base joignable), la diffusion reste locale au worker.
+
+Usage :
+    pubsub.subscribe(event_id, handler)      # handler(topic, data), dans la boucle asyncio
+    pubsub.publish(event_id, "chat", {...})  # local immédiat + autres workers
+    pubsub.unsubscribe(event_id, handler)
+"""
+import json
+import uuid
+import asyncio
+import logging
+from typing import Callable, Dict, Optional, Set, Union
+from uuid import UUID
+
+logger = logging.getLogger(__name__)
+
+# Taille max d'un payload NOTIFY (limite Postgres : 8000 octets)
+MAX_PAYLOAD_BYTES = 7900
+RECONNECT_DELAY_SECONDS = 5
+# Attente max de la connexion avant d'abandonner un NOTIFY / LISTEN
+CONNECT_WAIT_SECONDS = 2
+
+Handler = Callable[[str, Dict], None]
+# UUID d'un événement, ou nom d'un canal partagé
+Key = Union[UUID, str]
+
+
+def channel_name(key: Key) -> str:
+    """Canal Postgres d'un événement (ou d'un canal nommé)"""
+    if isinstance(key, UUID):
+        return f"oninvite_{key.hex}"
+    return f"oninvite_{key}"
+
+
+class PubSub:
+    """Abonnements locaux et connexion LISTEN/NOTIFY du worker"""
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self._handlers: Dict[Key, Set[Handler]] = {}
+        self._channel_keys: Dict[str, Key] = {}
+        self._conn = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending = set()
+        self.stats = {"published": 0, "received": 0, "dropped": 0}
+
+    # --- Abonnements ---
+
+    def subscribe(self, key: Key, handler: Handler):
+        """Abonne handler aux messages de l'événement (tous workers)"""
+        self._ensure_started()
+        handlers = self._handlers.setdefault(key, set())
+        first = not handlers
+        handlers.add(handler)
+        if first:
+            self._channel_keys[channel_name(key)] = key
+            self._background(self._listen(key))
+
+    def unsubscribe(self, key: Key, handler: Handler):
+        handlers = self._handlers.get(key)
+        if handlers is None:
+            return
+        handlers.discard(handler)
+        if not handlers:
+            del self._handlers[key]
+            self._channel_keys.pop(channel_name(key), None)
+            self._background(self._unlisten(key))
+
+    # --- Publication ---
+
+    def publish(self, key: Key, topic: str, data: Dict):
+        """
+        Publie un message : abonnés locaux appelés immédiatement,
+        autres workers notifiés en arrière-plan.
+        """
+        self._ensure_started()
+        self.stats["published"] += 1
+        self._dispatch(key, topic, data)
+
+        payload = json.dumps({"o": self.worker_id, "t": topic, "d": data}, ensure_ascii=False)
+        if len(payload.encode()) > MAX_PAYLOAD_BYTES:
+            self.stats["dropped"] += 1
+            logger.warning(f"Pub/sub payload too large for NOTIFY ({topic}), delivered locally only")
+            return
+        self._background(self._notify(channel_name(key), payload))
+
+    def _dispatch(self, key: Key, topic: str, data: Dict):
+        for handler in list(self._handlers.get(key, ())):
+            try:
+                handler(topic, data)
+            except Exception as e:
+                logger.error(f"Pub/sub handler error ({topic}): {e}")
+
+    # --- Connexion Postgres ---
+
+    def start(self):
+        """Ouvre la connexion d'écoute (au démarrage de l'API, dans la boucle asyncio)"""
+        if self._task is None:
+            self._lock = asyncio.Lock()
+            self._ready = asyncio.Event()
+            self._task = asyncio.create_task(self._connection_loop())
+
+    # Démarrage au premier usage si start() n'a pas été appelé
+    _ensure_started = start
+
+    def _background(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _call(self, method: str, *args):
+        if self._conn is None:
+            try:
+                await asyncio.wait_for(self._ready.wait(), CONNECT_WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        # Une connexion asyncpg n'accepte qu'une opération à la fois
+        async with self._lock:
+            if self._conn is None:
+                return  # LISTEN refaits à la reconnexion ; NOTIFY perdu (local uniquement)
+            try:
+                await getattr(self._conn, method)(*args)
+            except Exception as e:
+                logger.warning(f"Pub/sub {method} failed: {e}")
+
+    async def _notify(self, channel: str, payload: str):
+        await self._call("execute", "SELECT pg_notify($1, $2)", channel, payload)
+
+    async def _listen(self, key: Key):
+        # add_listener exécute LISTEN et enregistre le callback du canal
+        if key in self._handlers:
+            await self._call("add_listener", channel_name(key), self._on_notification)
+
+    async def _unlisten(self, key: Key):
+        if key not in self._handlers:
+            await self._call("remove_listener", channel_name(key), self._on_notification)
+
+    def _on_notification(self, connection, pid, channel, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if message.get("o") == self.worker_id:
+            return  # déjà distribué localement
+        key = self._channel_keys.get(channel)
+        if key is None:
+            return
+        self.stats["received"] += 1
+        self._dispatch(key, message["t"], message["d"])
+
+    async def _connection_loop(self):
+        """Connexion d'écoute, rétablie (avec ses LISTEN) si elle tombe"""
+        try:
+            import asyncpg
+        except ImportError:
+            logger.warning("asyncpg not installed: real-time features limited to this worker")
+            return
+
+        from core.database import _get_database_url
+
+        while True:
+            closed = asyncio.Event()
+            conn = None
+            try:
+                conn = await asyncpg.connect(_get_database_url())
+                conn.add_termination_listener(lambda _conn: closed.set())
+                async with self._lock:
+                    for key in list(self._handlers):
+                        await conn.add_listener(channel_name(key), self._on_notification)
+                    self._conn = conn
+                    self._ready.set()
+                await closed.wait()
+            except asyncio.CancelledError:
+                if conn is not None:
+                    await conn.close()
+                raise
+            except Exception as e:
+                logger.warning(f"Pub/sub connection unavailable: {e}")
+            self._ready.clear()
+            self._conn = None
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    async def stop(self):
+        """Ferme la connexion d'écoute (arrêt de l'API)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+        self._conn = None
+
+
+pubsub = PubSub()
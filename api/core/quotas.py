@@ -0,0 +1,105 @@
+"""
+Quotas par invité (photos par invité, suggestions de playlist par invité)
+
+Un compteur par (événement, type, invité) est tenu à jour dans
+guest_quota_counters : la vérification du quota est une seule mise à jour
+conditionnelle sur la clé primaire, au lieu d'un COUNT(*) sur la table
+des photos ou des suggestions.
+
+Le compteur est incrémenté dans la transaction de la requête : si l'envoi
+échoue (rollback), la place est rendue automatiquement. Il est initialisé
+une seule fois par invité depuis les lignes existantes (données
+antérieures aux compteurs).
+"""
+from collections import Counter
+from typing import Callable, Iterable, Optional
+from uuid import UUID
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from core.models import GuestQuotaCounter
+
+QUOTA_PHOTOS = "photos"
+QUOTA_PLAYLIST = "playlist"
+
+
+def _counter_key(event_id: UUID, kind: str, guest: str) -> list:
+    return [
+        GuestQuotaCounter.event_id == event_id,
+        GuestQuotaCounter.kind == kind,
+        GuestQuotaCounter.guest == guest,
+    ]
+
+
+def reserve_quota(
+    db: Session,
+    event_id: UUID,
+    kind: str,
+    guest: str,
+    limit: Optional[int],
+    count_existing: Callable[[], int]
+) -> bool:
+    """
+    Réserve une place dans le quota de l'invité.
+
+    Args:
+        limit: nombre maximum (None = pas de limite, le compteur est quand même tenu)
+        count_existing: compte les lignes existantes de l'invité, appelé
+            uniquement à la création du compteur
+
+    Returns:
+        False si le quota est atteint
+    """
+    key = _counter_key(event_id, kind, guest)
+
+    statement = update(GuestQuotaCounter).where(*key).values(used=GuestQuotaCounter.used + 1)
+    if limit is not None:
+        statement = statement.where(GuestQuotaCounter.used < limit)
+    if db.execute(statement.returning(GuestQuotaCounter.used)).first():
+        return True
+
+    if limit is not None and db.execute(select(GuestQuotaCounter.used).where(*key)).first():
+        return False
+
+    # Premier envoi de l'invité depuis la mise en place des compteurs
+    existing = count_existing()
+    allowed = limit is None or existing < limit
+    initial = insert(GuestQuotaCounter).values(
+        event_id=event_id,
+        kind=kind,
+        guest=guest,
+        used=existing + 1 if allowed else existing
+    )
+    if not allowed:
+        db.execute(initial.on_conflict_do_nothing())
+        return False
+
+    # Un envoi concurrent peut avoir créé le compteur entre-temps
+    upsert = initial.on_conflict_do_update(
+        index_elements=[GuestQuotaCounter.event_id, GuestQuotaCounter.kind, GuestQuotaCounter.guest],
+        set_={"used": GuestQuotaCounter.used + 1},
+        where=(GuestQuotaCounter.used < limit) if limit is not None else None
+    )
+    return db.execute(upsert.returning(GuestQuotaCounter.used)).first() is not None
+
+
+def quota_used(db: Session, event_id: UUID, kind: str, guest: str) -> Optional[int]:
+    """Valeur actuelle du compteur (None si l'invité n'a encore rien envoyé)"""
+    return db.execute(
+        select(GuestQuotaCounter.used).where(*_counter_key(event_id, kind, guest))
+    ).scalar()
+
+
+def release_quota(db: Session, event_id: UUID, kind: str, guests: Iterable[Optional[str]]):
+    """
+    Rend les places des éléments supprimés (un nom d'invité par élément).
+    À appeler dans la transaction de la suppression.
+    """
+    for guest, count in Counter(g for g in guests if g).items():
+        db.execute(
+            update(GuestQuotaCounter)
+            .where(*_counter_key(event_id, kind, guest))
+            .values(used=func.greatest(GuestQuotaCounter.used - count, 0))
+        )
@@ -3,7 +3,7 @@ Schemas Pydantic pour la validation des données
 """
 from datetime import datetime
 from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, field_validator
 from uuid import UUID
 from decimal import Decimal
 
@@ -158,13 +158,44 @@ class PhotoResponse(PhotoBase):
     event_id: UUID
     url: str
     thumbnail_url: Optional[str] = None
+    variants: Optional[Dict[str, Any]] = None  # null tant que les variantes ne sont pas générées
+    width: Optional[int] = None
+    height: Optional[int] = None
+    placeholder: Optional[str] = None  # aperçu flou en data URI, null tant que non généré
     approved: bool
+    published_at: Optional[datetime] = None  # curseur pour list_photos(since=...)
     created_at: datetime
 
     class Config:
         from_attributes = True
 
 
+class PhotoUploadUrlRequest(BaseModel):
+    """Demande d'upload direct vers le stockage"""
+    content_type: str
+    size: int = Field(..., gt=0)
+    filename: Optional[str] = None
+    uploaded_by: Optional[str] = None
+
+
+class PhotoUploadUrlResponse(BaseModel):
+    """Paramètres signés pour envoyer le fichier directement au stockage"""
+    method: str  # PUT (fichier brut) ou POST (multipart : fields + file)
+    url: str
+    fields: Dict[str, Any] = {}
+    headers: Dict[str, str] = {}
+    key: str  # à renvoyer à /photos/complete
+    expires_at: int
+
+
+class PhotoUploadComplete(PhotoBase):
+    """Confirmation d'un upload direct"""
+    key: str
+    # Réponse du stockage à l'upload, renvoyée telle quelle par l'app
+    # (Cloudinary : public_id, version, signature, bytes, width, height, format)
+    upload: Optional[Dict[str, Any]] = None
+
+
 # ============================================
 # GUESTBOOK SCHEMAS
 # ============================================
@@ -248,15 +279,20 @@ class NotificationBase(BaseModel):
 class NotificationCreate(NotificationBase):
     """Création d'une notification"""
     scheduled_at: Optional[datetime] = None
+    target_group_id: Optional[UUID] = None  # null = tous les invités
 
 
 class NotificationResponse(NotificationBase):
     """Réponse notification"""
     id: UUID
     event_id: UUID
+    target_group_id: Optional[UUID] = None
     scheduled_at: Optional[datetime] = None
     sent_at: Optional[datetime] = None
     status: str
+    attempts: int = 0
+    next_attempt_at: Optional[datetime] = None
+    last_error: Optional[str] = None
     opened_count: int
     created_at: datetime
 
@@ -303,7 +339,17 @@ class ChatMessageBase(BaseModel):
 
 class ChatMessageCreate(ChatMessageBase):
     """Création d'un message"""
-    pass
+    sender_name: str = Field(..., min_length=1, max_length=200)
+    message: str = Field(..., min_length=1, max_length=1000)
+
+    @field_validator("message")
+    @classmethod
+    def message_not_blank(cls, value: str) -> str:
+        """Message sans espaces autour ; refusé (422) s'il n'y a que des espaces"""
+        value = value.strip()
+        if not value:
+            raise ValueError("Message cannot be empty")
+        return value
 
 
 class ChatMessageResponse(ChatMessageBase):
@@ -316,6 +362,12 @@ class ChatMessageResponse(ChatMessageBase):
         from_attributes = True
 
 
+class ChatHistoryResponse(BaseModel):
+    """Page d'historique du chat (du plus récent au plus ancien)"""
+    messages: List[ChatMessageResponse]
+    next_cursor: Optional[str] = None  # à passer en before pour la page suivante
+
+
 # ============================================
 # SEATING SCHEMAS
 # ============================================
@@ -328,6 +380,64 @@ class SeatingSearchResult(BaseModel):
     message: str
 
 
+class SeatingLookupRequest(BaseModel):
+    """Recherche groupée (noms ou codes personnels) pour l'accueil"""
+    queries: List[str] = Field(..., min_length=1, max_length=200)
+
+
+class SeatingLookupResult(SeatingSearchResult):
+    """Résultat d'une recherche groupée"""
+    query: str
+
+
+class SeatingLookupResponse(BaseModel):
+    """Réponse de la recherche groupée"""
+    results: List[SeatingLookupResult]
+    found_count: int
+
+
+class SeatingTableInput(BaseModel):
+    """Table disponible pour l'optimiseur"""
+    name: str
+    capacity: int = Field(..., ge=1)
+
+
+class SeatingOptimizeRequest(BaseModel):
+    """Demande d'optimisation du plan de table (CMS)"""
+    tables: List[SeatingTableInput] = []  # vide = tables existantes de la config
+    default_capacity: int = Field(10, ge=1)
+    together: List[List[UUID]] = []  # invités à placer ensemble
+    apart: List[List[UUID]] = []     # invités à séparer
+    group_affinity: bool = True      # rapprocher les membres d'un même groupe d'invitation
+    time_budget_ms: int = Field(2000, ge=0, le=10000)
+    seed: Optional[int] = None
+    dry_run: bool = False            # true = ne pas enregistrer dans la config
+
+
+class SeatingTableResult(BaseModel):
+    """Table dans le plan calculé"""
+    name: str
+    capacity: int
+    seats_used: int
+    guests: List[str]
+    guest_ids: List[UUID]
+
+
+class SeatingOptimizeResponse(BaseModel):
+    """Résultat de l'optimisation"""
+    tables: List[SeatingTableResult]
+    unplaced: List[UUID]
+    total_seats_needed: int
+    total_capacity: int
+    score: int
+    together_satisfied: int
+    together_total: int
+    apart_violated: int
+    apart_total: int
+    duration_ms: int
+    saved: bool
+
+
 # ============================================
 # SUB-EVENTS SCHEMAS (Mariage)
 # ============================================
@@ -528,6 +638,20 @@ class PaginatedResponse(BaseModel):
     pages: int
 
 
+class BulkModerationRequest(BaseModel):
+    """Modération groupée (photos, livre d'or)"""
+    action: str = Field(..., pattern="^(approve|reject|delete)$")  # reject = masquer (éléments approuvés)
+    ids: Optional[List[UUID]] = Field(None, max_length=1000)
+    pending_before: Optional[datetime] = None  # éléments en attente créés avant cette date (approve / delete)
+
+
+class BulkModerationResponse(BaseModel):
+    """Résultat d'une modération groupée"""
+    action: str
+    affected: int
+    ids: List[UUID]
+
+
 class SuccessResponse(BaseModel):
     """Réponse de succès"""
     success: bool = True
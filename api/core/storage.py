@@ -0,0 +1,773 @@
+"""
+Stockage des médias (photos, assets, vidéos)
+
+Deux backends interchangeables :
+- local : système de fichiers (dev / tests), fichiers servis sous /media
+- cloudinary : production
+
+Les uploads sont lus par morceaux et écrits dans un fichier temporaire
+(taille vérifiée au fil de l'eau) : le fichier complet n'est jamais
+chargé en mémoire. Les formulaires multipart sont lus par FastAPI avant
+la route : UploadLimitRoute refuse d'emblée ceux dont le Content-Length
+annoncé dépasse la taille autorisée.
+
+Les deux backends savent aussi signer un upload direct (l'app envoie le
+fichier au stockage sans passer par l'API) : Cloudinary via un upload
+signé, le backend local via une URL signée servie par l'API elle-même
+(PUT /api/uploads/direct/..., utilisé en dev et dans les tests).
+"""
+import os
+import hmac
+import time
+import shutil
+import asyncio
+import hashlib
+import logging
+import secrets
+import tempfile
+import threading
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, AsyncIterator, List
+from urllib.parse import urlencode
+
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger(__name__)
+
+# Types de fichiers autorisés
+ALLOWED_IMAGE_TYPES = ["image/jpeg", "image/png", "image/webp", "image/gif", "image/svg+xml"]
+# Photos des invités : formats raster traités par la génération des variantes (Pillow)
+ALLOWED_PHOTO_TYPES = ["image/jpeg", "image/png", "image/webp"]
+ALLOWED_VIDEO_TYPES = ["video/mp4", "video/webm", "video/quicktime"]
+MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10 MB
+MAX_VIDEO_SIZE = 100 * 1024 * 1024  # 100 MB
+
+# Taille des morceaux lus depuis la requête
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+# Marge pour les champs et séparateurs d'un formulaire multipart
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class StorageError(Exception):
+    """Erreur du backend de stockage"""
+
+
+class FileTooLargeError(StorageError):
+    """Le fichier dépasse la taille autorisée"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"File exceeds {max_size} bytes")
+
+
+class StagedFile:
+    """Fichier reçu sur disque, en attente d'être envoyé au stockage"""
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        content_type: str = "",
+        filename: str = "",
+        sha256: Optional[str] = None
+    ):
+        self.path = path
+        self.size = size
+        self.content_type = content_type
+        self.filename = filename
+        self.sha256 = sha256  # empreinte SHA-256 (hex) calculée pendant la réception
+
+    @property
+    def extension(self) -> str:
+        """Extension du fichier d'origine (sans le point)"""
+        if self.filename and "." in self.filename:
+            return self.filename.rsplit(".", 1)[-1].lower()
+        return "jpg"
+
+    def keep_copy(self) -> Optional[str]:
+        """
+        Crée une copie du fichier qui survit à l'envoi au stockage
+        (lien physique si possible, sinon copie). Retourne None en cas d'échec.
+        """
+        copy_path = f"{self.path}.copy"
+        try:
+            os.link(self.path, copy_path)
+        except OSError:
+            try:
+                shutil.copyfile(self.path, copy_path)
+            except OSError as e:
+                logger.warning(f"Could not copy {self.path}: {e}")
+                return None
+        return copy_path
+
+    def discard(self):
+        """Supprime le fichier temporaire (s'il existe encore)"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _get_tmp_dir() -> Optional[str]:
+    """Dossier des fichiers temporaires (MEDIA_TMP_DIR, sinon celui du système)"""
+    tmp_dir = os.environ.get("MEDIA_TMP_DIR")
+    if tmp_dir:
+        os.makedirs(tmp_dir, exist_ok=True)
+    return tmp_dir
+
+
+def max_upload_size(max_size: int):
+    """
+    Décorateur : taille max du fichier d'une route multipart,
+    vérifiée sur le Content-Length par UploadLimitRoute
+    """
+    def decorator(endpoint):
+        endpoint.max_upload_size = max_size
+        return endpoint
+    return decorator
+
+
+class UploadLimitRoute(APIRoute):
+    """
+    Route qui refuse (400) une requête dont le Content-Length dépasse la
+    taille max de la route (décorateur max_upload_size), avant que FastAPI
+    ne lise et n'écrive sur disque le formulaire multipart.
+
+    Sans Content-Length (envoi chunked), seule la vérification de
+    stage_upload s'applique, une fois le formulaire reçu.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        if getattr(self.endpoint, "max_upload_size", None) is None:
+            return handler
+
+        async def limited_handler(request: Request):
+            max_size = self.endpoint.max_upload_size
+            try:
+                length = int(request.headers.get("content-length", ""))
+            except ValueError:
+                length = None
+            if length is not None and length > max_size + MULTIPART_OVERHEAD:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Fichier trop volumineux. Taille max: {max_size // (1024*1024)} MB"
+                )
+            return await handler(request)
+
+        return limited_handler
+
+
+async def stage_upload(file: UploadFile, max_size: int) -> StagedFile:
+    """
+    Copie un upload multipart par morceaux dans un fichier temporaire
+    et calcule son empreinte SHA-256 au passage.
+
+    Le formulaire a déjà été reçu en entier par FastAPI (fichier spoolé) :
+    FileTooLargeError ne fait qu'écarter un fichier trop gros que le
+    Content-Length n'a pas permis de refuser (voir UploadLimitRoute).
+    Seul stage_stream (corps brut) s'arrête dès que max_size est dépassé.
+    """
+    async def chunks():
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    return await stage_stream(chunks(), max_size, file.content_type or "", file.filename or "")
+
+
+async def stage_stream(
+    chunks: AsyncIterator[bytes],
+    max_size: int,
+    content_type: str = "",
+    filename: str = ""
+) -> StagedFile:
+    """
+    Comme stage_upload, pour un corps de requête brut (request.stream()) :
+    lève FileTooLargeError dès que max_size est dépassé, sans lire la suite.
+    """
+    fd, path = tempfile.mkstemp(prefix="upload_", dir=_get_tmp_dir())
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as out:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > max_size:
+                    raise FileTooLargeError(max_size)
+                digest.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+    except BaseException:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    return StagedFile(path, size, content_type, filename, digest.hexdigest())
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class LocalStorage:
+    """Stockage sur le système de fichiers local (dev / tests)"""
+
+    name = "local"
+
+    def __init__(self, root: str, base_url: str, upload_url: str = "", signing_secret: str = ""):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+        self.upload_url = upload_url.rstrip("/")
+        self.signing_secret = signing_secret or secrets.token_hex(32)
+
+    def path(self, key: str) -> str:
+        """Chemin local d'un fichier (refuse les chemins hors du dossier racine)"""
+        full_path = os.path.abspath(os.path.join(self.root, key))
+        if not full_path.startswith(self.root + os.sep):
+            raise StorageError(f"Invalid storage key: {key}")
+        return full_path
+
+    def url(self, key: str) -> str:
+        """URL publique d'un fichier"""
+        return f"{self.base_url}/{key}"
+
+    def _move(self, source: str, key: str):
+        destination = self.path(key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.move(source, destination)
+
+    async def save(self, staged: StagedFile, key: str, resource_type: str = "image") -> Dict[str, Any]:
+        """
+        Enregistre un fichier reçu sous la clé donnée (la clé inclut l'extension).
+        Le fichier temporaire est consommé (déplacé, ou supprimé en cas d'échec).
+
+        Returns:
+            Dict avec key, url, size et format
+        """
+        try:
+            await run_in_threadpool(self._move, staged.path, key)
+        finally:
+            staged.discard()  # déjà déplacé, sauf en cas d'erreur
+        return {
+            "key": key,
+            "url": self.url(key),
+            "size": staged.size,
+            "format": key.rsplit(".", 1)[-1] if "." in key else None,
+        }
+
+    async def delete(self, key: str, resource_type: str = "image") -> bool:
+        """Supprime un fichier. Retourne False s'il n'existait pas."""
+        try:
+            await run_in_threadpool(os.remove, self.path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _signature(self, key: str, expires: int, max_size: int, content_type: str) -> str:
+        message = f"{key}|{expires}|{max_size}|{content_type}".encode()
+        return hmac.new(self.signing_secret.encode(), message, hashlib.sha256).hexdigest()
+
+    def sign_upload(
+        self,
+        key: str,
+        content_type: str,
+        max_size: int,
+        expires_in: int = 900,
+        resource_type: str = "image",
+        allowed_formats: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Paramètres d'un upload direct : PUT du fichier brut sur une URL signée.
+
+        La signature couvre la taille max et le Content-Type. allowed_formats
+        n'est pas vérifié ici : le contenu est contrôlé à la confirmation.
+
+        Returns:
+            Dict avec method, url, fields, headers, key et expires_at
+        """
+        self.path(key)  # refuse les clés hors du dossier racine
+        expires = int(time.time()) + expires_in
+        query = urlencode({
+            "expires": expires,
+            "max_size": max_size,
+            "signature": self._signature(key, expires, max_size, content_type),
+        })
+        return {
+            "method": "PUT",
+            "url": f"{self.upload_url}/{key}?{query}",
+            "fields": {},
+            "headers": {"Content-Type": content_type},
+            "key": key,
+            "expires_at": expires,
+        }
+
+    def check_upload_signature(self, key: str, expires: int, max_size: int, content_type: str, signature: str):
+        """Vérifie une URL signée par sign_upload (lève StorageError si invalide)"""
+        if expires < time.time():
+            raise StorageError("Upload URL expired")
+        if not hmac.compare_digest(self._signature(key, expires, max_size, content_type), signature):
+            raise StorageError("Invalid upload signature")
+
+    async def verify_upload(
+        self,
+        key: str,
+        upload: Optional[Dict[str, Any]] = None,
+        resource_type: str = "image"
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Vérifie qu'un upload direct a bien été reçu (upload est ignoré :
+        le fichier est lu sur le disque).
+
+        Returns:
+            Dict avec key, url, size, format et sha256, ou None si le fichier est absent
+        """
+        path = self.path(key)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return None
+        return {
+            "key": key,
+            "url": self.url(key),
+            "size": size,
+            "format": key.rsplit(".", 1)[-1] if "." in key else None,
+            "sha256": await run_in_threadpool(_file_sha256, path),
+        }
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        return None
+
+    def shutdown(self):
+        pass
+
+    async def download(self, key: str, destination: str):
+        """Copie un fichier stocké vers un chemin local"""
+        try:
+            await run_in_threadpool(shutil.copyfile, self.path(key), destination)
+        except FileNotFoundError:
+            raise StorageError(f"File not found: {key}")
+
+
+class BlockingCallPool:
+    """
+    Pool de threads borné pour les appels bloquants d'un SDK (Cloudinary).
+
+    Limite le nombre d'appels simultanés, applique un timeout (compté à
+    partir du début de l'appel, pas de l'attente dans la file) et mesure
+    l'attente dans la file et la durée des appels.
+    """
+
+    def __init__(self, name: str, max_workers: int, timeout: float):
+        self.name = name
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        # Compteurs modifiés depuis les threads du pool et la boucle asyncio
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.waiting = 0
+        self.in_flight = 0
+        self.total_call_seconds = 0.0
+        self.max_call_seconds = 0.0
+        self.total_wait_seconds = 0.0
+
+    def _timed(self, fn: Callable, submitted: float, loop: asyncio.AbstractEventLoop, started: asyncio.Event):
+        started_at = time.monotonic()
+        with self._lock:
+            self.waiting -= 1
+            self.in_flight += 1
+            self.total_wait_seconds += started_at - submitted
+        try:
+            loop.call_soon_threadsafe(started.set)
+        except RuntimeError:
+            pass  # boucle fermée (arrêt) : personne n'attend plus
+        try:
+            return fn()
+        finally:
+            duration = time.monotonic() - started_at
+            with self._lock:
+                self.in_flight -= 1
+                self.calls += 1
+                self.total_call_seconds += duration
+                self.max_call_seconds = max(self.max_call_seconds, duration)
+
+    def _on_call_done(self, call: Future):
+        # Annulé avant d'avoir démarré : _timed n'a pas décompté l'attente
+        if call.cancelled():
+            with self._lock:
+                self.waiting -= 1
+
+    async def run(self, fn: Callable, *args, on_done: Optional[Callable[[], None]] = None, **kwargs):
+        """
+        Exécute fn(*args, **kwargs) dans le pool, sans bloquer la boucle asyncio.
+
+        on_done est appelé (dans le thread) une fois l'appel vraiment terminé,
+        même après un timeout ou une annulation : c'est là qu'on libère ce
+        que le thread utilise encore (ex. fichier temporaire).
+        """
+        loop = asyncio.get_running_loop()
+        started = asyncio.Event()
+        with self._lock:
+            self.waiting += 1
+        try:
+            call = self._executor.submit(
+                self._timed, functools.partial(fn, *args, **kwargs), time.monotonic(), loop, started
+            )
+        except RuntimeError:
+            # Pool arrêté
+            with self._lock:
+                self.waiting -= 1
+            if on_done is not None:
+                on_done()
+            raise StorageError(f"{self.name} pool is shut down")
+        call.add_done_callback(self._on_call_done)
+        if on_done is not None:
+            call.add_done_callback(lambda _: on_done())
+        future = asyncio.wrap_future(call, loop=loop)
+        started_wait = asyncio.ensure_future(started.wait())
+
+        try:
+            # Attente dans la file sans timeout (bornée par les appels en cours)
+            await asyncio.wait({future, started_wait}, return_when=asyncio.FIRST_COMPLETED)
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            # Le thread termine l'appel en arrière-plan ; la requête n'attend plus
+            with self._lock:
+                self.timeouts += 1
+            raise StorageError(f"{self.name} call timed out after {self.timeout}s")
+        except asyncio.CancelledError:
+            # Retire l'appel de la file s'il n'a pas démarré
+            call.cancel()
+            raise
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            started_wait.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "timeout_seconds": self.timeout,
+                "calls": self.calls,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "waiting": self.waiting,
+                "in_flight": self.in_flight,
+                "avg_call_ms": int(self.total_call_seconds / self.calls * 1000) if self.calls else None,
+                "max_call_ms": int(self.max_call_seconds * 1000),
+                "avg_wait_ms": int(self.total_wait_seconds / self.calls * 1000) if self.calls else None,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class CloudinaryStorage:
+    """
+    Stockage Cloudinary (production)
+
+    Le SDK est configuré une seule fois (au démarrage) et ses appels
+    synchrones passent par un pool de threads borné :
+        CLOUDINARY_MAX_CONCURRENCY : appels simultanés (défaut 4)
+        CLOUDINARY_TIMEOUT : timeout d'un appel en secondes (défaut 120)
+    """
+
+    name = "cloudinary"
+
+    # Cloudinary découpe lui-même l'envoi au-delà de cette taille
+    UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024
+
+    def __init__(self, cloudinary_url: str):
+        import cloudinary
+        cloudinary.config(cloudinary_url=cloudinary_url)
+        self.pool = BlockingCallPool(
+            "cloudinary",
+            max_workers=int(os.environ.get("CLOUDINARY_MAX_CONCURRENCY", 4)),
+            timeout=float(os.environ.get("CLOUDINARY_TIMEOUT", 120))
+        )
+
+    def url(self, key: str, resource_type: str = "image") -> str:
+        """URL publique d'un fichier"""
+        import cloudinary.utils
+        return cloudinary.utils.cloudinary_url(key, resource_type=resource_type, secure=True)[0]
+
+    def _upload(self, path: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        import cloudinary.uploader
+        # upload_large lit le fichier par morceaux depuis le disque
+        return cloudinary.uploader.upload_large(path, chunk_size=self.UPLOAD_CHUNK_SIZE, **options)
+
+    def _destroy(self, public_id: str, resource_type: str) -> Dict[str, Any]:
+        import cloudinary.uploader
+        return cloudinary.uploader.destroy(public_id, resource_type=resource_type)
+
+    def _resource(self, public_id: str, resource_type: str) -> Optional[Dict[str, Any]]:
+        import cloudinary.api
+        import cloudinary.exceptions
+        try:
+            return cloudinary.api.resource(public_id, resource_type=resource_type)
+        except cloudinary.exceptions.NotFound:
+            return None
+
+    def sign_upload(
+        self,
+        key: str,
+        content_type: str,
+        max_size: int,
+        expires_in: int = 900,
+        resource_type: str = "image",
+        allowed_formats: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Paramètres d'un upload signé Cloudinary (POST multipart des champs + file).
+
+        allowed_formats est signé : Cloudinary refuse les autres formats.
+        Aucun paramètre d'upload ne limite la taille : elle est relue par
+        verify_upload. La signature Cloudinary est valable une heure après
+        son timestamp (expires_in est ignoré). L'app renvoie la réponse de
+        Cloudinary à /photos/complete, où verify_upload la contrôle.
+        """
+        import cloudinary
+        import cloudinary.utils
+
+        config = cloudinary.config()
+        params = {
+            "public_id": key.rsplit(".", 1)[0],
+            "timestamp": int(time.time()),
+            "overwrite": "false",
+        }
+        if allowed_formats:
+            params["allowed_formats"] = ",".join(allowed_formats)
+        signature = cloudinary.utils.api_sign_request(params, config.api_secret)
+        return {
+            "method": "POST",
+            "url": f"https://api.cloudinary.com/v1_1/{config.cloud_name}/{resource_type}/upload",
+            "fields": dict(params, api_key=config.api_key, signature=signature),
+            "headers": {},
+            "key": params["public_id"],
+            "expires_at": params["timestamp"] + 3600,
+        }
+
+    async def verify_upload(
+        self,
+        key: str,
+        upload: Optional[Dict[str, Any]] = None,
+        resource_type: str = "image"
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Vérifie un upload direct à partir de la réponse de Cloudinary que
+        l'app renvoie (public_id, version, signature).
+
+        La signature de la réponse (public_id et version signés avec l'API
+        secret) écarte sans appel les réponses forgées. Taille, format et
+        dimensions de la réponse ne sont pas signés : ils sont relus par
+        l'Admin API (pool de threads), limitée en nombre d'appels par heure.
+
+        Returns:
+            Dict avec key, url, size, format, width et height,
+            ou None si la réponse est absente ou ne correspond pas
+        """
+        import cloudinary
+        import cloudinary.utils
+
+        if not upload:
+            return None
+        public_id = upload.get("public_id")
+        version = upload.get("version")
+        signature = upload.get("signature")
+        if public_id != key or not version or not isinstance(signature, str):
+            return None
+
+        expected = cloudinary.utils.api_sign_request(
+            {"public_id": public_id, "version": version}, cloudinary.config().api_secret
+        )
+        if not hmac.compare_digest(signature, expected):
+            logger.warning(f"Invalid Cloudinary upload signature for {key}")
+            return None
+
+        try:
+            resource = await self.pool.run(self._resource, public_id, resource_type)
+        except StorageError:
+            raise
+        except Exception as e:
+            logger.error(f"Cloudinary resource error: {e}")
+            raise StorageError(str(e))
+        if not resource:
+            return None
+
+        return {
+            "key": public_id,
+            "url": resource.get("secure_url") or self.url(public_id, resource_type=resource_type),
+            "size": resource.get("bytes"),
+            "format": resource.get("format"),
+            "width": resource.get("width"),
+            "height": resource.get("height"),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Métriques des appels au SDK"""
+        return self.pool.stats()
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+    async def save(self, staged: StagedFile, key: str, resource_type: str = "image") -> Dict[str, Any]:
+        """
+        Envoie un fichier reçu sur Cloudinary.
+        La clé sert de public_id (sans extension). Comme pour le stockage
+        local, le fichier temporaire est supprimé par save (succès ou échec).
+
+        Returns:
+            Dict avec key (public_id), url, size, format, width et height
+        """
+        options = {
+            "public_id": key.rsplit(".", 1)[0],
+            "resource_type": resource_type,
+            "overwrite": True,
+        }
+        # Optimisations pour les images
+        if resource_type == "image":
+            options["transformation"] = [
+                {"quality": "auto:good", "fetch_format": "auto"}
+            ]
+
+        try:
+            # Fichier temporaire supprimé une fois l'envoi terminé dans le thread
+            # (après un timeout, le thread lit encore le fichier)
+            result = await self.pool.run(self._upload, staged.path, options, on_done=staged.discard)
+        except StorageError:
+            raise
+        except Exception as e:
+            logger.error(f"Cloudinary upload error: {e}")
+            raise StorageError(str(e))
+
+        return {
+            "key": result["public_id"],
+            "url": result["secure_url"],
+            "size": staged.size,
+            "format": result.get("format"),
+            "width": result.get("width"),
+            "height": result.get("height"),
+        }
+
+    async def delete(self, key: str, resource_type: str = "image") -> bool:
+        """Supprime un fichier. Retourne False s'il n'existait pas."""
+        try:
+            result = await self.pool.run(self._destroy, key, resource_type)
+        except StorageError:
+            raise
+        except Exception as e:
+            logger.error(f"Cloudinary delete error: {e}")
+            raise StorageError(str(e))
+        return result.get("result") == "ok"
+
+    async def download(self, key: str, destination: str):
+        """Télécharge un fichier stocké vers un chemin local (en streaming)"""
+        import httpx
+
+        try:
+            async with httpx.AsyncClient(timeout=60) as client:
+                async with client.stream("GET", self.url(key)) as response:
+                    response.raise_for_status()
+                    with open(destination, "wb") as out:
+                        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                            await run_in_threadpool(out.write, chunk)
+        except httpx.HTTPError as e:
+            raise StorageError(f"Download failed for {key}: {e}")
+
+
+# Suppressions simultanées lors d'une suppression groupée
+DELETE_CONCURRENCY = 8
+
+# Tâches de suppression en arrière-plan (références gardées jusqu'à la fin)
+_delete_tasks = set()
+
+
+async def delete_keys(keys: List[str]) -> int:
+    """
+    Supprime des fichiers du stockage, par lots de DELETE_CONCURRENCY appels
+    simultanés. Les erreurs sont journalisées ; retourne le nombre d'échecs.
+    """
+    storage = get_storage()
+    failed = 0
+    for start in range(0, len(keys), DELETE_CONCURRENCY):
+        batch = keys[start:start + DELETE_CONCURRENCY]
+        results = await asyncio.gather(*(storage.delete(key) for key in batch), return_exceptions=True)
+        for key, result in zip(batch, results):
+            if isinstance(result, Exception):
+                failed += 1
+                logger.error(f"Could not delete stored file {key}: {result}")
+    return failed
+
+
+async def _delete_keys_later(keys: List[str], delay: float):
+    await asyncio.sleep(delay)
+    await delete_keys(keys)
+
+
+def schedule_delete_keys(keys: List[str], delay: float = 0):
+    """
+    Supprime des fichiers du stockage en arrière-plan (ne bloque pas la requête),
+    éventuellement après delay secondes
+    """
+    if not keys:
+        return
+    task = asyncio.create_task(_delete_keys_later(keys, delay) if delay else delete_keys(keys))
+    _delete_tasks.add(task)
+    task.add_done_callback(_delete_tasks.discard)
+
+
+# Backend global (initialisé à la première utilisation)
+_storage = None
+
+
+def get_storage():
+    """
+    Retourne le backend de stockage configuré (singleton).
+
+    STORAGE_BACKEND=local|cloudinary ; par défaut cloudinary si
+    CLOUDINARY_URL est défini, sinon local.
+    """
+    global _storage
+
+    if _storage is not None:
+        return _storage
+
+    cloudinary_url = os.environ.get("CLOUDINARY_URL", "")
+    backend = os.environ.get("STORAGE_BACKEND") or ("cloudinary" if cloudinary_url else "local")
+
+    if backend == "cloudinary":
+        if not cloudinary_url:
+            raise StorageError("STORAGE_BACKEND=cloudinary requires CLOUDINARY_URL")
+        _storage = CloudinaryStorage(cloudinary_url)
+    else:
+        api_base_url = os.environ.get("API_BASE_URL", "http://localhost:8000")
+        signing_secret = os.environ.get("MEDIA_SIGNING_SECRET", "")
+        if not signing_secret:
+            logger.warning("MEDIA_SIGNING_SECRET not set: direct upload URLs only valid for this worker")
+        _storage = LocalStorage(
+            root=os.environ.get("MEDIA_ROOT", "media"),
+            base_url=os.environ.get("MEDIA_BASE_URL", f"{api_base_url.rstrip('/')}/media"),
+            upload_url=f"{api_base_url.rstrip('/')}/api/uploads/direct",
+            signing_secret=signing_secret
+        )
+
+    logger.info(f"Media storage backend: {_storage.name}")
+    return _storage
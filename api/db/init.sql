@@ -66,8 +66,15 @@ CREATE TABLE photos (
     uploaded_by     VARCHAR(200),                         -- nom de l'invité
     url             VARCHAR(500) NOT NULL,
     thumbnail_url   VARCHAR(500),
+    storage_key     VARCHAR(500),                         -- clé dans le backend de stockage
+    variants        JSONB,                                -- miniatures et tailles responsives
+    content_hash    VARCHAR(64),                          -- SHA-256 de l'original (dédoublonnage)
+    width           INTEGER,                              -- dimensions affichées
+    height          INTEGER,
+    placeholder     TEXT,                                 -- aperçu flou (data URI)
     caption         TEXT,
     approved        BOOLEAN DEFAULT true,
+    published_at    TIMESTAMPTZ,                          -- date d'approbation (flux de la galerie)
     created_at      TIMESTAMPTZ DEFAULT NOW()
 );
 
@@ -110,7 +117,11 @@ CREATE TABLE push_notifications (
     message         TEXT NOT NULL,
     scheduled_at    TIMESTAMPTZ,
     sent_at         TIMESTAMPTZ,
-    status          VARCHAR(20) DEFAULT 'draft',          -- draft, scheduled, sent, failed
+    status          VARCHAR(20) DEFAULT 'draft',          -- draft, scheduled, queued, retrying, sent, failed, dead
+    attempts        INTEGER NOT NULL DEFAULT 0,           -- envois tentés
+    next_attempt_at TIMESTAMPTZ,                          -- prochain essai (statut retrying)
+    last_error      TEXT,
+    retry_tokens    JSONB,                                -- appareils à renvoyer au prochain essai (null = toute la cible)
     opened_count    INTEGER DEFAULT 0,
     created_at      TIMESTAMPTZ DEFAULT NOW()
 );
@@ -139,16 +150,56 @@ CREATE TABLE chat_messages (
     created_at      TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- ============================================
+-- TABLE: guest_quota_counters (Quotas par invité)
+-- ============================================
+CREATE TABLE guest_quota_counters (
+    event_id        UUID REFERENCES events(id) ON DELETE CASCADE,
+    kind            VARCHAR(30),                          -- photos, playlist
+    guest           VARCHAR(200),                         -- uploaded_by / guest_name
+    used            INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (event_id, kind, guest)
+);
+
+-- ============================================
+-- TABLE: device_tokens (Appareils abonnés aux notifications)
+-- ============================================
+CREATE TABLE device_tokens (
+    id              UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    event_id        UUID NOT NULL REFERENCES events(id) ON DELETE CASCADE,
+    guest_id        UUID REFERENCES guests(id) ON DELETE SET NULL,
+    token           VARCHAR(500) NOT NULL,
+    platform        VARCHAR(20),                          -- ios, android
+    created_at      TIMESTAMPTZ DEFAULT NOW(),
+    updated_at      TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- ============================================
+-- TABLE: notification_opens (Ouvertures comptées, une par appareil)
+-- ============================================
+CREATE TABLE notification_opens (
+    notification_id UUID REFERENCES push_notifications(id) ON DELETE CASCADE,
+    token           VARCHAR(500),                         -- token FCM de l'appareil
+    opened_at       TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (notification_id, token)
+);
+
 -- ============================================
 -- INDEX pour optimiser les requêtes
 -- ============================================
 CREATE INDEX idx_guests_event ON guests(event_id);
 CREATE INDEX idx_photos_event ON photos(event_id);
+CREATE UNIQUE INDEX idx_photos_event_hash ON photos(event_id, content_hash);
+CREATE INDEX idx_photos_event_published ON photos(event_id, published_at);
 CREATE INDEX idx_guestbook_event ON guestbook_entries(event_id);
 CREATE INDEX idx_donations_event ON donations(event_id);
 CREATE INDEX idx_notifications_event ON push_notifications(event_id);
+CREATE INDEX idx_notifications_status_next_attempt ON push_notifications(status, next_attempt_at);
+CREATE UNIQUE INDEX idx_device_tokens_event_token ON device_tokens(event_id, token);
+CREATE INDEX idx_device_tokens_guest ON device_tokens(guest_id);
 CREATE INDEX idx_playlist_event ON playlist_suggestions(event_id);
 CREATE INDEX idx_chat_event ON chat_messages(event_id);
+CREATE INDEX idx_chat_event_created ON chat_messages(event_id, created_at);
 CREATE INDEX idx_events_status ON events(status);
 CREATE INDEX idx_events_date ON events(event_date);
 CREATE INDEX idx_events_slug ON events(slug);
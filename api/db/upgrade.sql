@@ -0,0 +1,90 @@
+-- ============================================
+-- SAVETHEDATE - Mise à niveau d'une base existante
+-- ============================================
+-- init.sql ne s'exécute qu'à la création de la base et create_all ne
+-- modifie pas les tables existantes : ce script ajoute les colonnes et
+-- index apparus depuis. Idempotent, exécuté au démarrage de l'API (après
+-- create_all). Peut aussi être lancé à la main :
+--     psql "$DATABASE_URL" -f db/upgrade.sql
+--
+-- Sur une base déjà à jour, seul le catalogue est lu : aucun verrou n'est
+-- pris sur les tables (ALTER TABLE ... IF NOT EXISTS en prendrait un
+-- exclusif à chaque démarrage).
+
+-- Un seul worker à la fois (démarrages simultanés)
+SELECT pg_advisory_xact_lock(hashtext('savethedate_upgrade'));
+-- Verrou indisponible (requêtes longues) : échec plutôt que bloquer le trafic,
+-- nouvelle tentative au prochain démarrage
+SET LOCAL lock_timeout = '10s';
+
+-- ============================================
+-- photos : stockage, variantes, dédoublonnage, dimensions, flux
+-- ============================================
+DO $$
+BEGIN
+    -- published_at : les photos déjà approuvées sont publiées à leur envoi
+    -- (sinon absentes du flux et du curseur since de la galerie).
+    -- Rempli uniquement à l'ajout de la colonne.
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'photos'
+          AND column_name = 'published_at'
+    ) THEN
+        ALTER TABLE photos ADD COLUMN published_at TIMESTAMPTZ;
+        UPDATE photos SET published_at = created_at WHERE approved;
+    END IF;
+
+    IF (
+        SELECT count(*) FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'photos'
+          AND column_name IN ('storage_key', 'variants', 'content_hash', 'width', 'height', 'placeholder')
+    ) < 6 THEN
+        ALTER TABLE photos
+            ADD COLUMN IF NOT EXISTS storage_key VARCHAR(500),
+            ADD COLUMN IF NOT EXISTS variants JSONB,
+            ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64),
+            ADD COLUMN IF NOT EXISTS width INTEGER,
+            ADD COLUMN IF NOT EXISTS height INTEGER,
+            ADD COLUMN IF NOT EXISTS placeholder TEXT;
+    END IF;
+
+    IF to_regclass('idx_photos_event_hash') IS NULL THEN
+        CREATE UNIQUE INDEX idx_photos_event_hash ON photos(event_id, content_hash);
+    END IF;
+    IF to_regclass('idx_photos_event_published') IS NULL THEN
+        CREATE INDEX idx_photos_event_published ON photos(event_id, published_at);
+    END IF;
+END $$;
+
+-- ============================================
+-- push_notifications : nouveaux essais
+-- ============================================
+DO $$
+BEGIN
+    IF (
+        SELECT count(*) FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'push_notifications'
+          AND column_name IN ('attempts', 'next_attempt_at', 'last_error', 'retry_tokens')
+    ) < 4 THEN
+        -- NOT NULL DEFAULT 0 : les notifications existantes reçoivent attempts = 0
+        ALTER TABLE push_notifications
+            ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ,
+            ADD COLUMN IF NOT EXISTS last_error TEXT,
+            ADD COLUMN IF NOT EXISTS retry_tokens JSONB;
+    END IF;
+
+    IF to_regclass('idx_notifications_status_next_attempt') IS NULL THEN
+        CREATE INDEX idx_notifications_status_next_attempt ON push_notifications(status, next_attempt_at);
+    END IF;
+END $$;
+
+-- ============================================
+-- chat_messages : historique paginé
+-- ============================================
+DO $$
+BEGIN
+    IF to_regclass('idx_chat_event_created') IS NULL THEN
+        CREATE INDEX idx_chat_event_created ON chat_messages(event_id, created_at);
+    END IF;
+END $$;
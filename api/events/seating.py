@@ -1,17 +1,89 @@
 """
 Routes pour le plan de table
 """
+import copy
 from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from core.database import get_db
-from core.models import Event
-from core.schemas import SeatingSearchResult
+from core.models import Event, Guest
+from core.schemas import (
+    SeatingSearchResult, SeatingLookupRequest, SeatingLookupResult,
+    SeatingLookupResponse, SeatingOptimizeRequest, SeatingOptimizeResponse
+)
+from core.security import verify_admin_api_key
+from .seating_optimizer import optimize_seating
 
 router = APIRouter()
 
 
+# Cache des index de recherche : event_id -> (updated_at, index)
+_seating_indexes = {}
+_MAX_CACHED_INDEXES = 256
+
+
+def _build_seating_index(tables: list) -> dict:
+    """
+    Construit l'index de recherche d'un plan de table :
+    - entries : (nom en minuscules, nom, table) dans l'ordre du plan
+    - exact : nom en minuscules -> (nom, table)
+    - by_guest_id : id d'invité -> table (plans générés par l'optimiseur)
+    """
+    entries = []
+    exact = {}
+    by_guest_id = {}
+    for table in tables:
+        table_name = table.get('name', '')
+        for guest in table.get('guests', []):
+            key = guest.lower().strip()
+            entries.append((key, guest, table_name))
+            exact.setdefault(key, (guest, table_name))
+        for guest_id in table.get('guest_ids', []):
+            by_guest_id[str(guest_id)] = table_name
+    return {"entries": entries, "exact": exact, "by_guest_id": by_guest_id}
+
+
+def _get_seating_index(event: Event, seating_config: dict) -> dict:
+    """Retourne l'index du plan de table, reconstruit si l'événement a changé"""
+    cached = _seating_indexes.get(event.id)
+    if cached and cached[0] == event.updated_at:
+        return cached[1]
+    
+    index = _build_seating_index(seating_config.get('tables', []))
+    if len(_seating_indexes) >= _MAX_CACHED_INDEXES:
+        _seating_indexes.clear()
+    _seating_indexes[event.id] = (event.updated_at, index)
+    return index
+
+
+def _lookup_name(index: dict, name: str):
+    """Recherche un nom : correspondance exacte d'abord, puis partielle"""
+    search_name = name.lower().strip()
+    if not search_name:
+        return None
+    if search_name in index["exact"]:
+        return index["exact"][search_name]
+    for key, guest, table_name in index["entries"]:
+        if search_name in key:
+            return guest, table_name
+    return None
+
+
+def _get_interactive_seating_config(event_id: UUID, db: Session):
+    """Charge l'événement et vérifie que le plan de table est activé"""
+    event = db.query(Event).filter(Event.id == event_id).first()
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    seating_config = event.config.get('modules', {}).get('seating_plan', {})
+    if not seating_config.get('enabled', False):
+        raise HTTPException(status_code=403, detail="Seating plan module is not enabled")
+    
+    return event, seating_config
+
+
 @router.get("/{event_id}/seating", response_model=SeatingSearchResult)
 async def search_seating(
     event_id: UUID,
@@ -24,15 +96,7 @@ async def search_seating(
     L'invité tape son nom, on recherche dans le JSON des tables
     et on lui indique sa table.
     """
-    # Vérifier que l'événement existe
-    event = db.query(Event).filter(Event.id == event_id).first()
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
-    
-    # Vérifier que le module plan de table est activé
-    seating_config = event.config.get('modules', {}).get('seating_plan', {})
-    if not seating_config.get('enabled', False):
-        raise HTTPException(status_code=403, detail="Seating plan module is not enabled")
+    event, seating_config = _get_interactive_seating_config(event_id, db)
     
     # Vérifier si le mode interactif est activé
     if not seating_config.get('interactive', False):
@@ -42,25 +106,181 @@ async def search_seating(
             message="Consultez le plan de table affiché"
         )
     
-    # Rechercher dans les tables
-    tables = seating_config.get('tables', [])
-    search_name = name.lower().strip()
-    
-    for table in tables:
-        table_name = table.get('name', '')
-        guests_list = table.get('guests', [])
-        
-        for guest in guests_list:
-            if search_name in guest.lower():
-                return SeatingSearchResult(
-                    found=True,
-                    table_name=table_name,
-                    guest_name=guest,
-                    message=f"Vous êtes à la {table_name}"
-                )
+    # Rechercher dans l'index des tables
+    match = _lookup_name(_get_seating_index(event, seating_config), name)
+    if match:
+        guest, table_name = match
+        return SeatingSearchResult(
+            found=True,
+            table_name=table_name,
+            guest_name=guest,
+            message=f"Vous êtes à la {table_name}"
+        )
     
     # Non trouvé
     return SeatingSearchResult(
         found=False,
         message=f"Aucune table trouvée pour '{name}'. Vérifiez l'orthographe ou contactez l'organisateur."
     )
+
+
+@router.post("/{event_id}/seating/lookup", response_model=SeatingLookupResponse)
+async def lookup_seating_batch(
+    event_id: UUID,
+    data: SeatingLookupRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Recherche groupée de tables (accueil / check-in)
+    
+    Accepte une liste de noms ou de codes personnels et retourne toutes
+    les tables en un seul appel, avec le même index que la recherche simple.
+    """
+    event, seating_config = _get_interactive_seating_config(event_id, db)
+    
+    if not seating_config.get('interactive', False):
+        results = [
+            SeatingLookupResult(query=q, found=False, message="Consultez le plan de table affiché")
+            for q in data.queries
+        ]
+        return SeatingLookupResponse(results=results, found_count=0)
+    
+    index = _get_seating_index(event, seating_config)
+    
+    # Résoudre tous les codes personnels en une seule requête
+    candidate_codes = {
+        q.strip().upper() for q in data.queries
+        if q.strip() and len(q.strip()) <= 20 and ' ' not in q.strip()
+    }
+    guests_by_code = {}
+    if candidate_codes:
+        rows = db.query(Guest.id, Guest.name, Guest.personal_code).filter(
+            Guest.event_id == event_id,
+            Guest.personal_code.in_(candidate_codes)
+        ).all()
+        guests_by_code = {row.personal_code: row for row in rows}
+    
+    results = []
+    for query in data.queries:
+        match = None
+        guest = guests_by_code.get(query.strip().upper())
+        if guest:
+            table_name = index["by_guest_id"].get(str(guest.id))
+            if table_name:
+                match = (guest.name, table_name)
+            else:
+                match = _lookup_name(index, guest.name)
+        if not match:
+            match = _lookup_name(index, query)
+        
+        if match:
+            guest_name, table_name = match
+            results.append(SeatingLookupResult(
+                query=query,
+                found=True,
+                table_name=table_name,
+                guest_name=guest_name,
+                message=f"Vous êtes à la {table_name}"
+            ))
+        else:
+            results.append(SeatingLookupResult(
+                query=query,
+                found=False,
+                message=f"Aucune table trouvée pour '{query}'."
+            ))
+    
+    return SeatingLookupResponse(
+        results=results,
+        found_count=sum(1 for r in results if r.found)
+    )
+
+
+@router.post("/{event_id}/seating/optimize", response_model=SeatingOptimizeResponse)
+async def optimize_seating_plan(
+    event_id: UUID,
+    data: SeatingOptimizeRequest,
+    db: Session = Depends(get_db),
+    _api_key: str = Depends(verify_admin_api_key)
+):
+    """
+    Calcule automatiquement le plan de table (CMS) - Protégé par API key
+
+    Place les invités confirmés (avec leurs accompagnants) en respectant
+    les capacités des tables et les contraintes ensemble/séparés, puis
+    enregistre le résultat dans modules.seating_plan.tables.
+    """
+    event = db.query(Event).filter(Event.id == event_id).first()
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    seating_config = event.config.get('modules', {}).get('seating_plan', {})
+
+    # Tables : celles de la requête, sinon celles déjà présentes dans la config
+    if data.tables:
+        tables = [{"name": t.name, "capacity": t.capacity} for t in data.tables]
+    else:
+        tables = [
+            {"name": t.get('name', ''), "capacity": t.get('capacity') or data.default_capacity}
+            for t in seating_config.get('tables', [])
+        ]
+    if not tables:
+        raise HTTPException(status_code=400, detail="No tables provided")
+
+    guests = db.query(
+        Guest.id, Guest.name, Guest.plus_ones, Guest.plus_one_names, Guest.invitation_group_id
+    ).filter(
+        Guest.event_id == event_id,
+        Guest.status == 'confirmed'
+    ).all()
+
+    parties = []
+    for guest in guests:
+        plus_ones = guest.plus_ones or 0
+        names = [guest.name] + [n for n in (guest.plus_one_names or [])[:plus_ones] if n]
+        parties.append({
+            "id": str(guest.id),
+            "size": 1 + plus_ones,
+            "group": str(guest.invitation_group_id) if guest.invitation_group_id else None,
+            "names": names,
+        })
+
+    # Calcul CPU hors de la boucle asyncio
+    result = await run_in_threadpool(
+        optimize_seating,
+        parties,
+        tables,
+        [[str(i) for i in ids] for ids in data.together],
+        [[str(i) for i in ids] for ids in data.apart],
+        data.group_affinity,
+        data.time_budget_ms / 1000,
+        data.seed
+    )
+
+    if not data.dry_run:
+        config = copy.deepcopy(event.config)
+        seating = config.setdefault('modules', {}).setdefault('seating_plan', {})
+        seating['tables'] = [
+            {
+                "name": t["name"],
+                "capacity": t["capacity"],
+                "guests": t["guests"],
+                "guest_ids": t["guest_ids"],
+            }
+            for t in result["tables"]
+        ]
+        event.config = config
+        db.commit()
+
+    return SeatingOptimizeResponse(
+        tables=result["tables"],
+        unplaced=result["unplaced"],
+        total_seats_needed=sum(p["size"] for p in parties),
+        total_capacity=sum(t["capacity"] for t in result["tables"]),
+        score=result["score"],
+        together_satisfied=result["together_satisfied"],
+        together_total=result["together_total"],
+        apart_violated=result["apart_violated"],
+        apart_total=result["apart_total"],
+        duration_ms=result["duration_ms"],
+        saved=not data.dry_run
+    )
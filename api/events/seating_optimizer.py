@@ -0,0 +1,268 @@
+"""
+Optimiseur de plan de table
+
+Heuristique gloutonne + recherche locale (déplacements et échanges),
+sans solveur ILP. Chaque invité confirmé forme un "groupe de places"
+(lui + ses accompagnants) qui ne peut pas être séparé.
+
+Score d'un plan = somme des poids des paires assises à la même table :
+- contrainte "ensemble" : +TOGETHER_WEIGHT
+- contrainte "séparés"  : AVOID_WEIGHT (fortement négatif)
+- même groupe d'invitation : +GROUP_WEIGHT
+"""
+import random
+import time
+from typing import Dict, List, Optional, Any
+
+TOGETHER_WEIGHT = 10
+AVOID_WEIGHT = -100
+GROUP_WEIGHT = 2
+
+
+def optimize_seating(
+    parties: List[Dict[str, Any]],
+    tables: List[Dict[str, Any]],
+    together: Optional[List[List[str]]] = None,
+    apart: Optional[List[List[str]]] = None,
+    use_groups: bool = True,
+    time_budget: float = 2.0,
+    seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Calcule une affectation des invités aux tables.
+
+    Args:
+        parties: [{"id", "size", "group", "names"}] - un élément par invité confirmé
+        tables: [{"name", "capacity"}]
+        together: listes d'ids d'invités à placer ensemble
+        apart: listes d'ids d'invités à séparer
+        use_groups: rapprocher les invités d'un même groupe d'invitation
+        time_budget: durée max de la recherche locale (secondes)
+        seed: graine aléatoire (résultats reproductibles)
+
+    Returns:
+        Dict avec tables (noms + ids), unplaced, score et statistiques
+    """
+    started = time.perf_counter()
+    rng = random.Random(seed)
+
+    n = len(parties)
+    n_tables = len(tables)
+    index = {str(p["id"]): i for i, p in enumerate(parties)}
+    sizes = [max(1, int(p.get("size") or 1)) for p in parties]
+    capacities = [max(0, int(t.get("capacity") or 0)) for t in tables]
+    groups = [p.get("group") if use_groups else None for p in parties]
+
+    # Graphe des contraintes (liste d'adjacence pondérée)
+    adjacency: List[Dict[int, int]] = [dict() for _ in range(n)]
+
+    def add_clique(ids: List[str], weight: int):
+        members = [index[str(i)] for i in ids if str(i) in index]
+        for a in range(len(members)):
+            for b in range(a + 1, len(members)):
+                i, j = members[a], members[b]
+                if i == j:
+                    continue
+                adjacency[i][j] = adjacency[i].get(j, 0) + weight
+                adjacency[j][i] = adjacency[j].get(i, 0) + weight
+
+    for ids in together or []:
+        add_clique(ids, TOGETHER_WEIGHT)
+    for ids in apart or []:
+        add_clique(ids, AVOID_WEIGHT)
+
+    assign = [-1] * n
+    load = [0] * n_tables
+    members: List[set] = [set() for _ in range(n_tables)]
+    group_count: List[Dict[Any, int]] = [dict() for _ in range(n_tables)]
+
+    def place(i: int, t: int):
+        assign[i] = t
+        load[t] += sizes[i]
+        members[t].add(i)
+        if groups[i] is not None:
+            group_count[t][groups[i]] = group_count[t].get(groups[i], 0) + 1
+
+    def remove(i: int):
+        t = assign[i]
+        assign[i] = -1
+        load[t] -= sizes[i]
+        members[t].discard(i)
+        if groups[i] is not None:
+            group_count[t][groups[i]] -= 1
+
+    def pair_weight(i: int, j: int) -> int:
+        w = adjacency[i].get(j, 0)
+        if groups[i] is not None and groups[i] == groups[j]:
+            w += GROUP_WEIGHT
+        return w
+
+    def gains(i: int) -> Dict[int, int]:
+        """Gain de l'invité i pour chaque table (hors lui-même)"""
+        result: Dict[int, int] = {}
+        for j, w in adjacency[i].items():
+            t = assign[j]
+            if t >= 0:
+                result[t] = result.get(t, 0) + w
+        g = groups[i]
+        if g is not None:
+            for t in range(n_tables):
+                count = group_count[t].get(g, 0)
+                if assign[i] == t:
+                    count -= 1
+                if count > 0:
+                    result[t] = result.get(t, 0) + GROUP_WEIGHT * count
+        return result
+
+    def gain_at(i: int, t: int) -> int:
+        """Gain de l'invité i pour une seule table"""
+        total = sum(w for j, w in adjacency[i].items() if assign[j] == t)
+        g = groups[i]
+        if g is not None:
+            count = group_count[t].get(g, 0)
+            if assign[i] == t:
+                count -= 1
+            total += GROUP_WEIGHT * count
+        return total
+
+    # 1. Placement glouton : groupes les plus gros d'abord, puis par taille
+    group_sizes: Dict[Any, int] = {}
+    for i in range(n):
+        if groups[i] is not None:
+            group_sizes[groups[i]] = group_sizes.get(groups[i], 0) + sizes[i]
+    order = sorted(
+        range(n),
+        key=lambda i: (
+            -len(adjacency[i]),
+            -group_sizes.get(groups[i], 0),
+            str(groups[i]),
+            -sizes[i]
+        )
+    )
+
+    for i in order:
+        table_gains = gains(i)
+        best_table, best_key = -1, None
+        for t in range(n_tables):
+            free = capacities[t] - load[t]
+            if free < sizes[i]:
+                continue
+            # Meilleur gain, puis table déjà entamée (évite d'éparpiller), puis best-fit
+            key = (table_gains.get(t, 0), load[t] > 0, -free)
+            if best_key is None or key > best_key:
+                best_table, best_key = t, key
+        if best_table >= 0:
+            place(i, best_table)
+
+    # 2. Recherche locale : déplacements puis échanges améliorants
+    deadline = started + max(0.0, time_budget)
+    improved = True
+    passes = 0
+    moves = 0
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        passes += 1
+        visit = list(range(n))
+        rng.shuffle(visit)
+        for i in visit:
+            if time.perf_counter() >= deadline:
+                break
+            current = assign[i]
+            table_gains = gains(i)
+            current_gain = table_gains.get(current, 0) if current >= 0 else 0
+
+            # Déplacement simple vers une table avec de la place
+            best_move, best_delta = -1, 0
+            for t, g in table_gains.items():
+                if t == current or capacities[t] - load[t] < sizes[i]:
+                    continue
+                delta = g - current_gain
+                if current < 0:
+                    delta += 1  # placer un invité non placé est toujours un progrès
+                if delta > best_delta:
+                    best_move, best_delta = t, delta
+            if best_move < 0 and current < 0:
+                for t in range(n_tables):
+                    if capacities[t] - load[t] >= sizes[i]:
+                        best_move = t
+                        break
+            if best_move >= 0:
+                if current >= 0:
+                    remove(i)
+                place(i, best_move)
+                improved = True
+                moves += 1
+                continue
+
+            if current < 0:
+                continue
+
+            # Échange avec un invité d'une table attractive
+            best_swap, best_delta = None, 0
+            for t, g in table_gains.items():
+                if t == current or g <= current_gain:
+                    continue
+                for j in members[t]:
+                    new_load_t = load[t] - sizes[j] + sizes[i]
+                    new_load_c = load[current] - sizes[i] + sizes[j]
+                    if new_load_t > capacities[t] or new_load_c > capacities[current]:
+                        continue
+                    w_ij = pair_weight(i, j)
+                    delta = (
+                        (g - w_ij) - current_gain
+                        + (gain_at(j, current) - w_ij) - gain_at(j, t)
+                    )
+                    if delta > best_delta:
+                        best_swap, best_delta = (j, t), delta
+            if best_swap:
+                j, t = best_swap
+                remove(i)
+                remove(j)
+                place(i, t)
+                place(j, current)
+                improved = True
+                moves += 1
+
+    # 3. Construction du résultat
+    score = 0
+    together_total = together_ok = apart_total = apart_violated = 0
+    for i in range(n):
+        for j, w in adjacency[i].items():
+            if j <= i:
+                continue
+            same = assign[i] >= 0 and assign[i] == assign[j]
+            if w > 0:
+                together_total += 1
+                together_ok += same
+            elif w < 0:
+                apart_total += 1
+                apart_violated += same
+    for t in range(n_tables):
+        seated = sorted(members[t])
+        for a in range(len(seated)):
+            for b in range(a + 1, len(seated)):
+                score += pair_weight(seated[a], seated[b])
+
+    result_tables = []
+    for t, table in enumerate(tables):
+        seated = sorted(members[t])
+        result_tables.append({
+            "name": table["name"],
+            "capacity": capacities[t],
+            "seats_used": load[t],
+            "guest_ids": [str(parties[i]["id"]) for i in seated],
+            "guests": [name for i in seated for name in parties[i].get("names", [])],
+        })
+
+    return {
+        "tables": result_tables,
+        "unplaced": [str(parties[i]["id"]) for i in range(n) if assign[i] < 0],
+        "score": score,
+        "together_satisfied": together_ok,
+        "together_total": together_total,
+        "apart_violated": apart_violated,
+        "apart_total": apart_total,
+        "passes": passes,
+        "moves": moves,
+        "duration_ms": int((time.perf_counter() - started) * 1000),
+    }
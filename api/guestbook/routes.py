@@ -4,13 +4,17 @@ Routes pour le livre d'or
 from typing import List
 from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import delete, update
 from sqlalchemy.orm import Session
 
 from core.database import get_db
 from core.models import Event, GuestbookEntry
+from core.moderation import moderation_filters
 from core.schemas import (
-    GuestbookEntryCreate, GuestbookEntryResponse, SuccessResponse
+    GuestbookEntryCreate, GuestbookEntryResponse,
+    BulkModerationRequest, BulkModerationResponse, SuccessResponse
 )
+from core.security import verify_admin_api_key
 
 router = APIRouter()
 
@@ -116,3 +120,40 @@ async def delete_guestbook_entry(
     db.commit()
     
     return SuccessResponse(message="Entry deleted successfully")
+
+
+@router.post("/{event_id}/guestbook/moderation", response_model=BulkModerationResponse)
+async def moderate_guestbook_entries(
+    event_id: UUID,
+    data: BulkModerationRequest,
+    db: Session = Depends(get_db),
+    _api_key: str = Depends(verify_admin_api_key)
+):
+    """
+    Modération groupée du livre d'or (CMS) - Protégé par API key
+    
+    approve / reject (masquer) / delete sur une liste d'ids, ou approve /
+    delete sur tous les messages en attente postés avant pending_before,
+    en une seule requête SQL (les messages en attente sont déjà masqués :
+    reject ne concerne que les messages approuvés).
+    """
+    event = db.query(Event).filter(Event.id == event_id).first()
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    filters = moderation_filters(GuestbookEntry, event_id, data)
+    
+    if data.action == "delete":
+        statement = delete(GuestbookEntry).where(*filters)
+    else:
+        approve = data.action == "approve"
+        statement = update(GuestbookEntry).where(
+            *filters, GuestbookEntry.approved == (not approve)
+        ).values(approved=approve)
+    
+    ids = db.scalars(
+        statement.returning(GuestbookEntry.id).execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    
+    return BulkModerationResponse(action=data.action, affected=len(ids), ids=ids)
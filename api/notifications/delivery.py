@@ -0,0 +1,143 @@
+"""
+Envoi d'une notification à sa cible
+
+- sans groupe cible : topic FCM de l'événement (tous les abonnés)
+- avec groupe cible : appareils enregistrés des invités du groupe
+  (multicast par lots de 500) ; les tokens refusés par FCM sont supprimés
+
+Une erreur temporaire (quota, FCM indisponible, délai dépassé) met la
+notification en 'retrying' avec un délai exponentiel ; après
+NOTIFICATION_MAX_ATTEMPTS essais elle passe en 'dead'. Une erreur
+définitive la met en 'failed'. Pour un groupe, le nouvel essai ne
+concerne que les appareils en échec temporaire (retry_tokens) : les
+autres ont déjà reçu la notification.
+"""
+import os
+import random
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from core.models import DeviceToken, Guest, PushNotification
+from .firebase_service import send_to_event, send_to_devices
+
+logger = logging.getLogger(__name__)
+
+# Délai maximum entre deux essais
+RETRY_MAX_DELAY = timedelta(hours=1)
+
+
+def group_tokens(db: Session, event_id: UUID, group_id: UUID) -> List[str]:
+    """Tokens des appareils des invités d'un groupe"""
+    rows = db.query(DeviceToken.token).join(
+        Guest, Guest.id == DeviceToken.guest_id
+    ).filter(
+        DeviceToken.event_id == event_id,
+        Guest.invitation_group_id == group_id
+    ).all()
+    return [row.token for row in rows]
+
+
+def prune_tokens(db: Session, event_id: UUID, tokens: Iterable[str]) -> int:
+    """Supprime les tokens invalides (à valider par le commit de l'appelant)"""
+    tokens = list(tokens)
+    if not tokens:
+        return 0
+    return db.query(DeviceToken).filter(
+        DeviceToken.event_id == event_id,
+        DeviceToken.token.in_(tokens)
+    ).delete(synchronize_session=False)
+
+
+def target_tokens(db: Session, notification: PushNotification) -> Optional[List[str]]:
+    """Tokens ciblés (groupe, ou appareils à renvoyer), ou None pour le topic de l'événement"""
+    if notification.retry_tokens is not None:
+        return list(notification.retry_tokens)
+    if notification.target_group_id is None:
+        return None
+    return group_tokens(db, notification.event_id, notification.target_group_id)
+
+
+def send_to_target(
+    event_id: UUID,
+    title: str,
+    message: str,
+    tokens: Optional[List[str]]
+) -> Dict[str, Any]:
+    """Envoi FCM seul (sans session : utilisable depuis un pool de threads)"""
+    if tokens is None:
+        return send_to_event(event_id=str(event_id), title=title, body=message)
+    return send_to_devices(tokens, title=title, body=message, data={"event_id": str(event_id)})
+
+
+def send_notification(db: Session, notification: PushNotification) -> Dict[str, Any]:
+    """
+    Envoie la notification à sa cible (événement entier ou groupe).
+
+    Returns:
+        Résultat FCM (success / simulated / error, sent et failed pour un groupe)
+    """
+    result = send_to_target(
+        notification.event_id,
+        notification.title,
+        notification.message,
+        target_tokens(db, notification)
+    )
+
+    pruned = prune_tokens(db, notification.event_id, result.get("invalid_tokens", ()))
+    if pruned:
+        logger.info(f"Removed {pruned} invalid device tokens for event {notification.event_id}")
+
+    return result
+
+
+def _get_max_attempts() -> int:
+    return max(1, int(os.environ.get("NOTIFICATION_MAX_ATTEMPTS", 5)))
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Délai avant l'essai suivant : base x 2^(essais - 1), +/- 10 %, plafonné"""
+    base = float(os.environ.get("NOTIFICATION_RETRY_BASE_SECONDS", 30))
+    delay = min(base * 2 ** (attempts - 1), RETRY_MAX_DELAY.total_seconds())
+    return timedelta(seconds=delay * random.uniform(0.9, 1.1))
+
+
+def delivery_outcome(result: Dict[str, Any], attempts: int) -> Dict[str, Any]:
+    """
+    Statut à enregistrer après un envoi.
+
+    Args:
+        result: résultat FCM
+        attempts: nombre d'essais, celui-ci compris
+
+    Returns:
+        status, sent_at, next_attempt_at, last_error et retry_tokens
+        (appareils à renvoyer au prochain essai, None = toute la cible)
+    """
+    now = datetime.utcnow()
+    if result.get("success") or result.get("simulated"):
+        return {
+            "status": 'sent', "sent_at": now, "next_attempt_at": None,
+            "last_error": None, "retry_tokens": None,
+        }
+
+    error = str(result.get("error") or "Unknown error")
+    if not result.get("transient"):
+        status = 'failed'
+    elif attempts >= _get_max_attempts():
+        status = 'dead'
+    else:
+        return {
+            "status": 'retrying',
+            "sent_at": None,
+            "next_attempt_at": now + retry_delay(attempts),
+            "last_error": error,
+            "retry_tokens": result.get("retry_tokens") or None,
+        }
+    return {
+        "status": status, "sent_at": None, "next_attempt_at": None,
+        "last_error": error, "retry_tokens": None,
+    }
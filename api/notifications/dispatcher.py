@@ -0,0 +1,115 @@
+"""
+Envoi des notifications en arrière-plan
+
+Le SDK Firebase Admin est synchrone (requêtes HTTP bloquantes) : les
+envois sont exécutés dans un pool de threads borné, hors de la boucle
+asyncio. La route enregistre la notification au statut 'queued' et
+répond tout de suite ; le dispatcher l'envoie puis enregistre le
+résultat ('sent', 'failed', ou 'retrying' si l'erreur est temporaire :
+le scheduler refera l'essai).
+
+Une notification restée 'queued' (worker arrêté avant l'envoi) est
+reprise par le scheduler.
+
+Variables d'environnement :
+    FCM_DISPATCH_WORKERS : envois simultanés (défaut 4)
+    FCM_DISPATCH_TIMEOUT : attente max d'un envoi, en secondes (défaut 60)
+"""
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional, Tuple
+from uuid import UUID
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_tasks = set()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Crée le pool de threads (lazy loading)"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=max(1, int(os.environ.get("FCM_DISPATCH_WORKERS", 4))),
+            thread_name_prefix="fcm"
+        )
+    return _executor
+
+
+def deliver_notification(notification_id: UUID) -> Optional[Tuple[str, Optional[datetime]]]:
+    """
+    Envoie une notification 'queued' et enregistre le résultat
+    (session dédiée, hors requête).
+
+    Returns:
+        (statut, date du prochain essai), ou None si la notification n'est
+        plus à envoyer (annulée ou déjà traitée)
+    """
+    from core.database import SessionLocal
+    from core.models import PushNotification
+    from .delivery import send_notification, delivery_outcome
+
+    db = SessionLocal()
+    try:
+        # Verrou : le scheduler ne reprend pas une notification en cours d'envoi
+        notification = db.query(PushNotification).filter(
+            PushNotification.id == notification_id,
+            PushNotification.status == 'queued'
+        ).with_for_update(skip_locked=True).first()
+        if not notification:
+            return None
+
+        result = send_notification(db, notification)
+
+        notification.attempts = (notification.attempts or 0) + 1
+        outcome = delivery_outcome(result, notification.attempts)
+        for field, value in outcome.items():
+            setattr(notification, field, value)
+        if outcome["status"] != 'sent':
+            logger.error(
+                f"Failed to send notification {notification_id} "
+                f"({outcome['status']}): {outcome['last_error']}"
+            )
+        db.commit()
+        return outcome["status"], outcome["next_attempt_at"]
+    finally:
+        db.close()
+
+
+async def dispatch_notification(notification_id: UUID):
+    """Envoie une notification dans le pool de threads"""
+    timeout = float(os.environ.get("FCM_DISPATCH_TIMEOUT", 60))
+    loop = asyncio.get_running_loop()
+    try:
+        delivered = await asyncio.wait_for(
+            loop.run_in_executor(_get_executor(), deliver_notification, notification_id),
+            timeout
+        )
+        if delivered and delivered[0] == 'retrying':
+            # Réveille le timer des runners pour le prochain essai
+            from .timer import publish_due_time
+            publish_due_time(notification_id, delivered[1])
+    except asyncio.TimeoutError:
+        # Le thread termine l'envoi et enregistre le résultat ; on n'attend plus
+        logger.warning(f"Notification {notification_id} still sending after {timeout}s")
+    except Exception as e:
+        logger.error(f"Notification dispatch failed for {notification_id}: {e}")
+
+
+def schedule_notification(notification_id: UUID):
+    """Planifie l'envoi d'une notification en arrière-plan (ne bloque pas la requête)"""
+    task = asyncio.create_task(dispatch_notification(notification_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def shutdown():
+    """Arrête le pool (à l'arrêt de l'API) ; les envois en attente restent 'queued'"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
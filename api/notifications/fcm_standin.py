@@ -0,0 +1,181 @@
+"""
+Serveur FCM local (stand-in) pour les tests de charge des notifications
+
+Émule les réponses de l'API FCM v1 et de l'API d'abonnement aux topics,
+avec une latence et des taux d'erreur configurables : le dispatcher, le
+scheduler et les nouveaux essais peuvent être mesurés sans Google.
+
+- POST /v1/projects/{project}/messages:send  → {"name": "projects/.../messages/N"}
+- POST /iid/v1:batchAdd, /iid/v1:batchRemove → {"results": [{}, {"error": "NOT_FOUND"}]}
+- GET  /stats                                 → compteurs (messages, erreurs, topics)
+- POST /reset                                 → remise à zéro
+
+Les tokens commençant par "invalid" sont toujours refusés (UNREGISTERED).
+
+Usage :
+    python -m notifications.fcm_standin --port 9099 --latency-ms 80 --error-rate 0.05
+
+Puis, côté API / runner :
+    FCM_TRANSPORT=http FCM_HTTP_URL=http://127.0.0.1:9099
+"""
+import os
+import random
+import asyncio
+import argparse
+from collections import Counter
+from typing import Any, Dict, Set
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Tokens max par requête d'abonnement (limite FCM)
+MAX_TOPIC_BATCH = 1000
+
+# Erreurs temporaires tirées au hasard : (code HTTP, statut Google, errorCode FCM)
+TRANSIENT_ERRORS = [
+    (503, "UNAVAILABLE", "UNAVAILABLE"),
+    (429, "RESOURCE_EXHAUSTED", "QUOTA_EXCEEDED"),
+    (500, "INTERNAL", "INTERNAL"),
+]
+
+
+class StandinConfig:
+    """Comportement du serveur (variables FCM_STANDIN_* ou options de la ligne de commande)"""
+
+    def __init__(self):
+        self.latency_ms = float(os.environ.get("FCM_STANDIN_LATENCY_MS", 50))
+        self.jitter = float(os.environ.get("FCM_STANDIN_JITTER", 0.5))
+        self.error_rate = float(os.environ.get("FCM_STANDIN_ERROR_RATE", 0))
+        self.unregistered_rate = float(os.environ.get("FCM_STANDIN_UNREGISTERED_RATE", 0))
+
+
+config = StandinConfig()
+stats: Counter = Counter()
+topics: Dict[str, Set[str]] = {}
+
+app = FastAPI(title="FCM stand-in")
+
+
+def _error(http_status: int, status: str, error_code: str, message: str) -> JSONResponse:
+    """Erreur au format FCM v1"""
+    stats[f"error_{error_code.lower()}"] += 1
+    return JSONResponse(status_code=http_status, content={"error": {
+        "code": http_status,
+        "message": message,
+        "status": status,
+        "details": [{
+            "@type": "type.googleapis.com/google.firebase.fcm.v1.FcmError",
+            "errorCode": error_code,
+        }],
+    }})
+
+
+async def _latency():
+    if config.latency_ms > 0:
+        spread = config.latency_ms * config.jitter
+        await asyncio.sleep(max(0, random.uniform(config.latency_ms - spread, config.latency_ms + spread)) / 1000)
+
+
+@app.post("/v1/projects/{project}/messages:send")
+async def send_message(project: str, request: Request):
+    await _latency()
+    stats["requests"] += 1
+
+    try:
+        message = (await request.json())["message"]
+    except (ValueError, KeyError, TypeError):
+        return _error(400, "INVALID_ARGUMENT", "INVALID_ARGUMENT", "Request must contain a message")
+
+    targets = [key for key in ("token", "topic", "condition") if message.get(key)]
+    if len(targets) != 1:
+        return _error(400, "INVALID_ARGUMENT", "INVALID_ARGUMENT", "Exactly one of token, topic or condition is required")
+
+    if random.random() < config.error_rate:
+        http_status, status, error_code = random.choice(TRANSIENT_ERRORS)
+        return _error(http_status, status, error_code, "Simulated transient error")
+
+    token = message.get("token")
+    if token and (token.startswith("invalid") or random.random() < config.unregistered_rate):
+        return _error(404, "NOT_FOUND", "UNREGISTERED", "Requested entity was not found.")
+
+    stats["sent"] += 1
+    stats[f"sent_{targets[0]}"] += 1
+    return {"name": f"projects/{project}/messages/{stats['sent']}"}
+
+
+async def _topic_batch(request: Request, add: bool):
+    await _latency()
+    stats["topic_requests"] += 1
+
+    payload = await request.json()
+    tokens = payload.get("registration_tokens") or []
+    topic = (payload.get("to") or "").replace("/topics/", "", 1)
+    if not topic or not isinstance(tokens, list) or not tokens:
+        return _error(400, "INVALID_ARGUMENT", "INVALID_ARGUMENT", "Topic and registration_tokens are required")
+    if len(tokens) > MAX_TOPIC_BATCH:
+        return _error(400, "INVALID_ARGUMENT", "INVALID_ARGUMENT", f"Too many registration tokens (max {MAX_TOPIC_BATCH})")
+
+    if random.random() < config.error_rate:
+        http_status, status, error_code = random.choice(TRANSIENT_ERRORS)
+        return _error(http_status, status, error_code, "Simulated transient error")
+
+    members = topics.setdefault(topic, set())
+    results = []
+    for token in tokens:
+        if token.startswith("invalid"):
+            results.append({"error": "NOT_FOUND"})
+            continue
+        if add:
+            members.add(token)
+        else:
+            members.discard(token)
+        results.append({})
+    stats["topic_tokens"] += len(tokens)
+    return {"results": results}
+
+
+@app.post("/iid/v1:batchAdd")
+async def batch_add(request: Request):
+    return await _topic_batch(request, add=True)
+
+
+@app.post("/iid/v1:batchRemove")
+async def batch_remove(request: Request):
+    return await _topic_batch(request, add=False)
+
+
+@app.get("/stats")
+async def get_stats() -> Dict[str, Any]:
+    return {
+        "config": vars(config),
+        "counters": dict(stats),
+        "topics": {topic: len(members) for topic, members in topics.items()},
+    }
+
+
+@app.post("/reset")
+async def reset():
+    stats.clear()
+    topics.clear()
+    return {"success": True}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local FCM stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9099)
+    parser.add_argument("--latency-ms", type=float, default=config.latency_ms, help="Mean response latency")
+    parser.add_argument("--jitter", type=float, default=config.jitter, help="Latency spread (fraction of the mean)")
+    parser.add_argument("--error-rate", type=float, default=config.error_rate, help="Share of transient errors (0-1)")
+    parser.add_argument("--unregistered-rate", type=float, default=config.unregistered_rate,
+                        help="Share of tokens answered UNREGISTERED (0-1)")
+    args = parser.parse_args()
+
+    config.latency_ms = args.latency_ms
+    config.jitter = args.jitter
+    config.error_rate = args.error_rate
+    config.unregistered_rate = args.unregistered_rate
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -1,13 +1,23 @@
 """
 Service Firebase Cloud Messaging (FCM) pour les notifications push
+
+Les envois passent par le transport configuré (notifications.transport) :
+SDK Firebase Admin en production, serveur local FCM_TRANSPORT=http pour
+les tests de charge.
 """
 import os
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, Any, List
 
+from .transport import FcmError, get_transport
+
 logger = logging.getLogger(__name__)
 
+# Nombre max de tokens par envoi multicast (limite FCM)
+MULTICAST_BATCH_SIZE = 500
+
 # Variable globale pour stocker l'app Firebase initialisée
 _firebase_app = None
 
@@ -44,8 +54,10 @@ def _get_firebase_app():
         cred_dict = json.loads(firebase_creds)
         cred = credentials.Certificate(cred_dict)
         
-        # Initialiser Firebase
-        _firebase_app = firebase_admin.initialize_app(cred)
+        # Initialiser Firebase (timeout des requêtes HTTP vers FCM)
+        _firebase_app = firebase_admin.initialize_app(cred, {
+            'httpTimeout': float(os.environ.get('FCM_HTTP_TIMEOUT', 10))
+        })
         logger.info("Firebase Admin SDK initialized successfully")
         
         return _firebase_app
@@ -62,8 +74,54 @@ def _get_firebase_app():
 
 
 def is_firebase_available() -> bool:
-    """Vérifie si Firebase est configuré et disponible"""
-    return _get_firebase_app() is not None
+    """Vérifie si le transport FCM est configuré et disponible"""
+    return get_transport().available()
+
+
+def event_topic(event_id) -> str:
+    """Topic FCM d'un événement (abonnements et envois)"""
+    return f"event_{event_id}"
+
+
+def _message(
+    title: str,
+    body: str,
+    data: Optional[Dict[str, str]],
+    topic: Optional[str] = None,
+    token: Optional[str] = None
+) -> Dict[str, Any]:
+    """Message au format FCM v1"""
+    message = {
+        "notification": {"title": title, "body": body},
+        "data": data or {},
+    }
+    if topic:
+        message["topic"] = topic
+    if token:
+        message["token"] = token
+    return message
+
+
+def is_transient_error(exception) -> bool:
+    """
+    Erreur temporaire (quota, service indisponible, délai dépassé) :
+    l'envoi peut être retenté plus tard.
+    """
+    if isinstance(exception, FcmError):
+        return exception.transient
+    if isinstance(exception, (TimeoutError, ConnectionError)):
+        return True
+    try:
+        from firebase_admin import exceptions, messaging
+    except ImportError:
+        return False
+    return isinstance(exception, (
+        messaging.QuotaExceededError,
+        exceptions.ResourceExhaustedError,
+        exceptions.UnavailableError,
+        exceptions.DeadlineExceededError,
+        exceptions.InternalError,
+    ))
 
 
 def send_to_topic(
@@ -93,18 +151,7 @@ def send_to_topic(
         }
     
     try:
-        from firebase_admin import messaging
-        
-        message = messaging.Message(
-            notification=messaging.Notification(
-                title=title,
-                body=body,
-            ),
-            data=data or {},
-            topic=topic,
-        )
-        
-        response = messaging.send(message)
+        response = get_transport().send(_message(title, body, data, topic=topic))
         logger.info(f"Notification sent to topic {topic}: {response}")
         
         return {
@@ -116,7 +163,8 @@ def send_to_topic(
         logger.error(f"Error sending notification to topic {topic}: {e}")
         return {
             "success": False,
-            "error": str(e)
+            "error": str(e),
+            "transient": is_transient_error(e)
         }
 
 
@@ -139,7 +187,7 @@ def send_to_event(
     Returns:
         Dict avec le résultat de l'envoi
     """
-    topic = f"event_{event_id}"
+    topic = event_topic(event_id)
     
     # Ajouter l'event_id aux données
     full_data = {"event_id": str(event_id)}
@@ -175,18 +223,7 @@ def send_to_device(
         }
     
     try:
-        from firebase_admin import messaging
-        
-        message = messaging.Message(
-            notification=messaging.Notification(
-                title=title,
-                body=body,
-            ),
-            data=data or {},
-            token=token,
-        )
-        
-        response = messaging.send(message)
+        response = get_transport().send(_message(title, body, data, token=token))
         logger.info(f"Notification sent to device: {response}")
         
         return {
@@ -198,8 +235,64 @@ def send_to_device(
         logger.error(f"Error sending notification to device: {e}")
         return {
             "success": False,
-            "error": str(e)
+            "error": str(e),
+            "transient": is_transient_error(e)
+        }
+
+
+def _is_invalid_token_error(exception) -> bool:
+    """Token définitivement inutilisable (appli désinstallée, autre projet Firebase)"""
+    if isinstance(exception, FcmError):
+        return exception.invalid_token
+    from firebase_admin import messaging
+    return isinstance(exception, (messaging.UnregisteredError, messaging.SenderIdMismatchError))
+
+
+def _send_multicast_chunk(
+    tokens: List[str],
+    title: str,
+    body: str,
+    data: Optional[Dict[str, str]]
+) -> Dict[str, Any]:
+    """
+    Envoie un lot (500 tokens max), relève les tokens invalides et ceux
+    en échec temporaire (retry_tokens, à renvoyer au prochain essai)
+    """
+    try:
+        responses = get_transport().send_each([
+            _message(title, body, data, token=token) for token in tokens
+        ])
+    except Exception as e:
+        logger.error(f"Error sending multicast chunk ({len(tokens)} tokens): {e}")
+        chunk_result = {
+            "sent": 0,
+            "failed": len(tokens),
+            "invalid_tokens": [],
+            "retry_tokens": [],
+            "error": str(e),
+            "transient": is_transient_error(e)
         }
+        if chunk_result["transient"]:
+            chunk_result["retry_tokens"] = list(tokens)
+            chunk_result["retry_error"] = str(e)
+        return chunk_result
+
+    failures = [(token, result.exception) for token, result in zip(tokens, responses) if not result.success]
+    invalid_tokens = [token for token, exception in failures if _is_invalid_token_error(exception)]
+    transient_failures = [(token, exception) for token, exception in failures if is_transient_error(exception)]
+    chunk_result = {
+        "sent": len(tokens) - len(failures),
+        "failed": len(failures),
+        "invalid_tokens": invalid_tokens,
+        "retry_tokens": [token for token, _ in transient_failures],
+    }
+    if transient_failures:
+        chunk_result["retry_error"] = str(transient_failures[0][1])
+    if failures and len(failures) == len(tokens):
+        # Aucun envoi : le lot est en échec (temporaire si FCM est indisponible)
+        chunk_result["error"] = str(failures[0][1])
+        chunk_result["transient"] = all(is_transient_error(exception) for _, exception in failures)
+    return chunk_result
 
 
 def send_to_devices(
@@ -210,15 +303,23 @@ def send_to_devices(
 ) -> Dict[str, Any]:
     """
     Envoie une notification à plusieurs appareils.
-    
+
+    Les tokens sont découpés en lots de 500 (limite FCM par multicast),
+    envoyés en parallèle (FCM_MULTICAST_CONCURRENCY lots à la fois).
+
     Args:
         tokens: Liste de tokens FCM
         title: Titre de la notification
         body: Corps du message
         data: Données additionnelles
-    
+
+    Un échec temporaire (lot entier ou appareil isolé) met le résultat en
+    erreur temporaire, même si d'autres lots sont partis : seuls les
+    appareils concernés (retry_tokens) sont renvoyés au prochain essai.
+
     Returns:
-        Dict avec le nombre de succès et échecs
+        Dict avec le nombre de succès et échecs, les tokens invalides
+        (invalid_tokens) à supprimer et les tokens à renvoyer (retry_tokens)
     """
     if not is_firebase_available():
         return {
@@ -226,70 +327,82 @@ def send_to_devices(
             "error": "Firebase not configured",
             "simulated": True
         }
-    
+
     if not tokens:
         return {
             "success": True,
             "sent": 0,
-            "failed": 0
-        }
-    
-    try:
-        from firebase_admin import messaging
-        
-        message = messaging.MulticastMessage(
-            notification=messaging.Notification(
-                title=title,
-                body=body,
-            ),
-            data=data or {},
-            tokens=tokens,
-        )
-        
-        response = messaging.send_each_for_multicast(message)
-        
-        logger.info(
-            f"Multicast sent: {response.success_count} success, "
-            f"{response.failure_count} failed"
-        )
-        
-        return {
-            "success": True,
-            "sent": response.success_count,
-            "failed": response.failure_count
-        }
-        
-    except Exception as e:
-        logger.error(f"Error sending multicast notification: {e}")
-        return {
-            "success": False,
-            "error": str(e)
+            "failed": 0,
+            "invalid_tokens": [],
+            "retry_tokens": []
         }
 
+    chunks = [
+        tokens[i:i + MULTICAST_BATCH_SIZE]
+        for i in range(0, len(tokens), MULTICAST_BATCH_SIZE)
+    ]
+    concurrency = int(os.environ.get("FCM_MULTICAST_CONCURRENCY", 4))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(chunks)))) as executor:
+        results = list(executor.map(
+            lambda chunk: _send_multicast_chunk(chunk, title, body, data),
+            chunks
+        ))
+
+    sent = sum(result["sent"] for result in results)
+    failed = sum(result["failed"] for result in results)
+    invalid_tokens = [token for result in results for token in result["invalid_tokens"]]
+    retry_tokens = [token for result in results for token in result["retry_tokens"]]
+    failed_chunks = [result for result in results if "error" in result]
+
+    logger.info(
+        f"Multicast sent ({len(chunks)} chunks): {sent} success, "
+        f"{failed} failed, {len(invalid_tokens)} invalid tokens, {len(retry_tokens)} to retry"
+    )
+
+    result = {
+        "success": True,
+        "sent": sent,
+        "failed": failed,
+        "invalid_tokens": invalid_tokens,
+        "retry_tokens": retry_tokens
+    }
+    if retry_tokens:
+        # Nouvel essai pour les seuls appareils en échec temporaire
+        result["success"] = False
+        result["error"] = next(chunk["retry_error"] for chunk in results if "retry_error" in chunk)
+        result["transient"] = True
+    elif failed_chunks:
+        # Erreurs définitives : échec seulement si aucun lot n'a pu être envoyé
+        result["success"] = len(failed_chunks) < len(chunks)
+        result["error"] = failed_chunks[0]["error"]
+        result["transient"] = False
+    return result
+
 
 def subscribe_to_topic(tokens: List[str], topic: str) -> Dict[str, Any]:
     """
-    Abonne des appareils à un topic.
+    Abonne des appareils à un topic (1000 tokens max par appel).
     
     Args:
         tokens: Liste de tokens FCM
         topic: Nom du topic
     
     Returns:
-        Dict avec le résultat
+        Dict avec le résultat ; errors donne l'erreur de chaque token
+        refusé (index dans tokens)
     """
     if not is_firebase_available():
-        return {"success": False, "error": "Firebase not configured"}
+        return {"success": False, "error": "Firebase not configured", "simulated": True}
     
     try:
-        from firebase_admin import messaging
-        
-        response = messaging.subscribe_to_topic(tokens, topic)
+        response = get_transport().subscribe(tokens, topic)
         
         return {
             "success": True,
-            "subscribed": response.success_count,
-            "failed": response.failure_count
+            "subscribed": response["success_count"],
+            "failed": response["failure_count"],
+            "errors": [{"index": index, "reason": reason} for index, reason in response["errors"]]
         }
         
     except Exception as e:
@@ -299,27 +412,27 @@ def subscribe_to_topic(tokens: List[str], topic: str) -> Dict[str, Any]:
 
 def unsubscribe_from_topic(tokens: List[str], topic: str) -> Dict[str, Any]:
     """
-    Désabonne des appareils d'un topic.
+    Désabonne des appareils d'un topic (1000 tokens max par appel).
     
     Args:
         tokens: Liste de tokens FCM
         topic: Nom du topic
     
     Returns:
-        Dict avec le résultat
+        Dict avec le résultat ; errors donne l'erreur de chaque token
+        refusé (index dans tokens)
     """
     if not is_firebase_available():
-        return {"success": False, "error": "Firebase not configured"}
+        return {"success": False, "error": "Firebase not configured", "simulated": True}
     
     try:
-        from firebase_admin import messaging
-        
-        response = messaging.unsubscribe_from_topic(tokens, topic)
+        response = get_transport().unsubscribe(tokens, topic)
         
         return {
             "success": True,
-            "unsubscribed": response.success_count,
-            "failed": response.failure_count
+            "unsubscribed": response["success_count"],
+            "failed": response["failure_count"],
+            "errors": [{"index": index, "reason": reason} for index, reason in response["errors"]]
         }
         
     except Exception as e:
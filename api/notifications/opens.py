@@ -0,0 +1,158 @@
+"""
+Comptage des ouvertures de notifications
+
+Après un envoi, des milliers d'appareils peuvent signaler l'ouverture en
+même temps : au lieu d'une écriture par appel (verrous sur la même ligne),
+les ouvertures sont cumulées en mémoire par notification et enregistrées
+toutes les OPEN_FLUSH_INTERVAL secondes par lot.
+
+Un appareil n'est compté qu'une fois par notification, quels que soient
+le worker et le moment du signalement : chaque ouverture est insérée dans
+notification_opens (clé notification + token, ON CONFLICT DO NOTHING) et
+opened_count n'augmente que des lignes réellement insérées.
+
+Variables d'environnement :
+    OPEN_FLUSH_INTERVAL : délai max avant enregistrement, en secondes (défaut 5)
+"""
+import os
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, Optional, Set, Tuple
+from uuid import UUID
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# Notifications distinctes gardées en mémoire si la base est indisponible
+MAX_PENDING_NOTIFICATIONS = 10000
+
+
+class OpenCounter:
+    """Ouvertures en attente d'enregistrement pour ce worker"""
+
+    def __init__(self):
+        # (événement, notification) -> appareils ayant signalé l'ouverture
+        self._pending: Dict[Tuple[UUID, UUID], Set[str]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self.stats = {"opens": 0, "counted": 0, "flushes": 0, "dropped": 0, "duplicates": 0}
+
+    def _ensure_started(self):
+        """Démarre l'enregistrement périodique au premier usage (dans la boucle asyncio)"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def record(self, event_id: UUID, notification_id: UUID, device: str) -> bool:
+        """
+        Note une ouverture (enregistrée au prochain flush) ; False si elle est
+        ignorée (déjà signalée depuis le dernier flush, ou trop de notifications
+        en attente). Une ouverture déjà enregistrée est écartée au flush.
+        """
+        self._ensure_started()
+        key = (event_id, notification_id)
+        devices = self._pending.get(key)
+        if devices is None:
+            if len(self._pending) >= MAX_PENDING_NOTIFICATIONS:
+                self.stats["dropped"] += 1
+                return False
+            devices = self._pending[key] = set()
+        if device in devices:
+            self.stats["duplicates"] += 1
+            return False
+        devices.add(device)
+        self.stats["opens"] += 1
+        return True
+
+    async def _flush_loop(self):
+        interval = float(os.environ.get("OPEN_FLUSH_INTERVAL", 5))
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    async def flush(self):
+        """Enregistre les ouvertures en attente (un lot)"""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        try:
+            counted = await run_in_threadpool(_save_opens, batch)
+            self.stats["flushes"] += 1
+            self.stats["counted"] += counted
+            self.stats["duplicates"] += sum(len(devices) for devices in batch.values()) - counted
+        except Exception as e:
+            logger.error(f"Notification opens not saved ({len(batch)} notifications): {e}")
+            # Réessayé au prochain flush
+            for key, devices in batch.items():
+                self._pending.setdefault(key, set()).update(devices)
+
+    async def stop(self):
+        """Arrête l'enregistrement périodique et enregistre les ouvertures en attente"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+
+def _save_opens(batch: Dict[Tuple[UUID, UUID], Set[str]]) -> int:
+    """
+    Enregistre un lot d'ouvertures (session dédiée, hors requête) :
+    INSERT ... ON CONFLICT DO NOTHING dans notification_opens, puis
+    opened_count augmenté des seules premières ouvertures, en un
+    UPDATE ... FROM (VALUES ...).
+
+    Returns:
+        Nombre d'ouvertures comptées (premières ouvertures de l'appareil)
+    """
+    from sqlalchemy import and_, column, func, select, update, values, Integer, String
+    from sqlalchemy.dialects.postgresql import UUID as PG_UUID, insert
+    from core.database import SessionLocal
+    from core.models import NotificationOpen, PushNotification
+
+    opens = values(
+        column("event_id", PG_UUID(as_uuid=True)),
+        column("id", PG_UUID(as_uuid=True)),
+        column("token", String),
+        name="opens"
+    ).data([
+        (event_id, notification_id, device)
+        for (event_id, notification_id), devices in batch.items()
+        for device in devices
+    ])
+
+    db = SessionLocal()
+    try:
+        # Les ids inconnus (ou d'un autre événement) ne correspondent à aucune notification
+        inserted = db.scalars(
+            insert(NotificationOpen)
+            .from_select(
+                ["notification_id", "token"],
+                select(opens.c.id, opens.c.token).join(
+                    PushNotification,
+                    and_(PushNotification.id == opens.c.id, PushNotification.event_id == opens.c.event_id)
+                )
+            )
+            .on_conflict_do_nothing()
+            .returning(NotificationOpen.notification_id)
+        ).all()
+
+        deltas = Counter(inserted)
+        if deltas:
+            counts = values(
+                column("id", PG_UUID(as_uuid=True)),
+                column("delta", Integer),
+                name="counts"
+            ).data(list(deltas.items()))
+            db.execute(
+                update(PushNotification)
+                .where(PushNotification.id == counts.c.id)
+                .values(opened_count=func.coalesce(PushNotification.opened_count, 0) + counts.c.delta)
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+        return len(inserted)
+    finally:
+        db.close()
+
+
+open_counter = OpenCounter()
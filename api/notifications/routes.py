@@ -1,22 +1,50 @@
 """
 Routes pour les notifications push
 """
-from typing import List, Optional
+from typing import Dict, List, Optional
 from uuid import UUID
-from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import exists, func
 from sqlalchemy.orm import Session
 
 from core.database import get_db
-from core.models import Event, PushNotification
+from core.models import Event, PushNotification, InvitationGroup, Guest, DeviceToken
 from core.schemas import (
     NotificationCreate, NotificationResponse, SuccessResponse
 )
 from core.security import verify_admin_api_key
-from .firebase_service import send_to_event, is_firebase_available
+from .firebase_service import is_firebase_available
+from .dispatcher import schedule_notification
+from .timer import publish_schedule_change
+from .opens import open_counter
 
 router = APIRouter()
 
+# Quota du pack Essentiel
+ESSENTIAL_NOTIFICATION_QUOTA = 5
+# Notifications qui consomment le quota (envoyées ou en passe de l'être)
+QUOTA_STATUSES = ('scheduled', 'queued', 'retrying', 'sent')
+
+
+def _status_counts(db: Session, event_id: UUID) -> Dict[str, int]:
+    """Nombre de notifications par statut (une seule requête groupée)"""
+    rows = db.query(PushNotification.status, func.count()).filter(
+        PushNotification.event_id == event_id
+    ).group_by(PushNotification.status).all()
+    return {status: count for status, count in rows}
+
+
+def _quota(event: Event, counts: Dict[str, int]) -> Dict[str, Optional[int]]:
+    """Quota de l'événement (pack Essentiel = 5, autres = illimité)"""
+    used = sum(counts.get(status, 0) for status in QUOTA_STATUSES)
+    limit = ESSENTIAL_NOTIFICATION_QUOTA if event.pack == 'essential' else None
+    return {
+        "used": used,
+        "limit": limit,
+        "remaining": max(limit - used, 0) if limit is not None else None
+    }
+
 
 @router.post("/{event_id}/notifications", response_model=NotificationResponse, status_code=201)
 async def create_notification(
@@ -29,60 +57,60 @@ async def create_notification(
     Créer et envoyer une notification (CMS)
     
     Si scheduled_at est fourni, la notification sera envoyée plus tard.
-    Sinon, envoi immédiat via Firebase FCM.
+    Sinon, elle est mise en file ('queued') et envoyée via Firebase FCM
+    en arrière-plan : le statut passe ensuite à 'sent' ou 'failed'.
+    Si target_group_id est fourni, seuls les invités du groupe la reçoivent.
     """
-    # Vérifier que l'événement existe
-    event = db.query(Event).filter(Event.id == event_id).first()
+    # Vérifier le groupe cible
+    if notif_data.target_group_id:
+        group = db.query(InvitationGroup).filter(
+            InvitationGroup.id == notif_data.target_group_id,
+            InvitationGroup.event_id == event_id
+        ).first()
+        if not group:
+            raise HTTPException(status_code=404, detail="Group not found")
+    
+    # Vérifier que l'événement existe (verrou jusqu'au commit : deux envois
+    # simultanés ne peuvent pas dépasser le quota)
+    event = db.query(Event).filter(Event.id == event_id).with_for_update().first()
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
     
-    # Vérifier le quota (pack Essentiel = 5 notifs max)
-    if event.pack == 'essential':
-        sent_count = db.query(PushNotification).filter(
-            PushNotification.event_id == event_id,
-            PushNotification.status == 'sent'
-        ).count()
-        
-        if sent_count >= 5:
-            raise HTTPException(
-                status_code=400, 
-                detail="Notification quota reached (5/5 for Essential pack)"
-            )
-    
-    # Déterminer le statut
-    if notif_data.scheduled_at:
-        # Programmé pour plus tard
-        status = 'scheduled'
-        sent_at = None
-        fcm_result = None
-    else:
-        # Envoi immédiat via Firebase FCM
-        fcm_result = send_to_event(
-            event_id=str(event_id),
-            title=notif_data.title,
-            body=notif_data.message
+    # Vérifier le quota (pack Essentiel = 5 notifs max, programmées comprises)
+    quota = _quota(event, _status_counts(db, event_id))
+    if quota["remaining"] == 0:
+        # Libère le verrou avant de répondre (la session n'est fermée qu'après)
+        db.rollback()
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Notification quota reached ({quota['used']}/{quota['limit']} for Essential pack)"
         )
-        
-        if fcm_result.get("success") or fcm_result.get("simulated"):
-            status = 'sent'
-            sent_at = datetime.utcnow()
-        else:
-            status = 'failed'
-            sent_at = None
     
     notification = PushNotification(
         event_id=event_id,
+        target_group_id=notif_data.target_group_id,
         title=notif_data.title,
         message=notif_data.message,
-        scheduled_at=notif_data.scheduled_at,
-        sent_at=sent_at,
-        status=status
+        scheduled_at=notif_data.scheduled_at
     )
     
+    # Déterminer le statut
+    if notif_data.scheduled_at:
+        # Programmé pour plus tard
+        notification.status = 'scheduled'
+    else:
+        # Envoi immédiat, en arrière-plan
+        notification.status = 'queued'
+    
     db.add(notification)
     db.commit()
     db.refresh(notification)
     
+    if notification.status == 'queued':
+        schedule_notification(notification.id)
+    else:
+        publish_schedule_change(notification)
+    
     return notification
 
 
@@ -110,6 +138,33 @@ async def list_notifications(
     return notifications
 
 
+@router.get("/{event_id}/notifications/stats")
+async def get_notification_stats(
+    event_id: UUID,
+    db: Session = Depends(get_db),
+    _api_key: str = Depends(verify_admin_api_key)
+):
+    """Récupère les statistiques des notifications pour un événement (CMS) - Protégé par API key"""
+    event = db.query(Event).filter(Event.id == event_id).first()
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    # Compter par statut
+    counts = _status_counts(db, event_id)
+    
+    return {
+        "total": sum(counts.values()),
+        "sent": counts.get('sent', 0),
+        "scheduled": counts.get('scheduled', 0),
+        "queued": counts.get('queued', 0),
+        "retrying": counts.get('retrying', 0),
+        "failed": counts.get('failed', 0),
+        "dead": counts.get('dead', 0),
+        "firebase_available": is_firebase_available(),
+        "quota": _quota(event, counts)
+    }
+
+
 @router.get("/{event_id}/notifications/{notif_id}", response_model=NotificationResponse)
 async def get_notification(
     event_id: UUID,
@@ -129,6 +184,38 @@ async def get_notification(
     return notification
 
 
+class NotificationOpenedRequest(BaseModel):
+    token: str  # token FCM de l'appareil (abonné à l'événement)
+
+
+@router.post("/{event_id}/notifications/{notif_id}/opened", response_model=SuccessResponse, status_code=202)
+async def notification_opened(
+    event_id: UUID,
+    notif_id: UUID,
+    data: NotificationOpenedRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Signale l'ouverture d'une notification (mobile).
+    
+    Seuls les appareils abonnés à l'événement sont comptés, une fois
+    par notification même s'ils la signalent plusieurs fois (les ouvertures
+    sont cumulées puis enregistrées toutes les quelques secondes, voir
+    notifications.opens).
+    """
+    notification_known, device_known = db.query(
+        exists().where(PushNotification.id == notif_id, PushNotification.event_id == event_id),
+        exists().where(DeviceToken.event_id == event_id, DeviceToken.token == data.token)
+    ).one()
+    if not notification_known:
+        raise HTTPException(status_code=404, detail="Notification not found")
+    if not device_known:
+        raise HTTPException(status_code=403, detail="Device not subscribed to this event")
+    
+    open_counter.record(event_id, notif_id, data.token)
+    return SuccessResponse(message="Open recorded")
+
+
 @router.delete("/{event_id}/notifications/{notif_id}", response_model=SuccessResponse)
 async def cancel_notification(
     event_id: UUID,
@@ -150,19 +237,53 @@ async def cancel_notification(
     
     db.delete(notification)
     db.commit()
+    publish_schedule_change(notification, cancelled=True)
     
     return SuccessResponse(message="Notification cancelled successfully")
 
 
 # === Routes d'abonnement (mobile) ===
 
-from pydantic import BaseModel
-from .firebase_service import subscribe_to_topic, unsubscribe_from_topic
+from .firebase_service import event_topic
+from .subscriptions import topic_batcher
 
 
 class SubscribeRequest(BaseModel):
     token: str
     platform: Optional[str] = None
+    personal_code: Optional[str] = None  # rattache l'appareil à l'invité (envois par groupe)
+
+
+def _register_device(db: Session, event_id: UUID, data: SubscribeRequest):
+    """Enregistre (ou met à jour) le token de l'appareil pour l'événement"""
+    from sqlalchemy.dialects.postgresql import insert
+
+    guest_id = None
+    if data.personal_code:
+        guest = db.query(Guest).filter(
+            Guest.event_id == event_id,
+            Guest.personal_code == data.personal_code.upper()
+        ).first()
+        if not guest:
+            raise HTTPException(status_code=404, detail="Guest not found")
+        guest_id = guest.id
+
+    statement = insert(DeviceToken).values(
+        event_id=event_id,
+        guest_id=guest_id,
+        token=data.token,
+        platform=data.platform
+    )
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[DeviceToken.event_id, DeviceToken.token],
+        set_={
+            # Un réabonnement sans code garde l'invité déjà connu
+            "guest_id": func.coalesce(statement.excluded.guest_id, DeviceToken.guest_id),
+            "platform": func.coalesce(statement.excluded.platform, DeviceToken.platform),
+            "updated_at": func.now(),
+        }
+    ))
+    db.commit()
 
 
 @router.post("/subscribe/{event_id}", response_model=SuccessResponse)
@@ -173,15 +294,20 @@ async def subscribe_to_event(
 ):
     """
     Abonne un device aux notifications d'un événement (mobile).
-    Le token FCM sera abonné au topic event_{event_id}.
+    Le token FCM sera abonné au topic event_{event_id} (appel Firebase
+    groupé avec les autres appareils qui s'abonnent au même moment).
+    Avec personal_code, l'appareil reçoit aussi les notifications
+    ciblées sur le groupe de l'invité.
     """
     # Vérifier que l'événement existe
     event = db.query(Event).filter(Event.id == event_id).first()
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
     
+    _register_device(db, event_id, data)
+    
     # Abonner au topic Firebase
-    result = subscribe_to_topic(data.token, str(event_id))
+    result = await topic_batcher.subscribe(data.token, event_topic(event_id))
     
     if result.get("success") or result.get("simulated"):
         return SuccessResponse(message=f"Subscribed to event {event_id}")
@@ -206,8 +332,14 @@ async def unsubscribe_from_event(
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
     
+    db.query(DeviceToken).filter(
+        DeviceToken.event_id == event_id,
+        DeviceToken.token == data.token
+    ).delete(synchronize_session=False)
+    db.commit()
+    
     # Désabonner du topic Firebase
-    result = unsubscribe_from_topic(data.token, str(event_id))
+    result = await topic_batcher.unsubscribe(data.token, event_topic(event_id))
     
     if result.get("success") or result.get("simulated"):
         return SuccessResponse(message=f"Unsubscribed from event {event_id}")
@@ -216,51 +348,3 @@ async def unsubscribe_from_event(
             status_code=500, 
             detail=f"Failed to unsubscribe: {result.get('error')}"
         )
-
-
-@router.get("/{event_id}/notifications/stats")
-async def get_notification_stats(
-    event_id: UUID,
-    db: Session = Depends(get_db),
-    _api_key: str = Depends(verify_admin_api_key)
-):
-    """Récupère les statistiques des notifications pour un événement (CMS) - Protégé par API key"""
-    event = db.query(Event).filter(Event.id == event_id).first()
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
-    
-    # Compter par statut
-    total = db.query(PushNotification).filter(
-        PushNotification.event_id == event_id
-    ).count()
-    
-    sent = db.query(PushNotification).filter(
-        PushNotification.event_id == event_id,
-        PushNotification.status == 'sent'
-    ).count()
-    
-    scheduled = db.query(PushNotification).filter(
-        PushNotification.event_id == event_id,
-        PushNotification.status == 'scheduled'
-    ).count()
-    
-    failed = db.query(PushNotification).filter(
-        PushNotification.event_id == event_id,
-        PushNotification.status == 'failed'
-    ).count()
-    
-    # Quota (pack Essentiel = 5, autres = illimité)
-    quota_limit = 5 if event.pack == 'essential' else None
-    
-    return {
-        "total": total,
-        "sent": sent,
-        "scheduled": scheduled,
-        "failed": failed,
-        "firebase_available": is_firebase_available(),
-        "quota": {
-            "used": sent,
-            "limit": quota_limit,
-            "remaining": (quota_limit - sent) if quota_limit else None
-        }
-    }
@@ -9,11 +9,14 @@ Usage:
 
 Ou via cron:
     * * * * * cd /app && python -m notifications.scheduler
+
+Envoi à la seconde près (timer réveillé par l'API, sans cron):
+    python -m notifications.scheduler --loop
 """
 import os
 import sys
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # Configurer le logging
 logging.basicConfig(
@@ -25,61 +28,160 @@ logger = logging.getLogger(__name__)
 # Ajouter le répertoire parent au path pour les imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import and_, or_, cast, column, update, values, DateTime, String, Text
+from sqlalchemy.dialects.postgresql import JSONB, UUID as PG_UUID
 from sqlalchemy.orm import Session
 from core.database import SessionLocal
 from core.models import PushNotification
-from notifications.firebase_service import send_to_event
+from notifications.delivery import target_tokens, send_to_target, prune_tokens, delivery_outcome
+
+# Notifications 'queued' non envoyées par l'API après ce délai (worker arrêté)
+QUEUED_STALE_AFTER = timedelta(minutes=10)
+
+
+def _get_batch_size() -> int:
+    # Notifications réservées par transaction
+    return max(1, int(os.environ.get("NOTIFICATION_BATCH_SIZE", 50)))
+
+
+def _get_concurrency() -> int:
+    # Envois FCM simultanés
+    return max(1, int(os.environ.get("NOTIFICATION_SEND_CONCURRENCY", 8)))
+
+
+def _claim_due_notifications(db: Session, now: datetime, limit: int) -> List[PushNotification]:
+    """
+    Réserve un lot de notifications à envoyer.
+
+    FOR UPDATE SKIP LOCKED : les lignes déjà réservées par un autre runner
+    (ou en cours d'envoi par l'API) sont ignorées ; le verrou est tenu
+    jusqu'au commit du lot.
+    """
+    return db.query(PushNotification).filter(or_(
+        and_(
+            PushNotification.status == 'scheduled',
+            PushNotification.scheduled_at <= now
+        ),
+        and_(
+            PushNotification.status == 'retrying',
+            PushNotification.next_attempt_at <= now
+        ),
+        and_(
+            PushNotification.status == 'queued',
+            PushNotification.created_at <= now - QUEUED_STALE_AFTER
+        )
+    )).order_by(
+        PushNotification.scheduled_at.asc().nullsfirst()
+    ).limit(limit).with_for_update(skip_locked=True).all()
+
+
+def _send(job: Tuple) -> Dict[str, Any]:
+    """Envoi FCM d'une notification (thread du pool, sans session)"""
+    notification_id, event_id, title, message, tokens = job
+    try:
+        return send_to_target(event_id, title, message, tokens)
+    except Exception as e:
+        return {"success": False, "error": str(e), "transient": False}
+
+
+def _process_batch(db: Session, executor: ThreadPoolExecutor, now: datetime) -> Tuple[int, int]:
+    """
+    Réserve, envoie et enregistre un lot (nouvel essai planifié si l'erreur
+    est temporaire, pour les seuls appareils en échec d'un groupe ; 'dead'
+    après NOTIFICATION_MAX_ATTEMPTS essais).
+
+    Returns:
+        (notifications traitées, notifications envoyées)
+    """
+    batch = _claim_due_notifications(db, now, _get_batch_size())
+    if not batch:
+        db.commit()
+        return 0, 0
+
+    # Tokens des groupes chargés ici : les threads d'envoi n'utilisent pas la session
+    jobs = [
+        (n.id, n.event_id, n.title, n.message, target_tokens(db, n))
+        for n in batch
+    ]
+    results = list(executor.map(_send, jobs))
+
+    rows = []
+    sent_count = 0
+    for notification, (_, event_id, *_), result in zip(batch, jobs, results):
+        outcome = delivery_outcome(result, (notification.attempts or 0) + 1)
+        if outcome["status"] == 'sent':
+            sent_count += 1
+        else:
+            logger.error(
+                f"Failed to send notification {notification.id} "
+                f"({outcome['status']}): {outcome['last_error']}"
+            )
+        prune_tokens(db, event_id, result.get("invalid_tokens", ()))
+        rows.append((
+            notification.id, outcome["status"], outcome["sent_at"],
+            outcome["next_attempt_at"], outcome["last_error"], outcome["retry_tokens"]
+        ))
+
+    # Un seul UPDATE pour tout le lot : UPDATE ... FROM (VALUES ...)
+    results_table = values(
+        column("id", PG_UUID(as_uuid=True)),
+        column("status", String),
+        column("sent_at", DateTime(timezone=True)),
+        column("next_attempt_at", DateTime(timezone=True)),
+        column("last_error", Text),
+        column("retry_tokens", JSONB(none_as_null=True)),
+        name="results"
+    ).data(rows)
+    db.execute(
+        update(PushNotification)
+        .where(PushNotification.id == results_table.c.id)
+        .values(
+            status=results_table.c.status,
+            # Colonnes entièrement NULL : typées text par Postgres
+            sent_at=cast(results_table.c.sent_at, DateTime(timezone=True)),
+            next_attempt_at=cast(results_table.c.next_attempt_at, DateTime(timezone=True)),
+            last_error=results_table.c.last_error,
+            retry_tokens=cast(results_table.c.retry_tokens, JSONB),
+            attempts=PushNotification.attempts + 1
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return len(batch), sent_count
 
 
 def process_scheduled_notifications():
     """
-    Traite toutes les notifications programmées dont l'heure est passée.
+    Traite toutes les notifications programmées dont l'heure est passée,
+    et les envois immédiats restés en file (API arrêtée avant l'envoi).
+
+    Les notifications sont réservées par lots (NOTIFICATION_BATCH_SIZE) et
+    envoyées en parallèle (NOTIFICATION_SEND_CONCURRENCY) : plusieurs
+    runners peuvent tourner en même temps sans double envoi.
     """
     db: Session = SessionLocal()
     
     try:
         now = datetime.utcnow()
+        processed_count = 0
+        sent_count = 0
         
-        # Récupérer les notifications programmées prêtes à être envoyées
-        scheduled = db.query(PushNotification).filter(
-            PushNotification.status == 'scheduled',
-            PushNotification.scheduled_at <= now
-        ).all()
+        with ThreadPoolExecutor(max_workers=_get_concurrency(), thread_name_prefix="notif") as executor:
+            while True:
+                processed, sent = _process_batch(db, executor, now)
+                processed_count += processed
+                sent_count += sent
+                if processed < _get_batch_size():
+                    break
         
-        if not scheduled:
+        if not processed_count:
             logger.info("No scheduled notifications to send")
             return 0
         
-        sent_count = 0
-        
-        for notification in scheduled:
-            logger.info(
-                f"Processing notification {notification.id} "
-                f"for event {notification.event_id}"
-            )
-            
-            # Envoyer via Firebase
-            result = send_to_event(
-                event_id=str(notification.event_id),
-                title=notification.title,
-                body=notification.message
-            )
-            
-            if result.get("success") or result.get("simulated"):
-                notification.status = 'sent'
-                notification.sent_at = datetime.utcnow()
-                sent_count += 1
-                logger.info(f"Notification {notification.id} sent successfully")
-            else:
-                notification.status = 'failed'
-                logger.error(
-                    f"Failed to send notification {notification.id}: "
-                    f"{result.get('error')}"
-                )
-            
-            db.commit()
-        
-        logger.info(f"Processed {len(scheduled)} notifications, {sent_count} sent")
+        logger.info(f"Processed {processed_count} notifications, {sent_count} sent")
         return sent_count
         
     except Exception as e:
@@ -93,20 +195,14 @@ def process_scheduled_notifications():
 
 def run_scheduler_loop():
     """
-    Exécute le scheduler en boucle (pour les environnements sans cron).
-    Vérifie toutes les 60 secondes.
+    Exécute le scheduler en continu (pour les environnements sans cron).
+    Envoi à l'heure programmée, réveillé par l'API (voir notifications.timer).
     """
-    import time
+    import asyncio
+    from notifications.timer import run_notification_timer
     
     logger.info("Starting notification scheduler loop")
-    
-    while True:
-        try:
-            process_scheduled_notifications()
-        except Exception as e:
-            logger.error(f"Scheduler error: {e}")
-        
-        time.sleep(60)  # Attendre 60 secondes
+    asyncio.run(run_notification_timer())
 
 
 if __name__ == "__main__":
@@ -116,7 +212,7 @@ if __name__ == "__main__":
     parser.add_argument(
         "--loop",
         action="store_true",
-        help="Run in loop mode (for environments without cron)"
+        help="Run the precise timer loop (for environments without cron)"
     )
     
     args = parser.parse_args()
@@ -0,0 +1,163 @@
+"""
+Abonnements aux topics FCM par lots
+
+À l'ouverture de l'app, des centaines d'appareils s'abonnent en même
+temps : au lieu d'un appel Firebase par appareil, les demandes sont
+regroupées par topic et envoyées toutes les TOPIC_FLUSH_INTERVAL secondes
+(ou dès que 1000 tokens attendent, limite FCM par appel). Chaque requête
+attend le résultat de son propre token.
+
+Pour un même topic, les lots d'abonnement et de désabonnement sont
+envoyés l'un après l'autre, dans l'ordre des demandes : un abonnement
+suivi d'un désabonnement rapide du même appareil finit désabonné.
+
+Variables d'environnement :
+    TOPIC_FLUSH_INTERVAL : délai max avant l'appel Firebase, en secondes (défaut 0.5)
+"""
+import os
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from .firebase_service import subscribe_to_topic, unsubscribe_from_topic
+
+logger = logging.getLogger(__name__)
+
+# Tokens max par appel d'abonnement (limite FCM)
+TOPIC_BATCH_SIZE = 1000
+# Attente max d'une requête (lot + appel Firebase)
+RESULT_TIMEOUT_SECONDS = 30
+
+SUBSCRIBE = "subscribe"
+UNSUBSCRIBE = "unsubscribe"
+
+
+class TopicSubscriptionBatcher:
+    """Demandes d'abonnement en attente pour ce worker"""
+
+    def __init__(self):
+        # topic -> lots dans l'ordre des demandes : (action, token -> résultats attendus)
+        self._pending: Dict[str, List[Tuple[str, Dict[str, List[asyncio.Future]]]]] = {}
+        self._flush_wakeup: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self.stats = {"requests": 0, "calls": 0}
+
+    def _ensure_started(self):
+        """Démarre les envois périodiques au premier usage (dans la boucle asyncio)"""
+        if self._flush_task is None:
+            self._flush_wakeup = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def _batch_for(self, action: str, token: str, topic: str) -> Dict[str, List[asyncio.Future]]:
+        """Lot du topic où ajouter la demande sans passer devant une demande plus récente du token"""
+        batches = self._pending.setdefault(topic, [])
+        if batches and batches[-1][0] == action:
+            return batches[-1][1]
+        # Les lots alternent : l'avant-dernier a la même action. On peut s'y
+        # ajouter si le token n'a pas de demande dans le dernier lot.
+        if len(batches) >= 2 and token not in batches[-1][1]:
+            return batches[-2][1]
+        tokens: Dict[str, List[asyncio.Future]] = {}
+        batches.append((action, tokens))
+        return tokens
+
+    async def _request(self, action: str, token: str, topic: str) -> Dict[str, Any]:
+        self._ensure_started()
+        self.stats["requests"] += 1
+        future = asyncio.get_running_loop().create_future()
+        tokens = self._batch_for(action, token, topic)
+        tokens.setdefault(token, []).append(future)
+        if len(tokens) >= TOPIC_BATCH_SIZE:
+            self._flush_wakeup.set()
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), RESULT_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            return {"success": False, "error": "Topic subscription timed out"}
+
+    async def subscribe(self, token: str, topic: str) -> Dict[str, Any]:
+        """Abonne le token au topic (au prochain lot) ; success / simulated / error"""
+        return await self._request(SUBSCRIBE, token, topic)
+
+    async def unsubscribe(self, token: str, topic: str) -> Dict[str, Any]:
+        """Désabonne le token du topic (au prochain lot)"""
+        return await self._request(UNSUBSCRIBE, token, topic)
+
+    async def _flush_loop(self):
+        interval = float(os.environ.get("TOPIC_FLUSH_INTERVAL", 0.5))
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                # La boucle doit survivre : sinon toutes les demandes suivantes expirent
+                logger.error(f"Topic subscription flush failed: {e}")
+
+    async def flush(self):
+        """Envoie les demandes en attente (topics en parallèle, lots d'un topic dans l'ordre)"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+
+        try:
+            await asyncio.gather(*(
+                self._flush_topic(topic, batches) for topic, batches in pending.items()
+            ))
+        finally:
+            # Demandes restées sans réponse (erreur inattendue) : échec immédiat
+            for batches in pending.values():
+                for _, tokens in batches:
+                    for futures in tokens.values():
+                        for future in futures:
+                            if not future.done():
+                                future.set_result({"success": False, "error": "Topic subscription failed"})
+
+    async def _flush_topic(self, topic: str, batches: List[Tuple[str, Dict[str, List[asyncio.Future]]]]):
+        """Lots d'un topic l'un après l'autre ; un appel par tranche de 1000 tokens"""
+        for action, tokens in batches:
+            items = list(tokens.items())
+            await asyncio.gather(*(
+                self._call(action, topic, items[start:start + TOPIC_BATCH_SIZE])
+                for start in range(0, len(items), TOPIC_BATCH_SIZE)
+            ))
+
+    async def _call(self, action: str, topic: str, items: List[Tuple[str, List[asyncio.Future]]]):
+        """Un appel Firebase pour un lot ; résultat rendu à chaque requête"""
+        function = subscribe_to_topic if action == SUBSCRIBE else unsubscribe_from_topic
+        tokens = [token for token, _ in items]
+        self.stats["calls"] += 1
+        try:
+            result = await run_in_threadpool(function, tokens, topic)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+
+        if result.get("success"):
+            errors = {error["index"]: error["reason"] for error in result.get("errors", [])}
+            results = [
+                {"success": False, "error": errors[index]} if index in errors else {"success": True}
+                for index in range(len(items))
+            ]
+        else:
+            logger.error(f"Topic {action} failed for {topic} ({len(tokens)} tokens): {result.get('error')}")
+            failure = {key: result[key] for key in ("success", "error", "simulated") if key in result}
+            results = [failure] * len(items)
+
+        for (_, futures), token_result in zip(items, results):
+            for future in futures:
+                if not future.done():
+                    future.set_result(token_result)
+
+    async def stop(self):
+        """Arrête les envois périodiques et envoie les demandes en attente"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+
+topic_batcher = TopicSubscriptionBatcher()
@@ -0,0 +1,183 @@
+"""
+Déclenchement précis des notifications programmées
+
+Au lieu d'interroger la base toutes les minutes, le timer garde en mémoire
+(tas trié) les prochaines heures d'envoi (programmées ou nouveaux essais
+après une erreur temporaire), dort jusqu'à la plus proche et
+lance alors process_scheduled_notifications. L'API le réveille (Postgres
+NOTIFY, via core.pubsub) quand une notification est programmée ou annulée :
+l'envoi part à la seconde près, sans requête entre deux échéances.
+
+Une resynchronisation complète a lieu toutes les TIMER_RESYNC_SECONDS
+(notifications manquées si le runner était arrêté, envois restés en file).
+
+Usage (runner de jobs) :
+    asyncio.run(run_notification_timer())
+"""
+import os
+import heapq
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from core.pubsub import pubsub
+
+logger = logging.getLogger(__name__)
+
+# Canal pub/sub des changements de programmation
+SCHEDULE_CHANNEL = "notification_schedule"
+# Échéances chargées au plus depuis la base
+LOAD_LIMIT = 1000
+# Marge après l'échéance (horloges base / runner)
+TIMER_SLACK_SECONDS = 0.05
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Les dates sans fuseau sont en UTC (datetime.utcnow dans le reste de l'API)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def publish_due_time(notification_id: UUID, due_at: datetime):
+    """Réveille le timer des runners pour une échéance (à appeler après le commit)"""
+    pubsub.publish(SCHEDULE_CHANNEL, "scheduled", {
+        "id": str(notification_id),
+        "scheduled_at": _as_utc(due_at).isoformat(),
+    })
+
+
+def publish_schedule_change(notification, cancelled: bool = False):
+    """Programmation ou annulation d'une notification (à appeler après le commit)"""
+    if cancelled:
+        pubsub.publish(SCHEDULE_CHANNEL, "cancelled", {"id": str(notification.id)})
+    elif notification.status == 'scheduled' and notification.scheduled_at:
+        publish_due_time(notification.id, notification.scheduled_at)
+
+
+def _load_due_times() -> List[Tuple[datetime, str]]:
+    """Prochaines échéances : envois programmés et nouveaux essais (session dédiée)"""
+    from sqlalchemy import case
+    from core.database import SessionLocal
+    from core.models import PushNotification
+
+    due_at = case(
+        (PushNotification.status == 'retrying', PushNotification.next_attempt_at),
+        else_=PushNotification.scheduled_at
+    )
+    db = SessionLocal()
+    try:
+        rows = db.query(due_at.label("due_at"), PushNotification.id).filter(
+            PushNotification.status.in_(['scheduled', 'retrying']),
+            due_at.isnot(None)
+        ).order_by(due_at.asc()).limit(LOAD_LIMIT).all()
+        return [(_as_utc(row.due_at), str(row.id)) for row in rows]
+    finally:
+        db.close()
+
+
+class NotificationTimer:
+    """Tas des prochaines échéances, réveillé par pub/sub"""
+
+    def __init__(self, resync_seconds: float):
+        self.resync_seconds = resync_seconds
+        self._heap: List[Tuple[datetime, str]] = []
+        self._cancelled: Set[str] = set()
+        self._truncated = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self.stats = {"runs": 0, "reloads": 0, "wakeups": 0, "stalled": 0}
+
+    def _on_message(self, topic: str, data: Dict):
+        """Programmation ou annulation publiée par l'API"""
+        self.stats["wakeups"] += 1
+        if topic == "scheduled":
+            self._cancelled.discard(data["id"])
+            heapq.heappush(self._heap, (datetime.fromisoformat(data["scheduled_at"]), data["id"]))
+        elif topic == "cancelled":
+            self._cancelled.add(data["id"])
+        self._wakeup.set()
+
+    def _load(self, rows: List[Tuple[datetime, str]], stalled_before: Optional[datetime] = None):
+        """
+        Remplace le tas par les échéances chargées.
+
+        Avec stalled_before, les échéances déjà dues avant le dernier passage
+        sont écartées jusqu'à la prochaine resynchronisation : ligne verrouillée
+        par un autre runner (SKIP LOCKED) ou erreur avalée par le scheduler.
+        Les remettre dans le tas relancerait un passage aussitôt, en boucle.
+        """
+        kept = rows
+        if stalled_before is not None:
+            kept = [row for row in rows if row[0] > stalled_before]
+            self.stats["stalled"] += len(rows) - len(kept)
+        self._heap = kept  # déjà trié : un tas valide
+        self._cancelled.clear()
+        # Tout le lot écarté : on attend la resynchronisation plutôt que recharger
+        self._truncated = len(rows) == LOAD_LIMIT and bool(kept)
+
+    async def _reload(self, stalled_before: Optional[datetime] = None):
+        rows = await asyncio.to_thread(_load_due_times)
+        self._load(rows, stalled_before)
+        self.stats["reloads"] += 1
+
+    async def _process(self, resync: bool = False):
+        """Envoie ce qui est dû, puis recharge les échéances (nouveaux essais compris)"""
+        from notifications.scheduler import process_scheduled_notifications
+        started_at = datetime.now(timezone.utc)
+        self.stats["runs"] += 1
+        await asyncio.to_thread(process_scheduled_notifications)
+        await self._reload(None if resync else started_at)
+
+    def _pop_due(self, now: datetime) -> bool:
+        """Retire les échéances passées ; True si au moins une est à envoyer"""
+        due = False
+        while self._heap and self._heap[0][0] <= now:
+            _, notification_id = heapq.heappop(self._heap)
+            if notification_id in self._cancelled:
+                self._cancelled.discard(notification_id)
+            else:
+                due = True
+        return due
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        pubsub.subscribe(SCHEDULE_CHANNEL, self._on_message)
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                # Resynchronisation : rattrapage, envois restés en file, rechargement
+                # complet (échéances écartées comprises)
+                await self._process(resync=True)
+                resync_at = loop.time() + self.resync_seconds
+
+                while loop.time() < resync_at:
+                    now = datetime.now(timezone.utc)
+                    if self._pop_due(now):
+                        await self._process()
+                        continue
+                    if not self._heap and self._truncated:
+                        break  # échéances au-delà de LOAD_LIMIT : recharger
+
+                    delay = resync_at - loop.time()
+                    if self._heap:
+                        until_due = (self._heap[0][0] - now).total_seconds() + TIMER_SLACK_SECONDS
+                        delay = min(delay, until_due)
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), max(delay, 0))
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            pubsub.unsubscribe(SCHEDULE_CHANNEL, self._on_message)
+
+
+async def run_notification_timer():
+    """Boucle du timer (resynchronisation toutes les TIMER_RESYNC_SECONDS, défaut 300)"""
+    timer = NotificationTimer(float(os.environ.get("TIMER_RESYNC_SECONDS", 300)))
+    logger.info("Starting notification timer")
+    try:
+        await timer.run()
+    finally:
+        await pubsub.stop()
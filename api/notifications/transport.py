@@ -0,0 +1,223 @@
+"""
+Transports FCM
+
+- FirebaseTransport : SDK Firebase Admin (production)
+- HttpTransport : API FCM v1 par HTTP vers une URL configurable, pour
+  le serveur local notifications.fcm_standin (tests de charge sans Google)
+
+Les deux exposent la même interface (send, send_each, subscribe,
+unsubscribe) et remontent les erreurs sous une forme que
+firebase_service sait classer (temporaire, token invalide).
+
+Variables d'environnement :
+    FCM_TRANSPORT : firebase (défaut) ou http
+    FCM_HTTP_URL : URL du serveur FCM (transport http), ex. http://127.0.0.1:9099
+    FCM_HTTP_PROJECT : projet Firebase dans les URLs (défaut standin)
+    FCM_HTTP_TIMEOUT : timeout des requêtes, en secondes (défaut 10)
+"""
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Codes d'erreur FCM v1 (errorCode de FcmError)
+TRANSIENT_ERROR_CODES = {"QUOTA_EXCEEDED", "UNAVAILABLE", "INTERNAL", "DEADLINE_EXCEEDED"}
+INVALID_TOKEN_ERROR_CODES = {"UNREGISTERED", "SENDER_ID_MISMATCH"}
+# Envois simultanés pour send_each (transport http)
+HTTP_SEND_CONCURRENCY = 32
+
+
+def _error_code(code: Optional[str], status_code: int) -> str:
+    """
+    Code FCM d'une réponse en erreur : un code inconnu est classé d'après
+    le statut HTTP (429 et RESOURCE_EXHAUSTED = quota, 5xx = indisponible),
+    pour que ces erreurs restent temporaires.
+    """
+    if code in TRANSIENT_ERROR_CODES or code in INVALID_TOKEN_ERROR_CODES:
+        return code
+    if status_code == 429 or code == "RESOURCE_EXHAUSTED":
+        return "QUOTA_EXCEEDED"
+    if status_code >= 500:
+        return "INTERNAL" if status_code == 500 else "UNAVAILABLE"
+    return code or f"HTTP_{status_code}"
+
+
+class FcmError(Exception):
+    """Erreur renvoyée par l'API FCM v1 (transport http)"""
+
+    def __init__(self, code: str, message: str = ""):
+        super().__init__(f"{code}: {message}" if message else code)
+        self.code = code
+
+    @property
+    def transient(self) -> bool:
+        return self.code in TRANSIENT_ERROR_CODES
+
+    @property
+    def invalid_token(self) -> bool:
+        return self.code in INVALID_TOKEN_ERROR_CODES
+
+
+class SendResult:
+    """Résultat d'un message dans send_each (comme messaging.SendResponse)"""
+
+    def __init__(self, message_id: Optional[str] = None, exception: Optional[Exception] = None):
+        self.message_id = message_id
+        self.exception = exception
+
+    @property
+    def success(self) -> bool:
+        return self.exception is None
+
+
+class FirebaseTransport:
+    """Envois via le SDK Firebase Admin"""
+
+    name = "firebase"
+
+    def available(self) -> bool:
+        from .firebase_service import _get_firebase_app
+        return _get_firebase_app() is not None
+
+    def _message(self, message: Dict[str, Any]):
+        from firebase_admin import messaging
+        return messaging.Message(
+            notification=messaging.Notification(**message["notification"]),
+            data=message.get("data") or {},
+            topic=message.get("topic"),
+            token=message.get("token"),
+        )
+
+    def send(self, message: Dict[str, Any]) -> str:
+        from firebase_admin import messaging
+        return messaging.send(self._message(message))
+
+    def send_each(self, messages: List[Dict[str, Any]]) -> List[SendResult]:
+        from firebase_admin import messaging
+        response = messaging.send_each([self._message(message) for message in messages])
+        return [SendResult(result.message_id, result.exception) for result in response.responses]
+
+    def _topic_result(self, response) -> Dict[str, Any]:
+        return {
+            "success_count": response.success_count,
+            "failure_count": response.failure_count,
+            "errors": [(error.index, error.reason) for error in response.errors],
+        }
+
+    def subscribe(self, tokens: List[str], topic: str) -> Dict[str, Any]:
+        from firebase_admin import messaging
+        return self._topic_result(messaging.subscribe_to_topic(tokens, topic))
+
+    def unsubscribe(self, tokens: List[str], topic: str) -> Dict[str, Any]:
+        from firebase_admin import messaging
+        return self._topic_result(messaging.unsubscribe_from_topic(tokens, topic))
+
+
+class HttpTransport:
+    """
+    Envois via l'API FCM v1 (HTTP) vers une URL configurable.
+
+    Même forme de requêtes et de réponses que FCM : messages:send pour
+    chaque message, iid/v1:batchAdd / batchRemove pour les topics.
+    """
+
+    name = "http"
+
+    def __init__(self, base_url: str, project_id: str = "standin", timeout: float = 10):
+        import httpx
+
+        self.project_id = project_id
+        self._client = httpx.Client(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=HTTP_SEND_CONCURRENCY)
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=HTTP_SEND_CONCURRENCY, thread_name_prefix="fcm-http"
+        )
+
+    def available(self) -> bool:
+        return True
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        import httpx
+
+        try:
+            response = self._client.post(path, json=payload)
+        except httpx.TimeoutException as e:
+            raise FcmError("DEADLINE_EXCEEDED", str(e))
+        except httpx.TransportError as e:
+            raise FcmError("UNAVAILABLE", str(e))
+
+        if response.status_code >= 400:
+            try:
+                error = response.json().get("error", {})
+            except ValueError:
+                error = {}
+            # errorCode FCM dans details, sinon statut Google (UNAVAILABLE, INTERNAL...)
+            code = next(
+                (detail["errorCode"] for detail in error.get("details", []) if "errorCode" in detail),
+                error.get("status")
+            )
+            raise FcmError(_error_code(code, response.status_code), error.get("message", ""))
+        return response.json()
+
+    def send(self, message: Dict[str, Any]) -> str:
+        return self._post(
+            f"/v1/projects/{self.project_id}/messages:send", {"message": message}
+        )["name"]
+
+    def _send_result(self, message: Dict[str, Any]) -> SendResult:
+        try:
+            return SendResult(message_id=self.send(message))
+        except FcmError as e:
+            return SendResult(exception=e)
+
+    def send_each(self, messages: List[Dict[str, Any]]) -> List[SendResult]:
+        # Comme le SDK : une requête par message, en parallèle
+        return list(self._executor.map(self._send_result, messages))
+
+    def _topic_request(self, action: str, tokens: List[str], topic: str) -> Dict[str, Any]:
+        results = self._post(f"/iid/v1:{action}", {
+            "to": f"/topics/{topic}",
+            "registration_tokens": tokens,
+        })["results"]
+        errors = [(index, result["error"]) for index, result in enumerate(results) if "error" in result]
+        return {
+            "success_count": len(results) - len(errors),
+            "failure_count": len(errors),
+            "errors": errors,
+        }
+
+    def subscribe(self, tokens: List[str], topic: str) -> Dict[str, Any]:
+        return self._topic_request("batchAdd", tokens, topic)
+
+    def unsubscribe(self, tokens: List[str], topic: str) -> Dict[str, Any]:
+        return self._topic_request("batchRemove", tokens, topic)
+
+
+# Transport global (initialisé à la première utilisation)
+_transport = None
+
+
+def get_transport():
+    """Retourne le transport FCM configuré (singleton)"""
+    global _transport
+
+    if _transport is not None:
+        return _transport
+
+    if os.environ.get("FCM_TRANSPORT", "firebase").lower() == "http":
+        base_url = os.environ.get("FCM_HTTP_URL", "http://127.0.0.1:9099")
+        _transport = HttpTransport(
+            base_url,
+            project_id=os.environ.get("FCM_HTTP_PROJECT", "standin"),
+            timeout=float(os.environ.get("FCM_HTTP_TIMEOUT", 10))
+        )
+        logger.info(f"FCM HTTP transport: {base_url}")
+    else:
+        _transport = FirebaseTransport()
+
+    return _transport
@@ -0,0 +1,156 @@
+"""
+Export de l'album photo d'un événement en archive ZIP
+
+L'archive est produite au fil de l'eau (jamais entièrement en mémoire ni
+sur disque) : chaque original est téléchargé depuis le stockage dans un
+fichier temporaire, recopié dans le flux ZIP puis supprimé. Quelques
+téléchargements sont lancés en avance pour ne pas attendre le stockage
+entre deux photos.
+
+Variables d'environnement :
+    EXPORT_FETCH_CONCURRENCY : téléchargements simultanés (défaut 4)
+"""
+import os
+import re
+import shutil
+import asyncio
+import logging
+import tempfile
+import zipfile
+from collections import deque
+from typing import AsyncIterator, List, Dict, Any
+
+from fastapi.concurrency import run_in_threadpool
+
+from core.storage import CHUNK_SIZE, StorageError
+
+logger = logging.getLogger(__name__)
+
+
+class _ZipStream:
+    """
+    Destination non repositionnable pour zipfile : les octets écrits sont
+    accumulés puis récupérés par drain() pour être envoyés au client.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _get_fetch_concurrency() -> int:
+    return max(1, int(os.environ.get("EXPORT_FETCH_CONCURRENCY", 4)))
+
+
+def _entry_name(index: int, photo: Dict[str, Any]) -> str:
+    """Nom du fichier dans l'archive : 0001_auteur.jpg"""
+    source = photo["storage_key"] or photo["url"] or ""
+    extension = source.rsplit(".", 1)[-1].lower() if "." in source.rsplit("/", 1)[-1] else "jpg"
+    if not extension.isalnum() or len(extension) > 5:
+        extension = "jpg"
+    author = re.sub(r"[^\w-]+", "_", photo["uploaded_by"] or "").strip("_")[:40] or "photo"
+    return f"{index:04d}_{author}.{extension}"
+
+
+async def _fetch(storage, photo: Dict[str, Any], destination: str):
+    """Télécharge l'original d'une photo (par sa clé, sinon par son URL)"""
+    if photo["storage_key"]:
+        await storage.download(photo["storage_key"], destination)
+        return
+
+    # Photos antérieures au stockage par clé : seule l'URL est connue
+    import httpx
+
+    try:
+        async with httpx.AsyncClient(timeout=60) as client:
+            async with client.stream("GET", photo["url"]) as response:
+                response.raise_for_status()
+                with open(destination, "wb") as out:
+                    async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                        await run_in_threadpool(out.write, chunk)
+    except httpx.HTTPError as e:
+        raise StorageError(f"Download failed for {photo['url']}: {e}")
+
+
+async def stream_album_zip(storage, photos: List[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """
+    Génère l'archive ZIP des photos, morceau par morceau.
+
+    Args:
+        storage: backend de stockage (get_storage())
+        photos: dicts avec id, storage_key, url, uploaded_by et created_at,
+            dans l'ordre de l'archive
+
+    Les photos introuvables sont ignorées et listées dans erreurs.txt.
+    """
+    work_dir = tempfile.mkdtemp(prefix="export_")
+    stream = _ZipStream()
+    # Les photos sont déjà compressées : pas de recompression (ZIP_STORED)
+    archive = zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED, allowZip64=True)
+
+    remaining = iter(enumerate(photos, start=1))
+    pending = deque()
+    failed = []
+
+    def fetch_next():
+        item = next(remaining, None)
+        if item is None:
+            return
+        index, photo = item
+        path = os.path.join(work_dir, str(index))
+        pending.append((index, photo, path, asyncio.create_task(_fetch(storage, photo, path))))
+
+    try:
+        for _ in range(_get_fetch_concurrency()):
+            fetch_next()
+
+        while pending:
+            index, photo, path, task = pending.popleft()
+            fetch_next()
+            try:
+                await task
+            except Exception as e:
+                logger.warning(f"Export: photo {photo['id']} skipped: {e}")
+                failed.append(f"{photo['id']} {photo['url']}: {e}")
+                continue
+
+            info = zipfile.ZipInfo(_entry_name(index, photo))
+            if photo.get("created_at"):
+                info.date_time = photo["created_at"].timetuple()[:6]
+            info.compress_type = zipfile.ZIP_STORED
+            try:
+                with open(path, "rb") as source, archive.open(info, "w") as entry:
+                    while True:
+                        chunk = await run_in_threadpool(source.read, CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        entry.write(chunk)
+                        data = stream.drain()
+                        if data:
+                            yield data
+            finally:
+                os.remove(path)
+            data = stream.drain()
+            if data:
+                yield data
+
+        if failed:
+            archive.writestr("erreurs.txt", "\n".join(failed) + "\n")
+        archive.close()
+        yield stream.drain()
+    finally:
+        # Client déconnecté ou fin de l'export : arrêter les téléchargements en cours
+        for _, _, _, task in pending:
+            task.cancel()
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,129 @@
+"""
+Flux temps réel de la galerie (Server-Sent Events)
+
+Chaque connexion SSE s'abonne aux nouvelles photos approuvées de son
+événement. Les photos sont publiées sur le bus core.pubsub : elles
+arrivent aux connexions de tous les workers, quel que soit celui qui a
+reçu (ou approuvé) la photo.
+
+Le flux reprend où il s'était arrêté : le client renvoie le dernier id
+reçu (en-tête Last-Event-ID, automatique avec EventSource) et les photos
+publiées entre-temps sont relues en base avant le direct.
+"""
+import json
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Optional, Set
+from uuid import UUID
+
+from fastapi.concurrency import run_in_threadpool
+
+from core.pubsub import pubsub
+
+logger = logging.getLogger(__name__)
+
+# Intervalle des commentaires "ping" qui gardent la connexion ouverte (proxys)
+HEARTBEAT_SECONDS = 15
+# Photos en attente par abonné ; au-delà, les plus récentes sont ignorées
+SUBSCRIBER_QUEUE_SIZE = 100
+# Les photos publiées juste avant le curseur sont renvoyées : deux publications
+# quasi simultanées peuvent être validées dans le désordre (dédoublonner par id)
+CURSOR_OVERLAP = timedelta(seconds=2)
+# Photos relues au plus lors d'une reprise
+REPLAY_LIMIT = 200
+
+# Sujets publiés sur le bus
+FEED_TOPICS = ("photo", "photo_updated")
+
+# event_id -> files des abonnés locaux
+_subscribers: Dict[UUID, Set[asyncio.Queue]] = {}
+
+
+def photo_payload(photo) -> Dict:
+    """Sérialise une photo comme PhotoResponse"""
+    from core.schemas import PhotoResponse
+    return PhotoResponse.model_validate(photo).model_dump(mode="json")
+
+
+def publish_photo(event_id: UUID, payload: Dict, kind: str = "photo"):
+    """
+    Diffuse une photo aux abonnés de l'événement (tous workers).
+
+    kind : "photo" (nouvelle photo visible) ou "photo_updated"
+    (miniatures disponibles).
+    """
+    pubsub.publish(event_id, kind, payload)
+
+
+def _on_message(topic: str, payload: Dict):
+    """Message du bus : ajout aux files des connexions locales"""
+    if topic not in FEED_TOPICS:
+        return
+    event_id = UUID(payload["event_id"])
+    for queue in _subscribers.get(event_id, ()):
+        try:
+            queue.put_nowait((topic, payload))
+        except asyncio.QueueFull:
+            logger.warning(f"Gallery feed subscriber too slow for event {event_id}, photo dropped")
+
+
+def subscriber_count() -> int:
+    return sum(len(queues) for queues in _subscribers.values())
+
+
+def _load_published_since(event_id: UUID, since: datetime):
+    """Photos approuvées publiées depuis since (session dédiée)"""
+    from core.database import SessionLocal
+    from core.models import Photo
+
+    db = SessionLocal()
+    try:
+        photos = db.query(Photo).filter(
+            Photo.event_id == event_id,
+            Photo.approved == True,
+            Photo.published_at > since - CURSOR_OVERLAP
+        ).order_by(Photo.published_at.asc()).limit(REPLAY_LIMIT).all()
+        return [photo_payload(photo) for photo in photos]
+    finally:
+        db.close()
+
+
+def _format_event(kind: str, payload: Dict) -> str:
+    event_id = payload.get("published_at") or ""
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(payload)}\n\n"
+
+
+async def stream_photos(event_id: UUID, since: Optional[datetime] = None) -> AsyncIterator[str]:
+    """Générateur SSE : reprise depuis since, puis photos en direct"""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    # Abonnement avant la relecture : aucune photo ne tombe entre les deux
+    queues = _subscribers.setdefault(event_id, set())
+    if not queues:
+        pubsub.subscribe(event_id, _on_message)
+    queues.add(queue)
+    try:
+        yield f"retry: {HEARTBEAT_SECONDS * 1000}\n\n"
+
+        replayed = set()
+        if since is not None:
+            for payload in await run_in_threadpool(_load_published_since, event_id, since):
+                replayed.add(payload["id"])
+                yield _format_event("photo", payload)
+
+        while True:
+            try:
+                kind, payload = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if kind == "photo" and payload["id"] in replayed:
+                continue
+            yield _format_event(kind, payload)
+    finally:
+        queues = _subscribers.get(event_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del _subscribers[event_id]
+                pubsub.unsubscribe(event_id, _on_message)
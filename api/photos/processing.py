@@ -0,0 +1,326 @@
+"""
+Génération des miniatures et des variantes responsives des photos
+
+Le redimensionnement (CPU) est fait dans un ProcessPoolExecutor, hors de
+la boucle asyncio et hors du chemin de la requête d'upload. Une fois les
+variantes envoyées au stockage, la ligne Photo est mise à jour.
+
+Variables d'environnement :
+    MEDIA_PROCESS_WORKERS : nombre de processus (défaut : min(2, nb CPU))
+"""
+import os
+import io
+import time
+import base64
+import shutil
+import asyncio
+import logging
+import tempfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
+from uuid import UUID
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# Largeurs des variantes (la miniature est toujours générée)
+VARIANT_WIDTHS = {
+    "thumb": 320,
+    "medium": 800,
+    "large": 1600,
+}
+VARIANT_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+# Formats des photos (Pillow) et extension de l'original dans le stockage
+PHOTO_FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+# Aperçu flou intégré à la réponse (quelques centaines d'octets)
+PLACEHOLDER_SIZE = 16
+# Orientations EXIF qui échangent largeur et hauteur
+_ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def read_image_info(path: str) -> Optional[Tuple[int, int, Optional[str]]]:
+    """
+    Largeur et hauteur affichées d'une image (orientation EXIF comprise)
+    et extension de son format réel (PHOTO_FORMATS, None pour un autre format).
+    Ne lit que l'en-tête du fichier ; None si ce n'est pas une image reconnue.
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+            if image.getexif().get(0x0112) in _ROTATED_ORIENTATIONS:
+                width, height = height, width
+            return width, height, PHOTO_FORMATS.get(image.format)
+    except Exception:
+        return None
+
+
+def flatten_image(image):
+    """
+    Image en RGB (ou L) pour les variantes : la transparence est posée sur
+    un fond blanc (une conversion directe la rendrait noire).
+    """
+    from PIL import Image
+
+    if image.mode in ("RGB", "L"):
+        return image
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def render_placeholder(image) -> str:
+    """Miniature floue en data URI WebP (affichée pendant le chargement)"""
+    from PIL import Image
+
+    small = image.copy()
+    small.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.BILINEAR)
+    buffer = io.BytesIO()
+    small.save(buffer, "WEBP", quality=30, method=6)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def render_variants(source_path: str, output_dir: str) -> Dict[str, Any]:
+    """
+    Génère les variantes d'une image (exécuté dans un processus du pool).
+
+    Returns:
+        Dict avec width/height de l'original, placeholder (data URI) et la
+        liste des variantes [{"name", "format", "path", "width", "height", "size"}]
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as original:
+        image = flatten_image(ImageOps.exif_transpose(original))
+        width, height = image.size
+
+        variants = []
+        for name, target_width in VARIANT_WIDTHS.items():
+            # Pas d'agrandissement (sauf pour la miniature, toujours produite)
+            if target_width >= width and name != "thumb":
+                continue
+            resized = image.copy()
+            resized.thumbnail((target_width, target_width * 4), Image.LANCZOS)
+            for fmt, (pil_format, options) in VARIANT_FORMATS.items():
+                path = os.path.join(output_dir, f"{name}.{fmt}")
+                resized.save(path, pil_format, **options)
+                variants.append({
+                    "name": name,
+                    "format": fmt,
+                    "path": path,
+                    "width": resized.size[0],
+                    "height": resized.size[1],
+                    "size": os.path.getsize(path),
+                })
+
+        placeholder = render_placeholder(image)
+
+    return {"width": width, "height": height, "placeholder": placeholder, "variants": variants}
+
+
+class _ProcessingStats:
+    """Compteurs de débit du worker"""
+
+    def __init__(self):
+        self.queued = 0
+        self.in_progress = 0
+        self.processed = 0
+        self.failed = 0
+        self.total_seconds = 0.0
+        self._recent = deque(maxlen=10000)  # horodatages des traitements terminés
+
+    def record_success(self, duration: float):
+        self.processed += 1
+        self.total_seconds += duration
+        self._recent.append(time.monotonic())
+
+    def as_dict(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        last_minute = sum(1 for t in self._recent if now - t <= 60)
+        return {
+            "queued": self.queued,
+            "in_progress": self.in_progress,
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_ms": int(self.total_seconds / self.processed * 1000) if self.processed else None,
+            "processed_last_minute": last_minute,
+            "workers": _get_worker_count(),
+        }
+
+
+stats = _ProcessingStats()
+
+_executor: Optional[ProcessPoolExecutor] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_tasks = set()
+
+
+def _get_worker_count() -> int:
+    default = min(2, os.cpu_count() or 1)
+    return max(1, int(os.environ.get("MEDIA_PROCESS_WORKERS", default)))
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Crée le pool de processus (lazy loading)"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=_get_worker_count(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    # Limite les traitements simultanés (téléchargement + rendu + envoi)
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(_get_worker_count() * 2)
+    return _semaphore
+
+
+def _update_photo(
+    photo_id: UUID,
+    thumbnail_url: Optional[str],
+    variants: Dict[str, Any],
+    rendered: Dict[str, Any]
+):
+    """
+    Enregistre les variantes sur la photo (session dédiée, hors requête).
+
+    La ligne est verrouillée : une suppression simultanée attend la fin de
+    la mise à jour (et supprime alors les variantes avec la photo).
+
+    Returns:
+        (photo trouvée, photo sérialisée si elle est visible pour le flux
+        de la galerie, sinon None)
+    """
+    from photos.feed import photo_payload
+    from core.database import SessionLocal
+    from core.models import Photo
+
+    db = SessionLocal()
+    try:
+        photo = db.query(Photo).filter(Photo.id == photo_id).with_for_update().first()
+        if not photo:
+            return False, None
+        photo.thumbnail_url = thumbnail_url
+        photo.variants = variants
+        photo.width = rendered["width"]
+        photo.height = rendered["height"]
+        photo.placeholder = rendered["placeholder"]
+        db.commit()
+        return True, photo_payload(photo) if photo.approved else None
+    finally:
+        db.close()
+
+
+async def _store_variants(storage, storage_key: str, rendered: Dict[str, Any]):
+    """Envoie les variantes au stockage et construit le JSON des variantes"""
+    from core.storage import StagedFile
+
+    base_key = storage_key.rsplit(".", 1)[0]
+    variants: Dict[str, Any] = {}
+    for variant in rendered["variants"]:
+        # Format dans le nom : Cloudinary ignore l'extension (public_id),
+        # webp et jpeg d'une même variante auraient la même clé
+        key = f"{base_key}_{variant['name']}_{variant['format']}.{variant['format']}"
+        staged = StagedFile(variant["path"], variant["size"], f"image/{variant['format']}", key)
+        stored = await storage.save(staged, key)
+        entry = variants.setdefault(variant["name"], {
+            "width": variant["width"],
+            "height": variant["height"],
+        })
+        entry[variant["format"]] = {"url": stored["url"], "key": stored["key"]}
+    return variants
+
+
+async def process_photo(photo_id: UUID, storage_key: str, source_path: Optional[str] = None):
+    """
+    Génère et enregistre les variantes d'une photo.
+
+    Args:
+        photo_id: ID de la photo à mettre à jour
+        storage_key: clé de l'original dans le stockage
+        source_path: copie locale de l'original (supprimée à la fin) ;
+            si absente, l'original est téléchargé depuis le stockage
+    """
+    from core.storage import get_storage, schedule_delete_keys
+
+    storage = get_storage()
+
+    async with _get_semaphore():
+        work_dir = tempfile.mkdtemp(prefix="photo_")
+        stats.queued -= 1
+        stats.in_progress += 1
+        started = time.monotonic()
+        try:
+            if source_path is None:
+                source_path = os.path.join(work_dir, "original")
+                await storage.download(storage_key, source_path)
+
+            loop = asyncio.get_running_loop()
+            rendered = await loop.run_in_executor(
+                _get_executor(), render_variants, source_path, work_dir
+            )
+
+            variants = await _store_variants(storage, storage_key, rendered)
+            thumbnail = variants.get("thumb", {}).get("jpeg", {}).get("url")
+            found, payload = await run_in_threadpool(_update_photo, photo_id, thumbnail, variants, rendered)
+            if not found:
+                # Photo supprimée pendant le traitement : variantes orphelines
+                schedule_delete_keys(variant_keys(variants))
+            if payload:
+                from photos.feed import publish_photo
+                publish_photo(UUID(payload["event_id"]), payload, kind="photo_updated")
+
+            stats.record_success(time.monotonic() - started)
+        except Exception as e:
+            stats.failed += 1
+            logger.error(f"Photo processing failed for {photo_id}: {e}")
+        finally:
+            stats.in_progress -= 1
+            if source_path and not source_path.startswith(work_dir):
+                try:
+                    os.remove(source_path)
+                except FileNotFoundError:
+                    pass
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def schedule_photo_processing(photo_id: UUID, storage_key: str, source_path: Optional[str] = None):
+    """Planifie le traitement d'une photo en arrière-plan (ne bloque pas la requête)"""
+    stats.queued += 1
+    task = asyncio.create_task(process_photo(photo_id, storage_key, source_path))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def variant_keys(variants: Optional[Dict[str, Any]]) -> List[str]:
+    """Liste les clés de stockage des variantes d'une photo"""
+    keys = []
+    for variant in (variants or {}).values():
+        if not isinstance(variant, dict):
+            continue
+        for value in variant.values():
+            if isinstance(value, dict) and value.get("key"):
+                keys.append(value["key"])
+    return keys
+
+
+def shutdown():
+    """Arrête le pool de processus (à l'arrêt de l'API)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -1,32 +1,64 @@
 """
 Routes pour la galerie photos
 """
+import os
+import uuid
+import logging
+from datetime import datetime
 from typing import List, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form, Header, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import delete, exists, func, update
 from sqlalchemy.orm import Session
 
 from core.database import get_db
 from core.models import Event, Photo
-from core.schemas import PhotoResponse, SuccessResponse
+from core.moderation import moderation_filters
+from core.quotas import QUOTA_PHOTOS, quota_used, release_quota, reserve_quota
+from core.security import verify_admin_api_key
+from core.schemas import (
+    PhotoResponse, PhotoUploadUrlRequest, PhotoUploadUrlResponse, PhotoUploadComplete,
+    BulkModerationRequest, BulkModerationResponse, SuccessResponse
+)
+from core.storage import (
+    ALLOWED_PHOTO_TYPES, MAX_IMAGE_SIZE,
+    FileTooLargeError, LocalStorage, StorageError, UploadLimitRoute,
+    get_storage, max_upload_size, schedule_delete_keys, stage_upload
+)
+from .export import stream_album_zip
+from .feed import CURSOR_OVERLAP, photo_payload, publish_photo, stream_photos
+from .processing import PHOTO_FORMATS, read_image_info, schedule_photo_processing, variant_keys
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
 
+router = APIRouter(route_class=UploadLimitRoute)
 
-@router.post("/{event_id}/photos", response_model=PhotoResponse, status_code=201)
-async def upload_photo(
-    event_id: UUID,
-    uploaded_by: str = Form(None),
-    caption: str = Form(None),
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
-):
+# Délai avant de supprimer l'upload direct d'un doublon (nouveaux appels à /complete)
+DUPLICATE_UPLOAD_GRACE_SECONDS = 900
+
+
+def _find_duplicate(db: Session, event_id: UUID, content_hash: str) -> Optional[Photo]:
+    """Retourne la photo de l'événement ayant la même empreinte, s'il y en a une"""
+    return db.query(Photo).filter(
+        Photo.event_id == event_id,
+        Photo.content_hash == content_hash
+    ).first()
+
+
+def _discard_if_unused(db: Session, key: str):
     """
-    Upload une photo (depuis l'app mobile)
-    
-    Note: L'upload vers Cloudinary sera implémenté plus tard.
-    Pour l'instant, on simule avec une URL placeholder.
+    Supprime du stockage un original refusé, sauf si une photo l'utilise :
+    la clé dérive du contenu, un envoi identique a pu l'enregistrer.
     """
+    if not db.query(exists().where(Photo.storage_key == key)).scalar():
+        schedule_delete_keys([key])
+
+
+def _get_upload_gallery_config(event_id: UUID, db: Session) -> dict:
+    """Vérifie que l'envoi de photos est possible et retourne la config de la galerie"""
     # Vérifier que l'événement existe
     event = db.query(Event).filter(Event.id == event_id).first()
     if not event:
@@ -41,24 +73,125 @@ async def upload_photo(
     if not gallery_config.get('allow_upload', True):
         raise HTTPException(status_code=403, detail="Photo upload is not allowed")
     
-    # Vérifier le nombre max de photos par invité
+    return gallery_config
+
+
+def _check_photo_quota(db: Session, event_id: UUID, uploaded_by: Optional[str], gallery_config: dict):
+    """Vérifie (sans réserver) que l'invité n'a pas atteint max_photos_per_guest"""
     max_photos = gallery_config.get('max_photos_per_guest')
     if max_photos and uploaded_by:
-        current_count = db.query(Photo).filter(
-            Photo.event_id == event_id,
-            Photo.uploaded_by == uploaded_by
-        ).count()
-        
-        if current_count >= max_photos:
+        used = quota_used(db, event_id, QUOTA_PHOTOS, uploaded_by)
+        if used is not None and used >= max_photos:
             raise HTTPException(
                 status_code=400, 
                 detail=f"Maximum {max_photos} photos per guest reached"
             )
+
+
+def _reserve_photo_quota(db: Session, event_id: UUID, uploaded_by: Optional[str], gallery_config: dict):
+    """
+    Compte la photo dans le quota de l'invité, dans la transaction de l'insertion
+    (annulé par un rollback). Lève une 400 si max_photos_per_guest est atteint.
+    
+    Le compteur reste verrouillé jusqu'au commit : appeler juste avant
+    l'insertion, sans await entre les deux.
+    """
+    if not uploaded_by:
+        return
+    
+    max_photos = gallery_config.get('max_photos_per_guest') or None
+    allowed = reserve_quota(
+        db, event_id, QUOTA_PHOTOS, uploaded_by, max_photos,
+        lambda: db.query(Photo).filter(
+            Photo.event_id == event_id,
+            Photo.uploaded_by == uploaded_by
+        ).count()
+    )
+    if not allowed:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Maximum {max_photos} photos per guest reached"
+        )
+
+
+def _direct_upload_prefix(event_id: UUID) -> str:
+    return f"savethedate/{event_id}/photos/direct/"
+
+
+@router.post("/{event_id}/photos", response_model=PhotoResponse, status_code=201)
+@max_upload_size(MAX_IMAGE_SIZE)
+async def upload_photo(
+    event_id: UUID,
+    response: Response,
+    uploaded_by: str = Form(None),
+    caption: str = Form(None),
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload une photo (depuis l'app mobile)
+    
+    Le fichier est envoyé au backend de stockage (disque local en dev,
+    Cloudinary en production) ; un envoi dont le Content-Length dépasse
+    la taille max est refusé avant la lecture du formulaire.
+    Si la même photo (même SHA-256) existe déjà pour l'événement, elle est
+    retournée telle quelle (HTTP 200) sans nouvel envoi.
+    """
+    gallery_config = _get_upload_gallery_config(event_id, db)
+    
+    # Vérifier le nombre max de photos par invité
+    _check_photo_quota(db, event_id, uploaded_by, gallery_config)
+    
+    if (file.content_type or "") not in ALLOWED_PHOTO_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Type de fichier non autorisé. Types acceptés: {ALLOWED_PHOTO_TYPES}"
+        )
+    
+    # Copier le fichier reçu (Content-Length déjà vérifié par la route)
+    try:
+        staged = await stage_upload(file, MAX_IMAGE_SIZE)
+    except FileTooLargeError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Fichier trop volumineux. Taille max: {MAX_IMAGE_SIZE // (1024*1024)} MB"
+        )
+    
+    # Doublon (même contenu déjà envoyé pour cet événement) : rien à stocker
+    existing = _find_duplicate(db, event_id, staged.sha256)
+    if existing:
+        staged.discard()
+        response.status_code = 200
+        return existing
+    
+    # Dimensions et format lus dans l'en-tête : la grille peut être mise en page immédiatement
+    info = await run_in_threadpool(read_image_info, staged.path)
+    if not info or not info[2]:
+        staged.discard()
+        raise HTTPException(status_code=400, detail="Fichier image invalide (JPEG, PNG ou WebP attendu)")
+    width, height, extension = info
     
-    # TODO: Upload vers Cloudinary et compression
-    # Pour l'instant, on simule
-    photo_url = f"https://placeholder.com/photos/{event_id}/{file.filename}"
-    thumbnail_url = f"https://placeholder.com/photos/{event_id}/thumb_{file.filename}"
+    # Clé dérivée du contenu et du format réel (pas du nom du fichier) : deux envois
+    # du même fichier écrivent le même objet, quelle que soit leur extension
+    storage_key = f"savethedate/{event_id}/photos/{staged.sha256[:32]}.{extension}"
+    # Copie locale pour générer les miniatures sans re-télécharger l'original
+    source_copy = staged.keep_copy()
+    try:
+        stored = await get_storage().save(staged, storage_key)
+    except StorageError as e:
+        if source_copy:
+            os.remove(source_copy)
+        raise HTTPException(status_code=502, detail=f"Upload failed: {e}")
+    
+    # Réserver la place dans le quota (un envoi concurrent a pu la prendre)
+    try:
+        _reserve_photo_quota(db, event_id, uploaded_by, gallery_config)
+    except HTTPException:
+        db.rollback()
+        if source_copy:
+            os.remove(source_copy)
+        _discard_if_unused(db, stored["key"])
+        raise
     
     # Déterminer si la photo doit être approuvée automatiquement
     needs_moderation = gallery_config.get('moderation', False)
@@ -66,16 +199,201 @@ async def upload_photo(
     photo = Photo(
         event_id=event_id,
         uploaded_by=uploaded_by,
-        url=photo_url,
-        thumbnail_url=thumbnail_url,
+        url=stored["url"],
+        storage_key=stored["key"],
+        content_hash=staged.sha256,
+        width=width,
+        height=height,
         caption=caption,
-        approved=not needs_moderation
+        approved=not needs_moderation,
+        published_at=None if needs_moderation else func.now()
     )
     
     db.add(photo)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # Envoi concurrent du même fichier : l'autre requête a gagné
+        db.rollback()
+        if source_copy:
+            os.remove(source_copy)
+        existing = _find_duplicate(db, event_id, staged.sha256)
+        if not existing:
+            raise
+        # Même clé que la photo gagnante (même contenu) : supprimé seulement si elle diffère
+        _discard_if_unused(db, stored["key"])
+        response.status_code = 200
+        return existing
     db.refresh(photo)
     
+    if photo.approved:
+        publish_photo(event_id, photo_payload(photo))
+    
+    # Miniatures et tailles responsives générées en arrière-plan
+    schedule_photo_processing(photo.id, photo.storage_key, source_copy)
+    
+    return photo
+
+
+@router.post("/{event_id}/photos/upload-url", response_model=PhotoUploadUrlResponse)
+async def create_photo_upload_url(
+    event_id: UUID,
+    data: PhotoUploadUrlRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Upload direct (depuis l'app mobile) - étape 1
+    
+    Retourne des paramètres signés et de courte durée pour envoyer la photo
+    directement au stockage, sans faire transiter le fichier par l'API.
+    Appeler ensuite POST /photos/complete avec la clé retournée (et, pour
+    Cloudinary, la réponse de l'upload dans upload).
+    """
+    gallery_config = _get_upload_gallery_config(event_id, db)
+    
+    # Vérification indicative : la place est réservée à la confirmation
+    _check_photo_quota(db, event_id, data.uploaded_by, gallery_config)
+    
+    if data.content_type not in ALLOWED_PHOTO_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Type de fichier non autorisé. Types acceptés: {ALLOWED_PHOTO_TYPES}"
+        )
+    if data.size > MAX_IMAGE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Fichier trop volumineux. Taille max: {MAX_IMAGE_SIZE // (1024*1024)} MB"
+        )
+    
+    extension = "jpg"
+    if data.filename and "." in data.filename:
+        candidate = data.filename.rsplit(".", 1)[-1].lower()
+        if candidate.isalnum() and len(candidate) <= 5:
+            extension = candidate
+    key = f"{_direct_upload_prefix(event_id)}{uuid.uuid4().hex}.{extension}"
+    
+    try:
+        return get_storage().sign_upload(
+            key, data.content_type, MAX_IMAGE_SIZE, allowed_formats=list(PHOTO_FORMATS.values())
+        )
+    except StorageError as e:
+        raise HTTPException(status_code=502, detail=f"Could not sign upload: {e}")
+
+
+async def _discard_upload(key: str):
+    """Supprime un upload direct refusé (erreur de stockage journalisée)"""
+    try:
+        await get_storage().delete(key)
+    except StorageError as e:
+        logger.error(f"Could not delete rejected upload {key}: {e}")
+
+
+@router.post("/{event_id}/photos/complete", response_model=PhotoResponse, status_code=201)
+async def complete_photo_upload(
+    event_id: UUID,
+    data: PhotoUploadComplete,
+    response: Response,
+    db: Session = Depends(get_db)
+):
+    """
+    Upload direct (depuis l'app mobile) - étape 2
+    
+    Vérifie que le fichier est bien arrivé dans le stockage (pour
+    Cloudinary : signature de la réponse d'upload, passée dans upload),
+    que sa taille et son format réels sont acceptés, crée la photo et planifie la génération des miniatures. Idempotent :
+    rappeler avec la même clé retourne la photo déjà créée (HTTP 200),
+    ou la photo identique déjà présente si l'envoi était un doublon.
+    
+    Limite : avec Cloudinary, l'empreinte SHA-256 du fichier n'est pas
+    connue (le fichier ne passe pas par l'API) ; ces photos ont un
+    content_hash vide et ne sont pas dédoublonnées.
+    """
+    gallery_config = _get_upload_gallery_config(event_id, db)
+    
+    storage = get_storage()
+    if not data.key.startswith(_direct_upload_prefix(event_id)) or ".." in data.key:
+        raise HTTPException(status_code=400, detail="Invalid upload key")
+    
+    existing = db.query(Photo).filter(
+        Photo.event_id == event_id,
+        Photo.storage_key == data.key
+    ).first()
+    if existing:
+        response.status_code = 200
+        return existing
+    
+    try:
+        stored = await storage.verify_upload(data.key, data.upload)
+    except StorageError as e:
+        raise HTTPException(status_code=502, detail=f"Could not verify upload: {e}")
+    if not stored:
+        raise HTTPException(status_code=400, detail="Upload not found in storage")
+    
+    if (stored.get("size") or 0) > MAX_IMAGE_SIZE:
+        await _discard_upload(stored["key"])
+        raise HTTPException(
+            status_code=400,
+            detail=f"Fichier trop volumineux. Taille max: {MAX_IMAGE_SIZE // (1024*1024)} MB"
+        )
+    
+    # Stockage local : format et dimensions lus dans le fichier reçu
+    # (Cloudinary : relus par verify_upload)
+    if isinstance(storage, LocalStorage):
+        info = await run_in_threadpool(read_image_info, storage.path(stored["key"]))
+        stored["width"], stored["height"], stored["format"] = info or (None, None, None)
+    if stored.get("format") not in PHOTO_FORMATS.values():
+        await _discard_upload(stored["key"])
+        raise HTTPException(status_code=400, detail="Fichier image invalide (JPEG, PNG ou WebP attendu)")
+    
+    # Doublon : la photo existe déjà. L'objet envoyé est supprimé plus tard,
+    # pour qu'un nouvel appel avec la même clé retrouve encore le doublon.
+    content_hash = stored.get("sha256")
+    if content_hash:
+        duplicate = _find_duplicate(db, event_id, content_hash)
+        if duplicate:
+            schedule_delete_keys([stored["key"]], delay=DUPLICATE_UPLOAD_GRACE_SECONDS)
+            response.status_code = 200
+            return duplicate
+    
+    try:
+        _reserve_photo_quota(db, event_id, data.uploaded_by, gallery_config)
+    except HTTPException:
+        db.rollback()
+        await _discard_upload(stored["key"])
+        raise
+    
+    photo = Photo(
+        event_id=event_id,
+        uploaded_by=data.uploaded_by,
+        url=stored["url"],
+        storage_key=stored["key"],
+        content_hash=content_hash,
+        width=stored.get("width"),
+        height=stored.get("height"),
+        caption=data.caption,
+        approved=not gallery_config.get('moderation', False),
+        published_at=None if gallery_config.get('moderation', False) else func.now()
+    )
+    
+    db.add(photo)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        existing = _find_duplicate(db, event_id, content_hash) if content_hash else None
+        if not existing:
+            raise
+        schedule_delete_keys([stored["key"]], delay=DUPLICATE_UPLOAD_GRACE_SECONDS)
+        response.status_code = 200
+        return existing
+    db.refresh(photo)
+    
+    if photo.approved:
+        publish_photo(event_id, photo_payload(photo))
+    
+    # L'original est re-téléchargé depuis le stockage par le worker
+    schedule_photo_processing(photo.id, photo.storage_key)
+    
     return photo
 
 
@@ -83,11 +401,22 @@ async def upload_photo(
 async def list_photos(
     event_id: UUID,
     approved_only: bool = Query(True, description="Afficher uniquement les photos approuvées"),
+    since: Optional[datetime] = Query(
+        None, description="Uniquement les photos publiées après ce curseur (published_at de la dernière photo reçue)"
+    ),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=200),
     db: Session = Depends(get_db)
 ):
-    """Liste les photos d'un événement"""
+    """
+    Liste les photos d'un événement
+    
+    Sans since : de la plus récente à la plus ancienne.
+    Avec since : uniquement les nouvelles photos, de la plus ancienne à la
+    plus récente (le curseur suivant est le published_at de la dernière).
+    Les photos publiées dans les 2 secondes précédant le curseur sont
+    renvoyées à nouveau : dédoublonner par id.
+    """
     # Vérifier que l'événement existe
     event = db.query(Event).filter(Event.id == event_id).first()
     if not event:
@@ -98,10 +427,86 @@ async def list_photos(
     if approved_only:
         query = query.filter(Photo.approved == True)
     
-    photos = query.order_by(Photo.created_at.desc()).offset(skip).limit(limit).all()
+    if since is not None:
+        # Une photo modérée devient visible à son approbation, pas à son envoi
+        cursor = Photo.published_at if approved_only else Photo.created_at
+        query = query.filter(cursor > since - CURSOR_OVERLAP).order_by(cursor.asc())
+    else:
+        query = query.order_by(Photo.created_at.desc())
+    
+    photos = query.offset(skip).limit(limit).all()
     return photos
 
 
+@router.get("/{event_id}/photos/stream")
+async def stream_photos_feed(
+    event_id: UUID,
+    since: Optional[datetime] = Query(None, description="Reprendre après ce curseur (published_at)"),
+    last_event_id: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Flux temps réel des nouvelles photos approuvées (Server-Sent Events)
+    
+    Pour les diaporamas et la galerie en direct : une connexion ouverte
+    remplace le rechargement périodique de la liste. Événements envoyés :
+    photo (nouvelle photo visible) et photo_updated (miniatures prêtes).
+    """
+    event = db.query(Event).filter(Event.id == event_id).first()
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    gallery_config = event.config.get('modules', {}).get('gallery', {})
+    if not gallery_config.get('enabled', False):
+        raise HTTPException(status_code=403, detail="Gallery module is not enabled")
+    
+    # Reconnexion automatique d'EventSource : reprise au dernier id reçu
+    if last_event_id:
+        try:
+            since = datetime.fromisoformat(last_event_id)
+        except ValueError:
+            pass
+    
+    return StreamingResponse(
+        stream_photos(event_id, since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/{event_id}/photos/export.zip")
+async def export_photos_zip(
+    event_id: UUID,
+    approved_only: bool = Query(True, description="Exporter uniquement les photos approuvées"),
+    db: Session = Depends(get_db),
+    _api_key: str = Depends(verify_admin_api_key)
+):
+    """
+    Exporte l'album complet en une archive ZIP (CMS) - Protégé par API key
+    
+    Les originaux sont lus depuis le stockage et l'archive est envoyée
+    au fil de l'eau, quelle que soit la taille de l'album.
+    """
+    event = db.query(Event).filter(Event.id == event_id).first()
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    query = db.query(
+        Photo.id, Photo.storage_key, Photo.url, Photo.uploaded_by, Photo.created_at
+    ).filter(Photo.event_id == event_id)
+    if approved_only:
+        query = query.filter(Photo.approved == True)
+    
+    # Lignes chargées avant la réponse : la session est fermée pendant le streaming
+    photos = [row._asdict() for row in query.order_by(Photo.created_at.asc()).all()]
+    
+    return StreamingResponse(
+        stream_album_zip(get_storage(), photos),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{event.slug}-photos.zip"'}
+    )
+
+
 @router.get("/{event_id}/photos/{photo_id}", response_model=PhotoResponse)
 async def get_photo(
     event_id: UUID,
@@ -135,9 +540,12 @@ async def approve_photo(
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
     
-    photo.approved = True
-    db.commit()
-    db.refresh(photo)
+    if not photo.approved or photo.published_at is None:
+        photo.approved = True
+        photo.published_at = func.now()
+        db.commit()
+        db.refresh(photo)
+        publish_photo(event_id, photo_payload(photo))
     
     return photo
 
@@ -149,17 +557,95 @@ async def delete_photo(
     db: Session = Depends(get_db)
 ):
     """Supprime une photo (CMS)"""
+    # Verrouillée : attend un traitement en cours, pour lire ses variantes
     photo = db.query(Photo).filter(
         Photo.id == photo_id,
         Photo.event_id == event_id
-    ).first()
+    ).with_for_update().first()
     
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
     
-    # TODO: Supprimer aussi sur Cloudinary
+    keys = variant_keys(photo.variants)
+    if photo.storage_key:
+        keys.append(photo.storage_key)
     
+    release_quota(db, event_id, QUOTA_PHOTOS, [photo.uploaded_by])
     db.delete(photo)
     db.commit()
     
+    # Supprimer aussi les fichiers dans le stockage (original + variantes)
+    storage = get_storage()
+    for key in keys:
+        try:
+            await storage.delete(key)
+        except StorageError as e:
+            logger.error(f"Could not delete photo file {key}: {e}")
+    
     return SuccessResponse(message="Photo deleted successfully")
+
+
+@router.post("/{event_id}/photos/moderation", response_model=BulkModerationResponse)
+async def moderate_photos(
+    event_id: UUID,
+    data: BulkModerationRequest,
+    db: Session = Depends(get_db),
+    _api_key: str = Depends(verify_admin_api_key)
+):
+    """
+    Modération groupée des photos (CMS) - Protégé par API key
+    
+    approve / reject (masquer) / delete sur une liste d'ids, ou approve /
+    delete sur toutes les photos en attente envoyées avant pending_before,
+    en une seule requête SQL (les photos en attente sont déjà masquées :
+    reject ne concerne que les photos approuvées). Les fichiers des photos
+    supprimées sont effacés du stockage en arrière-plan.
+    """
+    event = db.query(Event).filter(Event.id == event_id).first()
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    filters = moderation_filters(Photo, event_id, data)
+    payloads = []
+    keys = []
+    
+    if data.action == "approve":
+        photos = db.scalars(
+            update(Photo)
+            .where(*filters, Photo.approved == False)
+            .values(approved=True, published_at=func.now())
+            .returning(Photo)
+            .execution_options(synchronize_session=False)
+        ).all()
+        # Sérialisées avant le commit (qui expire les objets)
+        payloads = [photo_payload(photo) for photo in photos]
+        ids = [photo.id for photo in photos]
+    elif data.action == "reject":
+        ids = db.scalars(
+            update(Photo)
+            .where(*filters, Photo.approved == True)
+            .values(approved=False, published_at=None)
+            .returning(Photo.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+    else:
+        rows = db.execute(
+            delete(Photo)
+            .where(*filters)
+            .returning(Photo.id, Photo.storage_key, Photo.variants, Photo.uploaded_by)
+            .execution_options(synchronize_session=False)
+        ).all()
+        ids = [row.id for row in rows]
+        release_quota(db, event_id, QUOTA_PHOTOS, [row.uploaded_by for row in rows])
+        for row in rows:
+            keys.extend(variant_keys(row.variants))
+            if row.storage_key:
+                keys.append(row.storage_key)
+    
+    db.commit()
+    
+    for payload in payloads:
+        publish_photo(event_id, payload)
+    schedule_delete_keys(keys)
+    
+    return BulkModerationResponse(action=data.action, affected=len(ids), ids=ids)
@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 
 from core.database import get_db
 from core.models import Event, PlaylistSuggestion
+from core.quotas import QUOTA_PLAYLIST, release_quota, reserve_quota
 from core.schemas import (
     PlaylistSuggestionCreate, PlaylistSuggestionResponse, SuccessResponse
 )
@@ -36,12 +37,15 @@ async def suggest_song(
     
     # Vérifier le nombre max de suggestions par invité
     max_suggestions = playlist_config.get('max_suggestions_per_guest', 5)
-    current_count = db.query(PlaylistSuggestion).filter(
-        PlaylistSuggestion.event_id == event_id,
-        PlaylistSuggestion.guest_name == suggestion_data.guest_name
-    ).count()
+    allowed = reserve_quota(
+        db, event_id, QUOTA_PLAYLIST, suggestion_data.guest_name, max_suggestions,
+        lambda: db.query(PlaylistSuggestion).filter(
+            PlaylistSuggestion.event_id == event_id,
+            PlaylistSuggestion.guest_name == suggestion_data.guest_name
+        ).count()
+    )
     
-    if current_count >= max_suggestions:
+    if not allowed:
         raise HTTPException(
             status_code=400, 
             detail=f"Maximum {max_suggestions} suggestions per guest reached"
@@ -97,6 +101,7 @@ async def delete_suggestion(
     if not suggestion:
         raise HTTPException(status_code=404, detail="Suggestion not found")
     
+    release_quota(db, event_id, QUOTA_PLAYLIST, [suggestion.guest_name])
     db.delete(suggestion)
     db.commit()
     
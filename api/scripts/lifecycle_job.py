@@ -27,6 +27,7 @@ logger = logging.getLogger(__name__)
 # Ajouter le répertoire parent au path pour les imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from sqlalchemy import func, update
 from sqlalchemy.orm import Session
 from core.database import SessionLocal
 from core.models import Event, Photo, Guest, GuestbookEntry
@@ -37,39 +38,48 @@ def update_event_statuses():
     Met à jour les statuts des événements :
     - live → souvenir : si event_date est passée
     - souvenir → expired : si expires_at est passée (ou 12 mois après event_date)
+
+    Un UPDATE ... RETURNING par transition : aucun événement n'est chargé.
     """
     db: Session = SessionLocal()
     
     try:
         now = datetime.utcnow()
-        updated_count = 0
         
         # 1. Passer les événements "live" en "souvenir" après la date
-        events_to_souvenir = db.query(Event).filter(
-            Event.status == 'live',
-            Event.event_date < now
+        #    (expiration à 12 mois après l'événement si pas définie)
+        to_souvenir = db.execute(
+            update(Event)
+            .where(Event.status == 'live', Event.event_date < now)
+            .values(
+                status='souvenir',
+                expires_at=func.coalesce(Event.expires_at, Event.event_date + timedelta(days=365))
+            )
+            .returning(Event.id, Event.title)
+            .execution_options(synchronize_session=False)
         ).all()
         
-        for event in events_to_souvenir:
-            event.status = 'souvenir'
-            # Définir l'expiration à 12 mois après l'événement si pas définie
-            if not event.expires_at:
-                event.expires_at = event.event_date + timedelta(days=365)
-            updated_count += 1
-            logger.info(f"Event {event.id} ({event.title}) → souvenir")
+        for event_id, title in to_souvenir:
+            logger.info(f"Event {event_id} ({title}) → souvenir")
         
         # 2. Expirer les événements dont expires_at est passée
-        events_to_expire = db.query(Event).filter(
-            Event.status.in_(['live', 'souvenir']),
-            Event.expires_at != None,
-            Event.expires_at < now
+        #    (y compris ceux passés en souvenir juste au-dessus)
+        to_expire = db.execute(
+            update(Event)
+            .where(
+                Event.status.in_(['live', 'souvenir']),
+                Event.expires_at != None,
+                Event.expires_at < now
+            )
+            .values(status='expired')
+            .returning(Event.id, Event.title)
+            .execution_options(synchronize_session=False)
         ).all()
         
-        for event in events_to_expire:
-            event.status = 'expired'
-            updated_count += 1
-            logger.info(f"Event {event.id} ({event.title}) → expired")
+        for event_id, title in to_expire:
+            logger.info(f"Event {event_id} ({title}) → expired")
         
+        updated_count = len(to_souvenir) + len(to_expire)
         db.commit()
         logger.info(f"Updated {updated_count} event(s)")
         return updated_count
@@ -2,17 +2,17 @@
 Script principal pour les jobs en arrière-plan
 
 Gère :
-- Notifications programmées (chaque minute)
+- Notifications programmées (timer à l'heure exacte, thread dédié)
 - Lifecycle des événements (une fois par jour)
 
 Usage:
     python -m scripts.run_jobs
 """
-import sys
 import time
+import asyncio
 import logging
+import threading
 import schedule
-from datetime import datetime
 
 # Configurer le logging
 logging.basicConfig(
@@ -22,13 +22,15 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def run_notification_job():
-    """Envoie les notifications programmées."""
-    try:
-        from notifications.scheduler import process_scheduled_notifications
-        process_scheduled_notifications()
-    except Exception as e:
-        logger.error(f"Notification job error: {e}")
+def run_notification_timer():
+    """Envoie les notifications programmées à l'heure exacte (relancé en cas d'erreur)."""
+    from notifications.timer import run_notification_timer as notification_timer
+    while True:
+        try:
+            asyncio.run(notification_timer())
+        except Exception as e:
+            logger.error(f"Notification timer error: {e}")
+            time.sleep(60)
 
 
 def run_lifecycle_job():
@@ -44,7 +46,7 @@ def main():
     logger.info("Starting SaveTheDate background jobs...")
     
     # Planifier les jobs
-    schedule.every(1).minutes.do(run_notification_job)
+    threading.Thread(target=run_notification_timer, name="notification-timer", daemon=True).start()
     schedule.every().day.at("02:00").do(run_lifecycle_job)
     
     # Exécuter le job de lifecycle au démarrage
@@ -52,7 +54,7 @@ def main():
     run_lifecycle_job()
     
     logger.info("Jobs scheduled:")
-    logger.info("  - Notifications: every minute")
+    logger.info("  - Notifications: on time (timer woken by the API)")
     logger.info("  - Lifecycle: daily at 02:00")
     
     # Boucle principale
@@ -0,0 +1,93 @@
+"""
+Configuration des tests
+
+Lancer depuis api/ :
+    python -m pytest tests
+
+Les tests qui utilisent la base (fixture db) demandent une base PostgreSQL
+jetable, recréée au début de la session et vidée après chaque test :
+    TEST_DATABASE_URL=postgresql://... python -m pytest tests
+Sans TEST_DATABASE_URL, ces tests sont ignorés.
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+# Ajouter le répertoire de l'API au path pour les imports (comme les scripts)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+
+@pytest.fixture(scope="session")
+def engine():
+    """Moteur de la base de test, schéma recréé depuis les modèles"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL non défini")
+    # L'application (get_db, SessionLocal) utilise la même base
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+
+    from sqlalchemy import text
+    from core.database import Base, _get_engine
+    import core.models  # noqa: F401 - enregistre les tables
+
+    engine = _get_engine()
+    with engine.begin() as connection:
+        connection.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    """Session sur la base de test, tables vidées après le test"""
+    from sqlalchemy import text
+    from core.database import Base, SessionLocal
+
+    session = SessionLocal()
+    yield session
+    session.close()
+    tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+    with engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {tables} CASCADE"))
+
+
+@pytest.fixture
+def client(db):
+    """Client HTTP de l'API, sans les tâches de démarrage (pas de bloc with)"""
+    from fastapi.testclient import TestClient
+    from core.main import app
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def make_event(db):
+    """Crée un événement publié avec les modules donnés"""
+    from core.models import Event
+
+    def make(pack="premium", **modules):
+        event = Event(
+            slug=f"test-{os.urandom(4).hex()}",
+            type="wedding",
+            title="Mariage test",
+            event_date=datetime.utcnow() + timedelta(days=30),
+            pack=pack,
+            config={"modules": modules},
+            status="live",
+        )
+        db.add(event)
+        db.commit()
+        return event
+
+    return make
+
+
+@pytest.fixture
+def admin_headers(monkeypatch):
+    """En-têtes des endpoints protégés par API key"""
+    monkeypatch.setenv("ADMIN_API_KEY", "test-admin-key")
+    return {"X-API-Key": "test-admin-key"}
@@ -0,0 +1,42 @@
+"""
+Tests du chat : validation des messages et historique par curseur
+"""
+from datetime import datetime, timedelta, timezone
+
+from core.models import ChatMessage
+
+
+def test_blank_message_is_rejected(client, make_event):
+    event = make_event(chat={"enabled": True})
+    response = client.post(f"/api/events/{event.id}/chat", json={"sender_name": "Léa", "message": "   "})
+    assert response.status_code == 422
+
+
+def test_websocket_rejects_non_text_message(client, make_event):
+    event = make_event(chat={"enabled": True})
+    with client.websocket_connect(f"/ws/events/{event.id}/chat?name=Léa") as websocket:
+        websocket.send_json({"message": 5})
+        assert websocket.receive_json() == {"type": "error", "detail": "Le message doit être du texte"}
+
+
+def test_history_cursor_is_url_safe(db, client, make_event):
+    event = make_event(chat={"enabled": True})
+    start = datetime(2026, 6, 15, 17, 0, tzinfo=timezone.utc)
+    db.add_all([
+        ChatMessage(event_id=event.id, sender_name="Léa", message=f"Message {index}",
+                    created_at=start + timedelta(microseconds=index))
+        for index in range(5)
+    ])
+    db.commit()
+    url = f"/api/events/{event.id}/chat"
+
+    first = client.get(url, params={"limit": 3}).json()
+    cursor = first["next_cursor"]
+    assert cursor.replace("_", "").replace("-", "").isalnum()
+    # Curseur passé tel quel dans l'URL, sans encodage
+    second = client.get(f"{url}?limit=3&before={cursor}").json()
+    assert [message["message"] for message in first["messages"] + second["messages"]] == [
+        f"Message {index}" for index in reversed(range(5))
+    ]
+    assert second["next_cursor"] is None
+    assert client.get(f"{url}?before=not-a-cursor").status_code == 400
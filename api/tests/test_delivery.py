@@ -0,0 +1,214 @@
+"""
+Tests du statut enregistré après un envoi (nouveaux essais, dead-letter)
+"""
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from core.models import InvitationGroup, PushNotification
+from notifications import delivery, firebase_service
+from notifications.delivery import RETRY_MAX_DELAY, delivery_outcome, retry_delay, target_tokens
+from notifications.transport import FcmError, HttpTransport, SendResult
+
+
+@pytest.fixture(autouse=True)
+def retry_settings(monkeypatch):
+    monkeypatch.setenv("NOTIFICATION_MAX_ATTEMPTS", "3")
+    monkeypatch.setenv("NOTIFICATION_RETRY_BASE_SECONDS", "30")
+    # Sans variation aléatoire (+/- 10 %)
+    monkeypatch.setattr(delivery.random, "uniform", lambda low, high: 1.0)
+
+
+def test_success_is_sent():
+    outcome = delivery_outcome({"success": True}, attempts=1)
+    assert outcome["status"] == "sent"
+    assert outcome["sent_at"] is not None
+    assert outcome["next_attempt_at"] is None
+    assert outcome["last_error"] is None
+
+
+def test_simulated_send_is_sent():
+    assert delivery_outcome({"success": False, "simulated": True}, attempts=1)["status"] == "sent"
+
+
+def test_permanent_error_fails_without_retry():
+    outcome = delivery_outcome({"success": False, "error": "INVALID_ARGUMENT"}, attempts=1)
+    assert outcome["status"] == "failed"
+    assert outcome["next_attempt_at"] is None
+    assert outcome["last_error"] == "INVALID_ARGUMENT"
+
+
+def test_transient_error_is_retried_with_backoff():
+    before = datetime.utcnow()
+    outcome = delivery_outcome({"success": False, "transient": True, "error": "UNAVAILABLE"}, attempts=2)
+    assert outcome["status"] == "retrying"
+    assert outcome["sent_at"] is None
+    assert outcome["last_error"] == "UNAVAILABLE"
+    # 30 s x 2^(2 - 1)
+    delay = outcome["next_attempt_at"] - before
+    assert timedelta(seconds=59) <= delay <= timedelta(seconds=61)
+
+
+def test_transient_error_goes_dead_after_max_attempts():
+    outcome = delivery_outcome({"success": False, "transient": True, "error": "UNAVAILABLE"}, attempts=3)
+    assert outcome["status"] == "dead"
+    assert outcome["next_attempt_at"] is None
+    assert outcome["last_error"] == "UNAVAILABLE"
+
+
+def test_missing_error_message():
+    assert delivery_outcome({"success": False}, attempts=1)["last_error"] == "Unknown error"
+
+
+def test_retry_delay_doubles_and_is_capped():
+    assert retry_delay(1) == timedelta(seconds=30)
+    assert retry_delay(2) == timedelta(seconds=60)
+    assert retry_delay(4) == timedelta(seconds=240)
+    assert retry_delay(20) == RETRY_MAX_DELAY
+
+
+def test_retry_delay_jitter(monkeypatch):
+    monkeypatch.setattr(delivery.random, "uniform", lambda low, high: high)
+    assert retry_delay(1) == timedelta(seconds=33)
+
+
+class FakeTransport:
+    """Transport FCM : erreur par token (préfixe) ou pour tout un lot"""
+
+    def __init__(self, failing_chunks=(), busy=True):
+        self.failing_chunks = failing_chunks
+        self.busy = busy
+        self.sent = []
+
+    def available(self):
+        return True
+
+    def send_each(self, messages):
+        tokens = [message["token"] for message in messages]
+        if any(token in self.failing_chunks for token in tokens):
+            raise FcmError("UNAVAILABLE", "chunk failed")
+        results = []
+        for token in tokens:
+            if token.startswith("busy") and self.busy:
+                results.append(SendResult(exception=FcmError("QUOTA_EXCEEDED")))
+            elif token.startswith("gone"):
+                results.append(SendResult(exception=FcmError("UNREGISTERED")))
+            elif token.startswith("bad"):
+                results.append(SendResult(exception=FcmError("INVALID_ARGUMENT")))
+            else:
+                self.sent.append(token)
+                results.append(SendResult(message_id=f"msg-{token}"))
+        return results
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    def install(**kwargs):
+        fake = FakeTransport(**kwargs)
+        monkeypatch.setattr(firebase_service, "get_transport", lambda: fake)
+        return fake
+
+    monkeypatch.setattr(firebase_service, "MULTICAST_BATCH_SIZE", 2)
+    return install
+
+
+def test_partial_transient_failures_are_retried_alone(transport):
+    # Lots : [ok-1, busy-1] [ok-2, gone-1] [down-1, down-2] (lot entier en échec)
+    transport(failing_chunks={"down-1"})
+    tokens = ["ok-1", "busy-1", "ok-2", "gone-1", "down-1", "down-2"]
+    result = firebase_service.send_to_devices(tokens, "Titre", "Message")
+
+    assert result["success"] is False
+    assert result["transient"] is True
+    assert result["sent"] == 2
+    assert result["invalid_tokens"] == ["gone-1"]
+    assert result["retry_tokens"] == ["busy-1", "down-1", "down-2"]
+
+    outcome = delivery_outcome(result, attempts=1)
+    assert outcome["status"] == "retrying"
+    assert outcome["retry_tokens"] == ["busy-1", "down-1", "down-2"]
+
+
+def test_permanent_failures_alongside_successes_are_not_retried(transport):
+    transport()
+    result = firebase_service.send_to_devices(["ok-1", "bad-1", "bad-2", "bad-3"], "Titre", "Message")
+    assert result["success"] is True
+    assert result["retry_tokens"] == []
+    assert delivery_outcome(result, attempts=1)["status"] == "sent"
+
+
+def test_permanent_failure_of_every_chunk(transport):
+    transport()
+    result = firebase_service.send_to_devices(["bad-1", "bad-2", "bad-3"], "Titre", "Message")
+    assert result["success"] is False
+    assert result["transient"] is False
+    assert delivery_outcome(result, attempts=1)["status"] == "failed"
+
+
+def test_transient_failure_on_last_attempt_is_dead(transport):
+    transport()
+    result = firebase_service.send_to_devices(["ok-1", "busy-1"], "Titre", "Message")
+    outcome = delivery_outcome(result, attempts=3)
+    assert outcome["status"] == "dead"
+    assert outcome["retry_tokens"] is None
+
+
+def test_retry_targets_only_the_failed_devices():
+    notification = PushNotification(target_group_id=None, retry_tokens=["busy-1"])
+    assert target_tokens(None, notification) == ["busy-1"]
+
+
+def test_scheduler_resends_to_failed_devices_only(db, make_event, transport):
+    from notifications.scheduler import process_scheduled_notifications
+
+    fake = transport()
+    event = make_event()
+    group = InvitationGroup(event_id=event.id, name="Famille")
+    db.add(group)
+    db.commit()
+    notification = PushNotification(
+        event_id=event.id, target_group_id=group.id, title="Info", message="Message",
+        status="retrying", attempts=1, next_attempt_at=datetime.utcnow() - timedelta(seconds=1),
+        retry_tokens=["busy-1", "ok-1"]
+    )
+    db.add(notification)
+    db.commit()
+
+    process_scheduled_notifications()
+    db.expire_all()
+    assert fake.sent == ["ok-1"]
+    assert notification.status == "retrying"
+    assert notification.attempts == 2
+    assert notification.retry_tokens == ["busy-1"]
+
+    # Quota FCM de nouveau disponible
+    fake = transport(busy=False)
+    notification.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    process_scheduled_notifications()
+    db.expire_all()
+    assert fake.sent == ["busy-1"]
+    assert notification.status == "sent"
+    assert notification.retry_tokens is None
+
+
+@pytest.mark.parametrize("status_code, body, code, transient", [
+    (429, {}, "QUOTA_EXCEEDED", True),
+    (429, {"error": {"status": "RESOURCE_EXHAUSTED"}}, "QUOTA_EXCEEDED", True),
+    (503, {"error": {"status": "UNAVAILABLE"}}, "UNAVAILABLE", True),
+    (502, {}, "UNAVAILABLE", True),
+    (500, {"error": {"status": "UNKNOWN"}}, "INTERNAL", True),
+    (404, {"error": {"status": "NOT_FOUND", "details": [{"errorCode": "UNREGISTERED"}]}}, "UNREGISTERED", False),
+    (400, {"error": {"status": "INVALID_ARGUMENT"}}, "INVALID_ARGUMENT", False),
+])
+def test_http_errors_are_classified(status_code, body, code, transient):
+    http = HttpTransport("http://fcm.test")
+    http._client = httpx.Client(
+        base_url="http://fcm.test",
+        transport=httpx.MockTransport(lambda request: httpx.Response(status_code, json=body))
+    )
+    with pytest.raises(FcmError) as error:
+        http.send({"token": "device-0", "notification": {"title": "Info", "body": "Message"}})
+    assert error.value.code == code
+    assert firebase_service.is_transient_error(error.value) is transient
@@ -0,0 +1,145 @@
+"""
+Tests de la modération groupée (photos, livre d'or)
+"""
+from datetime import datetime, timedelta, timezone
+
+from core.models import GuestbookEntry, Photo
+
+
+NOW = datetime.now(timezone.utc)
+
+
+def _entry(event, approved, age_minutes=0):
+    return GuestbookEntry(
+        event_id=event.id, author_name="Alice", message="Bravo",
+        approved=approved, created_at=NOW - timedelta(minutes=age_minutes)
+    )
+
+
+def _photo(event, approved, age_minutes=0):
+    return Photo(
+        event_id=event.id, url="https://example.com/p.jpg", uploaded_by="Alice",
+        approved=approved, created_at=NOW - timedelta(minutes=age_minutes)
+    )
+
+
+def _moderate(client, headers, event, target, **payload):
+    return client.post(f"/api/events/{event.id}/{target}/moderation", json=payload, headers=headers)
+
+
+def _guestbook_state(db, event):
+    db.expire_all()
+    return {
+        entry.id: entry.approved
+        for entry in db.query(GuestbookEntry).filter(GuestbookEntry.event_id == event.id)
+    }
+
+
+def test_requires_ids_or_pending_before(client, admin_headers, make_event):
+    event = make_event(guestbook={"enabled": True})
+    response = _moderate(client, admin_headers, event, "guestbook", action="approve")
+    assert response.status_code == 400
+
+
+def test_requires_admin_key(client, admin_headers, make_event):
+    event = make_event(guestbook={"enabled": True})
+    response = client.post(f"/api/events/{event.id}/guestbook/moderation", json={"action": "approve", "ids": []})
+    assert response.status_code == 401
+
+
+def test_approve_pending_before_only_touches_older_pending_entries(db, client, admin_headers, make_event):
+    event = make_event(guestbook={"enabled": True})
+    old, recent, approved = _entry(event, False, 60), _entry(event, False, 1), _entry(event, True, 60)
+    db.add_all([old, recent, approved])
+    db.commit()
+
+    response = _moderate(
+        client, admin_headers, event, "guestbook",
+        action="approve", pending_before=(NOW - timedelta(minutes=30)).isoformat()
+    )
+    assert response.status_code == 200
+    assert response.json()["affected"] == 1
+    assert response.json()["ids"] == [str(old.id)]
+    assert _guestbook_state(db, event) == {old.id: True, recent.id: False, approved.id: True}
+
+
+def test_reject_hides_listed_approved_entries(db, client, admin_headers, make_event):
+    event = make_event(guestbook={"enabled": True})
+    shown, pending = _entry(event, True), _entry(event, False)
+    db.add_all([shown, pending])
+    db.commit()
+
+    response = _moderate(
+        client, admin_headers, event, "guestbook", action="reject", ids=[str(shown.id), str(pending.id)]
+    )
+    # Le message déjà en attente n'est pas compté
+    assert response.json()["ids"] == [str(shown.id)]
+    assert _guestbook_state(db, event) == {shown.id: False, pending.id: False}
+
+
+def test_ids_and_pending_before_are_combined(db, client, admin_headers, make_event):
+    event = make_event(guestbook={"enabled": True})
+    old, listed_recent = _entry(event, False, 60), _entry(event, False, 1)
+    db.add_all([old, listed_recent])
+    db.commit()
+
+    response = _moderate(
+        client, admin_headers, event, "guestbook", action="delete",
+        ids=[str(old.id), str(listed_recent.id)], pending_before=(NOW - timedelta(minutes=30)).isoformat()
+    )
+    assert response.json()["ids"] == [str(old.id)]
+    assert set(_guestbook_state(db, event)) == {listed_recent.id}
+
+
+def test_other_events_are_untouched(db, client, admin_headers, make_event):
+    event = make_event(guestbook={"enabled": True})
+    other = make_event(guestbook={"enabled": True})
+    foreign = _entry(other, False, 60)
+    db.add(foreign)
+    db.commit()
+
+    response = _moderate(client, admin_headers, event, "guestbook", action="delete", ids=[str(foreign.id)])
+    assert response.json()["affected"] == 0
+    assert set(_guestbook_state(db, other)) == {foreign.id}
+
+
+def test_photos_approve_then_delete(db, client, admin_headers, make_event):
+    event = make_event(gallery={"enabled": True})
+    pending = [_photo(event, False, 60) for _ in range(3)]
+    db.add_all(pending)
+    db.commit()
+    ids = [str(photo.id) for photo in pending]
+
+    response = _moderate(client, admin_headers, event, "photos", action="approve", ids=ids)
+    assert response.json()["affected"] == 3
+    db.expire_all()
+    assert all(photo.approved and photo.published_at is not None for photo in pending)
+
+    # Déjà approuvées : rien à faire
+    assert _moderate(client, admin_headers, event, "photos", action="approve", ids=ids).json()["affected"] == 0
+
+    response = _moderate(client, admin_headers, event, "photos", action="delete", ids=ids)
+    assert response.json()["affected"] == 3
+    assert db.query(Photo).filter(Photo.event_id == event.id).count() == 0
+
+
+def test_unknown_event(client, admin_headers):
+    response = client.post(
+        "/api/events/00000000-0000-0000-0000-000000000000/photos/moderation",
+        json={"action": "delete", "ids": []}, headers=admin_headers
+    )
+    assert response.status_code == 404
+
+
+def test_reject_with_pending_before_is_refused(db, client, admin_headers, make_event):
+    event = make_event(guestbook={"enabled": True})
+    db.add(_entry(event, False, 60))
+    db.commit()
+
+    response = _moderate(
+        client, admin_headers, event, "guestbook",
+        action="reject", pending_before=NOW.isoformat()
+    )
+    # Les messages en attente sont déjà masqués : il faut les supprimer
+    assert response.status_code == 400
+    assert "delete" in response.json()["detail"]
@@ -0,0 +1,63 @@
+"""
+Tests du quota de notifications (pack Essentiel) et des statistiques
+"""
+from datetime import datetime, timedelta, timezone
+
+from core.models import PushNotification
+
+
+def _add_notifications(db, event, *statuses):
+    db.add_all([
+        PushNotification(event_id=event.id, title="Info", message="Message", status=status)
+        for status in statuses
+    ])
+    db.commit()
+
+
+def _create(client, headers, event):
+    scheduled_at = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    return client.post(
+        f"/api/events/{event.id}/notifications",
+        json={"title": "Rappel", "message": "C'est demain", "scheduled_at": scheduled_at},
+        headers=headers,
+    )
+
+
+def test_quota_counts_notifications_sent_or_about_to_be(db, client, admin_headers, make_event):
+    event = make_event(pack="essential")
+    _add_notifications(db, event, "sent", "queued", "retrying", "scheduled", "failed", "dead")
+
+    # 4 notifications comptent : une place restante
+    response = _create(client, admin_headers, event)
+    assert response.status_code == 201
+    assert response.json()["status"] == "scheduled"
+
+    response = _create(client, admin_headers, event)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Notification quota reached (5/5 for Essential pack)"
+
+
+def test_other_packs_are_unlimited(db, client, admin_headers, make_event):
+    event = make_event(pack="premium")
+    _add_notifications(db, event, *["sent"] * 6)
+    assert _create(client, admin_headers, event).status_code == 201
+
+
+def test_stats_share_the_grouped_counts(db, client, admin_headers, make_event):
+    event = make_event(pack="essential")
+    _add_notifications(db, event, "sent", "sent", "scheduled", "retrying", "failed", "dead")
+
+    response = client.get(f"/api/events/{event.id}/notifications/stats", headers=admin_headers)
+    assert response.status_code == 200
+    stats = response.json()
+    assert {key: stats[key] for key in ("total", "sent", "scheduled", "queued", "retrying", "failed", "dead")} == {
+        "total": 6, "sent": 2, "scheduled": 1, "queued": 0, "retrying": 1, "failed": 1, "dead": 1,
+    }
+    assert stats["quota"] == {"used": 4, "limit": 5, "remaining": 1}
+
+
+def test_stats_without_quota(client, admin_headers, make_event):
+    event = make_event(pack="vip")
+    stats = client.get(f"/api/events/{event.id}/notifications/stats", headers=admin_headers).json()
+    assert stats["total"] == 0
+    assert stats["quota"] == {"used": 0, "limit": None, "remaining": None}
@@ -0,0 +1,130 @@
+"""
+Tests du comptage des ouvertures de notifications
+"""
+import asyncio
+
+import pytest
+
+from core.models import DeviceToken, PushNotification
+from notifications import opens
+from notifications.opens import OpenCounter
+
+
+async def _stopped(counter):
+    """Enregistre les ouvertures en attente et arrête la boucle du compteur"""
+    task = counter._flush_task
+    await counter.stop()
+    if task is not None:
+        await asyncio.gather(task, return_exceptions=True)
+
+
+def _notification(db, event):
+    notification = PushNotification(event_id=event.id, title="Info", message="Message", status="sent")
+    db.add(notification)
+    db.commit()
+    return notification
+
+
+def _opened_count(db, notification):
+    db.expire_all()
+    return db.get(PushNotification, notification.id).opened_count
+
+
+@pytest.mark.asyncio
+async def test_opens_are_saved_in_one_batch(db, make_event):
+    event = make_event()
+    first, second = _notification(db, event), _notification(db, event)
+    counter = OpenCounter()
+    for index in range(3):
+        counter.record(event.id, first.id, f"device-{index}")
+    counter.record(event.id, second.id, "device-0")
+
+    await _stopped(counter)
+    assert _opened_count(db, first) == 3
+    assert _opened_count(db, second) == 1
+    assert counter.stats["flushes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_other_event_ids_are_ignored(db, make_event):
+    event, other = make_event(), make_event()
+    notification = _notification(db, event)
+    counter = OpenCounter()
+    counter.record(other.id, notification.id, "device-0")
+
+    await _stopped(counter)
+    assert _opened_count(db, notification) == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_the_opens(monkeypatch):
+    def broken(batch):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(opens, "_save_opens", broken)
+    counter = OpenCounter()
+    counter.record("event", "notification", "device-0")
+    await _stopped(counter)
+    assert counter._pending == {("event", "notification"): {"device-0"}}
+
+
+@pytest.mark.asyncio
+async def test_pending_notifications_are_bounded(monkeypatch):
+    monkeypatch.setattr(opens, "MAX_PENDING_NOTIFICATIONS", 2)
+    counter = OpenCounter()
+    results = [counter.record("event", f"notification-{index}", "device-0") for index in range(3)]
+    # Une notification déjà en attente est toujours comptée
+    results.append(counter.record("event", "notification-0", "device-1"))
+    counter._pending.clear()
+    await _stopped(counter)
+    assert results == [True, True, False, True]
+    assert counter.stats["dropped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_repeated_open_is_counted_once(db, make_event):
+    event = make_event()
+    notification = _notification(db, event)
+    counter = OpenCounter()
+    assert counter.record(event.id, notification.id, "device-0") is True
+    assert counter.record(event.id, notification.id, "device-0") is False
+
+    await _stopped(counter)
+    assert _opened_count(db, notification) == 1
+    assert counter.stats["duplicates"] == 1
+
+
+@pytest.mark.asyncio
+async def test_device_is_counted_once_across_flushes_and_workers(db, make_event):
+    event = make_event()
+    notification = _notification(db, event)
+    first, second = OpenCounter(), OpenCounter()
+    first.record(event.id, notification.id, "device-0")
+    await first.flush()
+    # Même appareil au flush suivant, puis sur un autre worker
+    first.record(event.id, notification.id, "device-0")
+    second.record(event.id, notification.id, "device-0")
+    second.record(event.id, notification.id, "device-1")
+
+    await _stopped(first)
+    await _stopped(second)
+    assert _opened_count(db, notification) == 2
+    assert first.stats["counted"] == 1 and first.stats["duplicates"] == 1
+    assert second.stats["counted"] == 1 and second.stats["duplicates"] == 1
+
+
+def test_opened_beacon_checks_notification_and_device(db, client, make_event, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(opens.open_counter, "record", lambda *args: recorded.append(args))
+    event, other = make_event(), make_event()
+    notification = _notification(db, event)
+    db.add(DeviceToken(event_id=event.id, token="device-0"))
+    db.add(DeviceToken(event_id=other.id, token="device-other"))
+    db.commit()
+    url = f"/api/events/{event.id}/notifications/{notification.id}/opened"
+
+    assert client.post(url, json={"token": "device-0"}).status_code == 202
+    assert client.post(url, json={"token": "device-other"}).status_code == 403
+    unknown = f"/api/events/{other.id}/notifications/{notification.id}/opened"
+    assert client.post(unknown, json={"token": "device-other"}).status_code == 404
+    assert recorded == [(event.id, notification.id, "device-0")]
@@ -0,0 +1,68 @@
+"""
+Tests de la génération des variantes des photos
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+from core import storage as storage_module
+from core.models import Photo
+from photos import processing
+from photos.processing import render_variants
+
+
+def _thumb_corner(tmp_path, image, name):
+    source = tmp_path / name
+    image.save(source)
+    output = tmp_path / f"{name}-variants"
+    output.mkdir()
+    rendered = render_variants(str(source), str(output))
+    thumb = next(v for v in rendered["variants"] if v["name"] == "thumb" and v["format"] == "jpeg")
+    with Image.open(thumb["path"]) as result:
+        return result.convert("RGB").getpixel((0, 0))
+
+
+def _near_white(pixel):
+    return all(channel > 245 for channel in pixel)
+
+
+def test_transparent_png_is_flattened_on_white(tmp_path):
+    image = Image.new("RGBA", (400, 300), (0, 0, 0, 0))
+    assert _near_white(_thumb_corner(tmp_path, image, "rgba.png"))
+
+
+def test_palette_png_with_transparency_is_flattened_on_white(tmp_path):
+    image = Image.new("P", (400, 300), 0)
+    image.putpalette([0, 0, 0] * 256)
+    image.info["transparency"] = 0
+    assert _near_white(_thumb_corner(tmp_path, image, "palette.png"))
+
+
+@pytest.mark.asyncio
+async def test_variants_of_a_deleted_photo_are_removed(db, make_event, tmp_path, monkeypatch):
+    event = make_event()
+    photo = Photo(event_id=event.id, url="http://storage.test/original.png", storage_key="photos/original.png")
+    db.add(photo)
+    db.commit()
+    photo_id = photo.id
+    db.delete(photo)
+    db.commit()
+
+    deleted = []
+    monkeypatch.setattr(storage_module, "schedule_delete_keys", lambda keys, delay=0: deleted.extend(keys))
+    monkeypatch.setattr(storage_module, "get_storage", lambda: None)
+    monkeypatch.setattr(processing, "_get_executor", lambda: ThreadPoolExecutor(max_workers=1))
+
+    async def store(storage, storage_key, rendered):
+        return {"thumb": {"width": 320, "height": 240, "jpeg": {"url": "u", "key": "photos/original_thumb_jpeg.jpeg"}}}
+
+    monkeypatch.setattr(processing, "_store_variants", store)
+    source = tmp_path / "original.png"
+    Image.new("RGB", (400, 300), (200, 10, 10)).save(source)
+
+    failed = processing.stats.failed
+    processing.stats.queued += 1
+    await processing.process_photo(photo_id, "photos/original.png", str(source))
+    assert deleted == ["photos/original_thumb_jpeg.jpeg"]
+    assert processing.stats.failed == failed
@@ -0,0 +1,101 @@
+"""
+Tests des compteurs de quota par invité
+"""
+import io
+
+from PIL import Image
+
+from core.quotas import QUOTA_PHOTOS, QUOTA_PLAYLIST, quota_used, release_quota, reserve_quota
+
+
+def _reserve(db, event, guest, limit, existing=0, calls=None):
+    def count_existing():
+        if calls is not None:
+            calls.append(guest)
+        return existing
+
+    allowed = reserve_quota(db, event.id, QUOTA_PHOTOS, guest, limit, count_existing)
+    db.commit()
+    return allowed
+
+
+def test_reserve_until_limit(db, make_event):
+    event = make_event()
+    assert [_reserve(db, event, "Alice", 3) for _ in range(4)] == [True, True, True, False]
+    assert quota_used(db, event.id, QUOTA_PHOTOS, "Alice") == 3
+
+
+def test_existing_rows_are_counted_once(db, make_event):
+    event = make_event()
+    calls = []
+    assert _reserve(db, event, "Alice", 3, existing=2, calls=calls) is True
+    assert _reserve(db, event, "Alice", 3, existing=2, calls=calls) is False
+    # Compteur initialisé au premier envoi seulement
+    assert calls == ["Alice"]
+    assert quota_used(db, event.id, QUOTA_PHOTOS, "Alice") == 3
+
+
+def test_guest_already_over_limit(db, make_event):
+    event = make_event()
+    assert _reserve(db, event, "Alice", 3, existing=5) is False
+    assert quota_used(db, event.id, QUOTA_PHOTOS, "Alice") == 5
+    # Une suppression ne suffit pas à repasser sous la limite
+    release_quota(db, event.id, QUOTA_PHOTOS, ["Alice"])
+    db.commit()
+    assert _reserve(db, event, "Alice", 3) is False
+
+
+def test_no_limit_still_counts(db, make_event):
+    event = make_event()
+    assert all(_reserve(db, event, "Alice", None) for _ in range(5))
+    assert quota_used(db, event.id, QUOTA_PHOTOS, "Alice") == 5
+
+
+def test_release_gives_places_back(db, make_event):
+    event = make_event()
+    for _ in range(3):
+        _reserve(db, event, "Alice", 3)
+    _reserve(db, event, "Bob", 3)
+
+    release_quota(db, event.id, QUOTA_PHOTOS, ["Alice", "Alice", None, "Bob", "Bob"])
+    db.commit()
+    assert quota_used(db, event.id, QUOTA_PHOTOS, "Alice") == 1
+    # Jamais négatif
+    assert quota_used(db, event.id, QUOTA_PHOTOS, "Bob") == 0
+    assert _reserve(db, event, "Alice", 3) is True
+
+
+def test_rollback_returns_the_place(db, make_event):
+    event = make_event()
+    _reserve(db, event, "Alice", 1)
+    release_quota(db, event.id, QUOTA_PHOTOS, ["Alice"])
+    db.commit()
+
+    assert reserve_quota(db, event.id, QUOTA_PHOTOS, "Alice", 1, lambda: 0) is True
+    db.rollback()  # envoi échoué
+    assert _reserve(db, event, "Alice", 1) is True
+
+
+def test_counters_are_per_event_and_kind(db, make_event):
+    event, other = make_event(), make_event()
+    assert _reserve(db, event, "Alice", 1) is True
+    assert _reserve(db, other, "Alice", 1) is True
+    assert reserve_quota(db, event.id, QUOTA_PLAYLIST, "Alice", 1, lambda: 0) is True
+    db.commit()
+    assert quota_used(db, event.id, QUOTA_PLAYLIST, "Alice") == 1
+    assert quota_used(db, event.id, QUOTA_PHOTOS, "Bob") is None
+
+
+def test_photo_upload_over_quota_is_refused(db, client, make_event):
+    event = make_event(gallery={"enabled": True, "max_photos_per_guest": 1})
+    _reserve(db, event, "Alice", 1)
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (20, 20), (200, 30, 30)).save(buffer, "JPEG")
+    response = client.post(
+        f"/api/events/{event.id}/photos",
+        data={"uploaded_by": "Alice"},
+        files={"file": ("p.jpg", buffer.getvalue(), "image/jpeg")},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Maximum 1 photos per guest reached"
@@ -0,0 +1,94 @@
+"""
+Tests de la recherche de table (simple et groupée)
+"""
+from core.models import Guest
+from events.seating import _build_seating_index, _lookup_name
+
+
+TABLES = [
+    {"name": "Table 1", "guests": ["Alice Martin", "Bob Durand"]},
+    {"name": "Table 2", "guests": ["Alicia Keys", "Chloé Petit"]},
+]
+
+
+def test_lookup_prefers_exact_match():
+    index = _build_seating_index(TABLES)
+    assert _lookup_name(index, "alicia keys ") == ("Alicia Keys", "Table 2")
+
+
+def test_lookup_falls_back_to_partial_match_in_plan_order():
+    index = _build_seating_index(TABLES)
+    assert _lookup_name(index, "ali") == ("Alice Martin", "Table 1")
+    assert _lookup_name(index, "petit") == ("Chloé Petit", "Table 2")
+
+
+def test_lookup_empty_or_unknown_name():
+    index = _build_seating_index(TABLES)
+    assert _lookup_name(index, "   ") is None
+    assert _lookup_name(index, "Zoé") is None
+
+
+def _seating_event(make_event, interactive=True, tables=TABLES):
+    return make_event(seating_plan={"enabled": True, "interactive": interactive, "tables": tables})
+
+
+def test_batch_lookup_names_and_codes(db, client, make_event):
+    tables = [dict(TABLES[0]), dict(TABLES[1])]
+    event = _seating_event(make_event, tables=tables)
+    chloe = Guest(event_id=event.id, name="Chloé Petit", personal_code="CHLOE1")
+    bob = Guest(event_id=event.id, name="Robert", personal_code="BOB1")
+    db.add_all([chloe, bob])
+    db.commit()
+    # Plan généré par l'optimiseur : Robert est retrouvé par son id
+    tables[0]["guest_ids"] = [str(bob.id)]
+    event.config = {"modules": {"seating_plan": {"enabled": True, "interactive": True, "tables": tables}}}
+    db.commit()
+
+    response = client.post(
+        f"/api/events/{event.id}/seating/lookup",
+        json={"queries": ["chloe1", "BOB1", "alice", "Inconnu"]},
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert [(r["query"], r["found"], r["table_name"]) for r in body["results"]] == [
+        ("chloe1", True, "Table 2"),
+        ("BOB1", True, "Table 1"),
+        ("alice", True, "Table 1"),
+        ("Inconnu", False, None),
+    ]
+    assert body["results"][1]["guest_name"] == "Robert"
+    assert body["found_count"] == 3
+
+
+def test_batch_lookup_ignores_codes_of_other_events(db, client, make_event):
+    event = _seating_event(make_event)
+    other = _seating_event(make_event)
+    db.add(Guest(event_id=other.id, name="Alice Martin", personal_code="ALICE1"))
+    db.commit()
+
+    response = client.post(f"/api/events/{event.id}/seating/lookup", json={"queries": ["ALICE1"]})
+    assert response.json()["results"][0]["found"] is False
+
+
+def test_batch_lookup_non_interactive_plan(client, make_event):
+    event = _seating_event(make_event, interactive=False)
+    response = client.post(f"/api/events/{event.id}/seating/lookup", json={"queries": ["Alice"]})
+    assert response.json() == {
+        "results": [{
+            "query": "Alice", "found": False, "table_name": None, "guest_name": None,
+            "message": "Consultez le plan de table affiché",
+        }],
+        "found_count": 0,
+    }
+
+
+def test_batch_lookup_sees_plan_updates(db, client, make_event):
+    event = _seating_event(make_event)
+    url = f"/api/events/{event.id}/seating/lookup"
+    assert client.post(url, json={"queries": ["Zoé"]}).json()["found_count"] == 0
+
+    # L'index en cache est reconstruit quand l'événement change (updated_at)
+    tables = TABLES + [{"name": "Table 3", "guests": ["Zoé"]}]
+    event.config = {"modules": {"seating_plan": {"enabled": True, "interactive": True, "tables": tables}}}
+    db.commit()
+    assert client.post(url, json={"queries": ["Zoé"]}).json()["results"][0]["table_name"] == "Table 3"
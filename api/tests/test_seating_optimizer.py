@@ -0,0 +1,91 @@
+"""
+Tests de l'optimiseur de plan de table
+"""
+from events.seating_optimizer import TOGETHER_WEIGHT, optimize_seating
+
+
+def _party(party_id, size=1, group=None):
+    return {"id": party_id, "size": size, "group": group, "names": [party_id.upper()]}
+
+
+def _tables_of(result):
+    return {table["name"]: set(table["guest_ids"]) for table in result["tables"]}
+
+
+def test_capacity_is_respected_and_parties_stay_together():
+    parties = [_party("a", size=3), _party("b", size=2), _party("c", size=2)]
+    tables = [{"name": "T1", "capacity": 4}, {"name": "T2", "capacity": 4}]
+    result = optimize_seating(parties, tables, seed=1)
+
+    for table in result["tables"]:
+        assert table["seats_used"] <= table["capacity"]
+    # a (3 places) ne peut partager sa table avec aucun autre groupe de places
+    placed = [ids for ids in _tables_of(result).values() if "a" in ids]
+    assert placed == [{"a"}]
+    assert result["unplaced"] == []
+
+
+def test_party_larger_than_every_table_is_unplaced():
+    parties = [_party("a", size=5), _party("b")]
+    result = optimize_seating(parties, [{"name": "T1", "capacity": 4}], seed=1)
+    assert result["unplaced"] == ["a"]
+    assert _tables_of(result) == {"T1": {"b"}}
+
+
+def test_guest_names_include_plus_ones():
+    parties = [{"id": "a", "size": 2, "group": None, "names": ["Alice", "Bob"]}]
+    result = optimize_seating(parties, [{"name": "T1", "capacity": 2}], seed=1)
+    assert result["tables"][0]["guests"] == ["Alice", "Bob"]
+    assert result["tables"][0]["seats_used"] == 2
+
+
+def test_together_and_apart_constraints():
+    parties = [_party(i) for i in "abcd"]
+    tables = [{"name": "T1", "capacity": 2}, {"name": "T2", "capacity": 2}]
+    result = optimize_seating(parties, tables, together=[["a", "c"]], apart=[["a", "b"]], seed=1)
+
+    assert result["together_satisfied"] == result["together_total"] == 1
+    assert result["apart_total"] == 1
+    assert result["apart_violated"] == 0
+    assert {"a", "c"} in _tables_of(result).values()
+
+
+def test_unknown_ids_in_constraints_are_ignored():
+    result = optimize_seating([_party("a")], [{"name": "T1", "capacity": 2}], together=[["a", "zzz"]], seed=1)
+    assert result["together_total"] == 0
+    assert result["unplaced"] == []
+
+
+def test_local_search_improves_the_greedy_plan():
+    # Le glouton assoit a avec b (T1 pleine) : c et d sont ensuite à T2
+    parties = [_party(i) for i in "abcde"]
+    tables = [{"name": "T1", "capacity": 2}, {"name": "T2", "capacity": 3}]
+    together = [["a", "c"], ["d", "b"]]
+
+    greedy = optimize_seating(parties, tables, together=together, time_budget=0, seed=1)
+    searched = optimize_seating(parties, tables, together=together, time_budget=1, seed=1)
+
+    assert greedy["score"] == 0
+    assert searched["score"] == 2 * TOGETHER_WEIGHT
+    assert searched["together_satisfied"] == 2
+    assert searched["moves"] > 0
+
+
+def test_local_search_never_lowers_the_score():
+    parties = [_party(str(i), size=1 + i % 2, group=f"g{i % 3}") for i in range(12)]
+    tables = [{"name": f"T{k}", "capacity": 5} for k in range(4)]
+    together = [["0", "5"], ["3", "8"], ["1", "10"]]
+    apart = [["0", "3"], ["5", "6"]]
+
+    greedy = optimize_seating(parties, tables, together, apart, time_budget=0, seed=3)
+    searched = optimize_seating(parties, tables, together, apart, time_budget=1, seed=3)
+    assert searched["score"] >= greedy["score"]
+    assert searched["apart_violated"] == 0
+
+
+def test_same_seed_gives_the_same_plan():
+    parties = [_party(str(i), group=f"g{i % 4}") for i in range(20)]
+    tables = [{"name": f"T{k}", "capacity": 6} for k in range(4)]
+    first = optimize_seating(parties, tables, time_budget=1, seed=42)
+    second = optimize_seating(parties, tables, time_budget=1, seed=42)
+    assert first["tables"] == second["tables"]
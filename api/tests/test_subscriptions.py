@@ -0,0 +1,141 @@
+"""
+Tests des abonnements aux topics par lots
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from notifications import subscriptions
+from notifications.subscriptions import SUBSCRIBE, TOPIC_BATCH_SIZE, TopicSubscriptionBatcher
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Remplace les appels Firebase ; les tokens "invalid*" sont refusés"""
+    recorded = []
+
+    def fake(action):
+        def call(tokens, topic):
+            recorded.append((action, topic, list(tokens)))
+            return {
+                "success": True,
+                "errors": [
+                    {"index": index, "reason": "NOT_FOUND"}
+                    for index, token in enumerate(tokens) if token.startswith("invalid")
+                ],
+            }
+        return call
+
+    monkeypatch.setattr(subscriptions, "subscribe_to_topic", fake("subscribe"))
+    monkeypatch.setattr(subscriptions, "unsubscribe_from_topic", fake("unsubscribe"))
+    monkeypatch.setenv("TOPIC_FLUSH_INTERVAL", "0.01")
+    return recorded
+
+
+@asynccontextmanager
+async def running_batcher():
+    """Batcher dont la boucle d'envoi est arrêtée en fin de test"""
+    batcher = TopicSubscriptionBatcher()
+    try:
+        yield batcher
+    finally:
+        task = batcher._flush_task
+        await batcher.stop()
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_each_request_gets_its_own_token_result(calls):
+    async with running_batcher() as batcher:
+        results = await asyncio.gather(
+            batcher.subscribe("a", "event_1"),
+            batcher.subscribe("invalid-b", "event_1"),
+            batcher.subscribe("c", "event_1"),
+        )
+        assert results == [{"success": True}, {"success": False, "error": "NOT_FOUND"}, {"success": True}]
+        # Un seul appel pour les trois appareils
+        assert calls == [("subscribe", "event_1", ["a", "invalid-b", "c"])]
+
+
+@pytest.mark.asyncio
+async def test_same_token_twice_shares_one_call(calls):
+    async with running_batcher() as batcher:
+        results = await asyncio.gather(batcher.subscribe("a", "event_1"), batcher.subscribe("a", "event_1"))
+        assert results == [{"success": True}, {"success": True}]
+        assert calls == [("subscribe", "event_1", ["a"])]
+
+
+@pytest.mark.asyncio
+async def test_topics_are_called_separately(calls):
+    async with running_batcher() as batcher:
+        await asyncio.gather(batcher.subscribe("a", "event_1"), batcher.subscribe("b", "event_2"))
+        assert sorted(calls) == [("subscribe", "event_1", ["a"]), ("subscribe", "event_2", ["b"])]
+
+
+@pytest.mark.asyncio
+async def test_tokens_are_sent_in_chunks_of_1000(calls):
+    batcher = TopicSubscriptionBatcher()
+    loop = asyncio.get_running_loop()
+    futures = []
+    for index in range(2500):
+        future = loop.create_future()
+        batcher._batch_for(SUBSCRIBE, f"t{index}", "event_1").setdefault(f"t{index}", []).append(future)
+        futures.append(future)
+
+    await batcher.flush()
+
+    assert [len(tokens) for _, _, tokens in calls] == [TOPIC_BATCH_SIZE, TOPIC_BATCH_SIZE, 500]
+    assert [token for _, _, tokens in calls for token in tokens] == [f"t{index}" for index in range(2500)]
+    assert all(future.result() == {"success": True} for future in futures)
+
+
+@pytest.mark.asyncio
+async def test_subscribe_then_unsubscribe_keeps_request_order(calls):
+    async with running_batcher() as batcher:
+        await asyncio.gather(
+            batcher.subscribe("a", "event_1"),
+            batcher.unsubscribe("a", "event_1"),
+            batcher.subscribe("b", "event_1"),
+        )
+        # b rejoint le lot d'abonnement, le désabonnement de a passe après
+        assert calls == [
+            ("subscribe", "event_1", ["a", "b"]),
+            ("unsubscribe", "event_1", ["a"]),
+        ]
+
+
+@pytest.mark.asyncio
+async def test_failed_call_fails_every_request(monkeypatch, calls):
+    async with running_batcher() as batcher:
+        monkeypatch.setattr(
+            subscriptions, "subscribe_to_topic",
+            lambda tokens, topic: {"success": False, "error": "Firebase not configured", "simulated": True}
+        )
+        results = await asyncio.gather(batcher.subscribe("a", "event_1"), batcher.subscribe("b", "event_1"))
+        assert results == [{"success": False, "error": "Firebase not configured", "simulated": True}] * 2
+
+
+@pytest.mark.asyncio
+async def test_call_exception_is_reported(monkeypatch, calls):
+    def broken(tokens, topic):
+        raise RuntimeError("connection reset")
+
+    async with running_batcher() as batcher:
+        monkeypatch.setattr(subscriptions, "subscribe_to_topic", broken)
+        assert await batcher.subscribe("a", "event_1") == {"success": False, "error": "connection reset"}
+
+
+@pytest.mark.asyncio
+async def test_flush_loop_survives_a_failed_flush(monkeypatch, calls):
+    async def broken(topic, batches):
+        raise RuntimeError("boom")
+
+    async with running_batcher() as batcher:
+        monkeypatch.setattr(batcher, "_flush_topic", broken)
+        assert await batcher.subscribe("a", "event_1") == {"success": False, "error": "Topic subscription failed"}
+
+        monkeypatch.delattr(batcher, "_flush_topic")
+        assert await batcher.subscribe("a", "event_1") == {"success": True}
+        assert not batcher._flush_task.done()
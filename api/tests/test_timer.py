@@ -0,0 +1,107 @@
+"""
+Tests du timer des notifications programmées (tas des échéances)
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from notifications import timer as timer_module
+from notifications.timer import LOAD_LIMIT, NotificationTimer
+
+
+NOW = datetime(2026, 6, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _timer(*due):
+    """Timer dont le tas contient les échéances (décalage en secondes, id)"""
+    timer = NotificationTimer(resync_seconds=300)
+    timer._wakeup = asyncio.Event()
+    timer._heap = sorted((NOW + timedelta(seconds=offset), notification_id) for offset, notification_id in due)
+    return timer
+
+
+def test_pop_due_removes_past_entries_only():
+    timer = _timer((-5, "a"), (0, "b"), (30, "c"))
+    assert timer._pop_due(NOW) is True
+    assert timer._heap == [(NOW + timedelta(seconds=30), "c")]
+
+
+def test_pop_due_nothing_due():
+    timer = _timer((30, "c"))
+    assert timer._pop_due(NOW) is False
+    assert len(timer._heap) == 1
+
+
+def test_cancelled_entry_is_skipped():
+    timer = _timer((-5, "a"))
+    timer._on_message("cancelled", {"id": "a"})
+    assert timer._wakeup.is_set()
+    assert timer._pop_due(NOW) is False
+    assert timer._heap == []
+    assert "a" not in timer._cancelled
+
+
+def test_cancelled_entry_does_not_hide_other_due_entries():
+    timer = _timer((-5, "a"), (-1, "b"))
+    timer._on_message("cancelled", {"id": "a"})
+    assert timer._pop_due(NOW) is True
+
+
+def test_rescheduled_after_cancel_is_due():
+    timer = _timer()
+    timer._on_message("cancelled", {"id": "a"})
+    timer._on_message("scheduled", {"id": "a", "scheduled_at": (NOW - timedelta(seconds=1)).isoformat()})
+    assert timer._pop_due(NOW) is True
+
+
+def test_scheduled_message_keeps_heap_order():
+    timer = _timer((60, "late"))
+    timer._on_message("scheduled", {"id": "soon", "scheduled_at": (NOW + timedelta(seconds=5)).isoformat()})
+    assert timer._heap[0][1] == "soon"
+
+
+def test_load_sets_aside_entries_already_due_before_the_pass():
+    timer = NotificationTimer(resync_seconds=300)
+    rows = [(NOW - timedelta(seconds=10), "stuck"), (NOW + timedelta(seconds=10), "next")]
+    timer._load(rows, stalled_before=NOW)
+    assert timer._heap == [(NOW + timedelta(seconds=10), "next")]
+    assert timer.stats["stalled"] == 1
+
+
+def test_load_does_not_reload_when_a_full_batch_is_set_aside():
+    timer = NotificationTimer(resync_seconds=300)
+    rows = [(NOW - timedelta(seconds=1), str(i)) for i in range(LOAD_LIMIT)]
+    timer._load(rows, stalled_before=NOW)
+    assert timer._heap == []
+    assert timer._truncated is False
+
+    timer._load(rows)
+    assert timer._truncated is True
+
+
+@pytest.mark.asyncio
+async def test_unclaimable_due_row_does_not_spin(monkeypatch):
+    """Ligne due verrouillée par un autre runner : pas de boucle de passages"""
+    import notifications.scheduler
+
+    runs = []
+    monkeypatch.setattr(timer_module.pubsub, "subscribe", lambda *args: None)
+    monkeypatch.setattr(timer_module.pubsub, "unsubscribe", lambda *args: None)
+    # La ligne reste due après chaque passage (SKIP LOCKED)
+    monkeypatch.setattr(
+        timer_module, "_load_due_times",
+        lambda: [(datetime.now(timezone.utc) - timedelta(seconds=1), "locked")]
+    )
+    monkeypatch.setattr(notifications.scheduler, "process_scheduled_notifications", lambda: runs.append(1))
+
+    timer = NotificationTimer(resync_seconds=300)
+    task = asyncio.create_task(timer.run())
+    await asyncio.sleep(0.3)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # Resynchronisation + un passage, puis attente de la prochaine resynchronisation
+    assert len(runs) == 2
+    assert timer.stats["stalled"] == 1
@@ -0,0 +1,156 @@
+"""
+Tests des uploads de photos et d'assets
+"""
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from core import storage as storage_module
+from core.models import Photo
+from core.storage import LocalStorage
+from photos import routes as photo_routes
+from uploads import routes as upload_routes
+
+
+def _image(format="JPEG", size=(64, 48), color=(200, 10, 10)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format)
+    return buffer.getvalue()
+
+
+def _upload(client, event, content, filename="photo.jpg", content_type="image/jpeg"):
+    return client.post(
+        f"/api/events/{event.id}/photos",
+        data={"uploaded_by": "Léa"},
+        files={"file": (filename, content, content_type)},
+    )
+
+
+@pytest.fixture
+def local_storage(monkeypatch, tmp_path):
+    """Stockage local dans un dossier temporaire, sans génération des miniatures"""
+    storage = LocalStorage(str(tmp_path), "http://media.test", "http://testserver/api/uploads/direct", "secret")
+    monkeypatch.setattr(storage_module, "_storage", storage)
+    monkeypatch.setattr(photo_routes, "schedule_photo_processing", lambda *args: None)
+    return storage
+
+
+@pytest.fixture
+def no_staging(monkeypatch):
+    """Échoue si le fichier est copié : la requête doit être refusée avant"""
+    async def stage_upload(file, max_size):
+        raise AssertionError("upload should have been rejected on Content-Length")
+
+    monkeypatch.setattr(photo_routes, "stage_upload", stage_upload)
+    monkeypatch.setattr(upload_routes, "stage_upload", stage_upload)
+
+
+def test_photo_larger_than_content_length_limit_is_rejected_early(client, make_event, monkeypatch, no_staging):
+    monkeypatch.setattr(photo_routes.upload_photo, "max_upload_size", 1024)
+    event = make_event(gallery={"enabled": True})
+    response = client.post(
+        f"/api/events/{event.id}/photos",
+        files={"file": ("photo.jpg", b"\xff" * 200_000, "image/jpeg")},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Fichier trop volumineux")
+
+
+def test_asset_larger_than_content_length_limit_is_rejected_early(client, monkeypatch, no_staging):
+    monkeypatch.setattr(upload_routes.upload_asset, "max_upload_size", 1024)
+    response = client.post("/api/upload", files={"file": ("logo.png", b"\x89" * 200_000, "image/png")})
+    assert response.status_code == 400
+
+
+def test_photo_within_limit_is_stored(client, make_event, local_storage):
+    event = make_event(gallery={"enabled": True})
+    response = _upload(client, event, _image())
+    assert response.status_code == 201
+    assert (response.json()["width"], response.json()["height"]) == (64, 48)
+
+
+def test_storage_key_uses_the_detected_format(client, make_event, local_storage):
+    event, other = make_event(gallery={"enabled": True}), make_event(gallery={"enabled": True})
+    content = _image("PNG")
+    digest = hashlib.sha256(content).hexdigest()[:32]
+
+    first = _upload(client, event, content, filename="photo.jpeg", content_type="image/png").json()
+    second = _upload(client, other, content, filename="photo.JPG", content_type="image/png").json()
+    assert first["url"] == f"http://media.test/savethedate/{event.id}/photos/{digest}.png"
+    assert second["url"] == f"http://media.test/savethedate/{other.id}/photos/{digest}.png"
+
+
+def test_invalid_image_is_rejected(client, make_event, local_storage):
+    event = make_event(gallery={"enabled": True})
+    response = _upload(client, event, b"not an image")
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def quota_race(monkeypatch):
+    """Quota atteint par un envoi concurrent entre la vérification et l'insertion"""
+    def reserve(db, event_id, uploaded_by, gallery_config):
+        raise HTTPException(status_code=400, detail="Maximum 1 photos per guest reached")
+
+    deleted = []
+    monkeypatch.setattr(photo_routes, "_reserve_photo_quota", reserve)
+    monkeypatch.setattr(photo_routes, "schedule_delete_keys", lambda keys, delay=0: deleted.extend(keys))
+    return deleted
+
+
+def test_quota_race_deletes_the_stored_photo(client, make_event, local_storage, quota_race):
+    event = make_event(gallery={"enabled": True})
+    content = _image()
+    assert _upload(client, event, content).status_code == 400
+    digest = hashlib.sha256(content).hexdigest()[:32]
+    assert quota_race == [f"savethedate/{event.id}/photos/{digest}.jpg"]
+
+
+def test_quota_race_keeps_a_photo_used_elsewhere(db, client, make_event, local_storage, quota_race):
+    event = make_event(gallery={"enabled": True})
+    content = _image()
+    key = f"savethedate/{event.id}/photos/{hashlib.sha256(content).hexdigest()[:32]}.jpg"
+    db.add(Photo(event_id=event.id, url="http://media.test/photo.jpg", storage_key=key))
+    db.commit()
+
+    assert _upload(client, event, content).status_code == 400
+    assert quota_race == []
+
+
+def _direct_upload(client, event, content, content_type="image/jpeg", sent_type=None):
+    signed = client.post(
+        f"/api/events/{event.id}/photos/upload-url",
+        json={"content_type": content_type, "size": len(content), "filename": "photo.jpg"},
+    ).json()
+    put = client.put(signed["url"], content=content, headers={"Content-Type": sent_type or content_type})
+    return signed["key"], put
+
+
+def test_direct_upload_is_checked_on_completion(client, make_event, local_storage):
+    event = make_event(gallery={"enabled": True})
+    key, put = _direct_upload(client, event, _image("PNG"), content_type="image/png")
+    assert put.status_code == 200
+
+    response = client.post(f"/api/events/{event.id}/photos/complete", json={"key": key})
+    assert response.status_code == 201
+    assert (response.json()["width"], response.json()["height"]) == (64, 48)
+
+
+def test_direct_upload_content_type_is_signed(client, make_event, local_storage):
+    event = make_event(gallery={"enabled": True})
+    _, put = _direct_upload(client, event, _image(), sent_type="image/png")
+    assert put.status_code == 403
+
+
+def test_direct_upload_that_is_not_an_image_is_discarded(client, make_event, local_storage):
+    event = make_event(gallery={"enabled": True})
+    key, put = _direct_upload(client, event, b"not an image")
+    assert put.status_code == 200
+
+    response = client.post(f"/api/events/{event.id}/photos/complete", json={"key": key})
+    assert response.status_code == 400
+    assert not os.path.exists(local_storage.path(key))
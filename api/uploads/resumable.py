@@ -0,0 +1,193 @@
+"""
+Uploads reprenables (gros fichiers / vidéos)
+
+Protocole :
+1. POST   /api/uploads/sessions                 -> crée une session (upload_id)
+2. PUT    /api/uploads/sessions/{id}?offset=N   -> envoie un morceau à partir de l'octet N
+3. GET    /api/uploads/sessions/{id}            -> offset actuel (après une coupure réseau)
+4. POST   /api/uploads/sessions/{id}/complete   -> envoie le fichier assemblé au stockage
+
+Les morceaux sont ajoutés au fil de l'eau dans un fichier .part sur disque :
+après une coupure, les octets déjà reçus sont conservés et le client
+reprend à l'offset retourné par le serveur.
+
+L'état des sessions est stocké sur disque (fichier .json à côté du .part)
+pour survivre à un redémarrage de l'API.
+"""
+import os
+import json
+import time
+import fcntl
+import uuid
+import tempfile
+from typing import Optional, Dict, Any, AsyncIterator, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from core.storage import CHUNK_SIZE, StagedFile
+
+# Durée de vie d'une session inactive
+SESSION_TTL_SECONDS = 24 * 3600
+
+
+class UploadSessionError(Exception):
+    """Erreur de protocole d'upload reprenable"""
+
+    def __init__(self, status_code: int, detail: str, offset: Optional[int] = None):
+        self.status_code = status_code
+        self.detail = detail
+        self.offset = offset
+        super().__init__(detail)
+
+
+def _get_sessions_dir() -> str:
+    """Dossier des sessions (UPLOAD_SESSIONS_DIR, partagé entre workers)"""
+    default = os.path.join(tempfile.gettempdir(), "oninvite_uploads")
+    sessions_dir = os.environ.get("UPLOAD_SESSIONS_DIR", default)
+    os.makedirs(sessions_dir, exist_ok=True)
+    return sessions_dir
+
+
+def _paths(upload_id: str):
+    # upload_id est un UUID hex : pas de risque de sortie du dossier
+    if not upload_id.isalnum():
+        raise UploadSessionError(404, "Upload session not found")
+    base = os.path.join(_get_sessions_dir(), upload_id)
+    return f"{base}.json", f"{base}.part"
+
+
+def _read_meta(upload_id: str) -> Dict[str, Any]:
+    meta_path, _ = _paths(upload_id)
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise UploadSessionError(404, "Upload session not found")
+
+
+def _current_offset(upload_id: str) -> int:
+    _, part_path = _paths(upload_id)
+    try:
+        return os.path.getsize(part_path)
+    except FileNotFoundError:
+        raise UploadSessionError(404, "Upload session not found")
+
+
+def purge_expired_sessions():
+    """Supprime les sessions inactives depuis plus de SESSION_TTL_SECONDS"""
+    sessions_dir = _get_sessions_dir()
+    now = time.time()
+    for name in os.listdir(sessions_dir):
+        # L'activité d'une session se lit sur son .part (modifié à chaque morceau)
+        path = os.path.join(sessions_dir, name.split(".", 1)[0] + ".part")
+        try:
+            if now - os.path.getmtime(path) <= SESSION_TTL_SECONDS:
+                continue
+        except FileNotFoundError:
+            pass
+        try:
+            os.remove(os.path.join(sessions_dir, name))
+        except FileNotFoundError:
+            pass
+
+
+def create_session(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Crée une session vide et retourne son état"""
+    purge_expired_sessions()
+
+    upload_id = uuid.uuid4().hex
+    meta_path, part_path = _paths(upload_id)
+    meta = dict(metadata, upload_id=upload_id, created_at=time.time())
+    open(part_path, "wb").close()
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+
+    return session_status(upload_id)
+
+
+def session_status(upload_id: str) -> Dict[str, Any]:
+    """État d'une session (offset = nombre d'octets déjà reçus)"""
+    meta = _read_meta(upload_id)
+    offset = _current_offset(upload_id)
+    return {
+        "upload_id": upload_id,
+        "offset": offset,
+        "size": meta["size"],
+        "complete": offset == meta["size"],
+        "chunk_size": CHUNK_SIZE,
+        "expires_in": SESSION_TTL_SECONDS,
+    }
+
+
+async def append_chunk(upload_id: str, offset: int, body: AsyncIterator[bytes]) -> Dict[str, Any]:
+    """
+    Ajoute les octets reçus à la session, à partir de offset.
+
+    Les octets sont écrits au fur et à mesure : si la connexion coupe,
+    ce qui a été reçu est conservé. Un verrou empêche deux envois
+    simultanés sur la même session (même depuis deux workers).
+    """
+    meta = _read_meta(upload_id)
+    _, part_path = _paths(upload_id)
+
+    out = open(part_path, "ab")
+    try:
+        try:
+            fcntl.flock(out.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadSessionError(409, "Another chunk is being uploaded", _current_offset(upload_id))
+
+        current = os.fstat(out.fileno()).st_size
+        if offset != current:
+            raise UploadSessionError(409, "Offset mismatch", current)
+
+        written = current
+        async for chunk in body:
+            if not chunk:
+                continue
+            if written + len(chunk) > meta["size"]:
+                raise UploadSessionError(400, "Chunk exceeds declared file size", written)
+            await run_in_threadpool(out.write, chunk)
+            written += len(chunk)
+        out.flush()
+    finally:
+        # La fermeture libère aussi le verrou
+        out.close()
+
+    return session_status(upload_id)
+
+
+def finalize_session(upload_id: str) -> Tuple[StagedFile, Dict[str, Any]]:
+    """
+    Vérifie que la session est complète et retourne le fichier assemblé
+    (à envoyer au stockage) avec les métadonnées de la session.
+
+    Le fichier retourné est un lien vers le .part : si l'envoi au stockage
+    échoue, la session reste intacte et /complete peut être rappelé.
+    Appeler abort_session() une fois l'envoi réussi.
+    """
+    meta = _read_meta(upload_id)
+    offset = _current_offset(upload_id)
+    if offset != meta["size"]:
+        raise UploadSessionError(409, "Upload is incomplete", offset)
+
+    _, part_path = _paths(upload_id)
+    final_path = f"{part_path}.{uuid.uuid4().hex[:8]}"
+    os.link(part_path, final_path)
+    staged = StagedFile(
+        final_path,
+        offset,
+        meta.get("content_type", ""),
+        meta.get("filename", "")
+    )
+    return staged, meta
+
+
+def abort_session(upload_id: str):
+    """Supprime une session et les octets reçus"""
+    _read_meta(upload_id)
+    for path in _paths(upload_id):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -4,20 +4,19 @@ Routes pour l'upload d'assets (logos, icônes, images)
 import os
 import uuid
 from typing import Optional
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Header
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Header, Query, Request
+from pydantic import BaseModel, Field
 
-router = APIRouter()
+from core.storage import (
+    ALLOWED_IMAGE_TYPES, ALLOWED_VIDEO_TYPES, MAX_IMAGE_SIZE, MAX_VIDEO_SIZE,
+    FileTooLargeError, LocalStorage, StorageError, UploadLimitRoute,
+    get_storage, max_upload_size, stage_stream, stage_upload
+)
+from . import resumable
 
-# Configuration Cloudinary
-CLOUDINARY_URL = os.environ.get("CLOUDINARY_URL", "")
-ADMIN_API_KEY = os.environ.get("ADMIN_API_KEY", "")
+router = APIRouter(route_class=UploadLimitRoute)
 
-# Types de fichiers autorisés
-ALLOWED_IMAGE_TYPES = ["image/jpeg", "image/png", "image/webp", "image/gif", "image/svg+xml"]
-ALLOWED_VIDEO_TYPES = ["video/mp4", "video/webm", "video/quicktime"]
-MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10 MB
-MAX_VIDEO_SIZE = 100 * 1024 * 1024  # 100 MB
+ADMIN_API_KEY = os.environ.get("ADMIN_API_KEY", "")
 
 
 def verify_admin_key(x_api_key: Optional[str] = Header(None)):
@@ -29,7 +28,50 @@ def verify_admin_key(x_api_key: Optional[str] = Header(None)):
     return True
 
 
+def _check_content_type(content_type: str, asset_type: str):
+    """Vérifie le type de fichier selon le type d'asset"""
+    allowed = ALLOWED_VIDEO_TYPES if asset_type == "video" else ALLOWED_IMAGE_TYPES
+    if content_type not in allowed:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Type de fichier non autorisé. Types acceptés: {allowed}"
+        )
+
+
+def _build_upload_path(folder: str, event_id: Optional[str], file_ext: str) -> str:
+    """Construit le chemin unique de l'asset"""
+    unique_id = str(uuid.uuid4())[:8]
+    if event_id:
+        return f"savethedate/{event_id}/{folder}/{unique_id}.{file_ext}"
+    return f"savethedate/{folder}/{unique_id}.{file_ext}"
+
+
+async def _store_asset(staged, upload_path: str, asset_type: str) -> dict:
+    """Envoie un fichier reçu au stockage et construit la réponse"""
+    storage = get_storage()
+    try:
+        stored = await storage.save(
+            staged,
+            upload_path,
+            resource_type="video" if asset_type == "video" else "image"
+        )
+    except StorageError as e:
+        raise HTTPException(status_code=502, detail=f"Upload failed: {e}")
+    
+    return {
+        "success": True,
+        "url": stored["url"],
+        "public_id": stored["key"],
+        "format": stored.get("format"),
+        "width": stored.get("width"),
+        "height": stored.get("height"),
+        "size": stored["size"],
+        "storage": storage.name
+    }
+
+
 @router.post("/upload")
+@max_upload_size(MAX_VIDEO_SIZE)  # type d'asset inconnu avant la lecture du formulaire
 async def upload_asset(
     file: UploadFile = File(...),
     folder: str = Form("assets"),
@@ -41,99 +83,26 @@ async def upload_asset(
     Upload un asset (image, logo, icône, vidéo)
     
     Retourne l'URL de l'asset uploadé.
-    Utilise Cloudinary si configuré, sinon simule avec placeholder.
+    Utilise le backend de stockage configuré (Cloudinary ou disque local).
     """
     verify_admin_key(x_api_key)
     
     # Vérifier le type de fichier
-    content_type = file.content_type or ""
-    
-    if asset_type == "video":
-        if content_type not in ALLOWED_VIDEO_TYPES:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Type de fichier non autorisé. Types acceptés: {ALLOWED_VIDEO_TYPES}"
-            )
-    else:
-        if content_type not in ALLOWED_IMAGE_TYPES:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Type de fichier non autorisé. Types acceptés: {ALLOWED_IMAGE_TYPES}"
-            )
-    
-    # Lire le fichier
-    file_content = await file.read()
-    file_size = len(file_content)
-    
-    # Vérifier la taille
+    _check_content_type(file.content_type or "", asset_type)
+    
+    # Copier le fichier reçu (Content-Length déjà vérifié par la route,
+    # à la taille max des vidéos ; celle des images est vérifiée ici)
     max_size = MAX_VIDEO_SIZE if asset_type == "video" else MAX_IMAGE_SIZE
-    if file_size > max_size:
+    try:
+        staged = await stage_upload(file, max_size)
+    except FileTooLargeError:
         raise HTTPException(
             status_code=400,
             detail=f"Fichier trop volumineux. Taille max: {max_size // (1024*1024)} MB"
         )
     
-    # Générer un nom unique
-    file_ext = file.filename.split(".")[-1] if "." in file.filename else "jpg"
-    unique_id = str(uuid.uuid4())[:8]
-    
-    # Construire le chemin
-    if event_id:
-        upload_path = f"savethedate/{event_id}/{folder}/{unique_id}.{file_ext}"
-    else:
-        upload_path = f"savethedate/{folder}/{unique_id}.{file_ext}"
-    
-    # Upload vers Cloudinary si configuré
-    if CLOUDINARY_URL:
-        try:
-            import cloudinary
-            import cloudinary.uploader
-            
-            # Parse the cloudinary URL
-            cloudinary.config(cloudinary_url=CLOUDINARY_URL)
-            
-            # Upload options
-            upload_options = {
-                "public_id": upload_path.rsplit(".", 1)[0],  # Sans extension
-                "resource_type": "video" if asset_type == "video" else "image",
-                "overwrite": True,
-            }
-            
-            # Optimisations pour les images
-            if asset_type != "video":
-                upload_options["transformation"] = [
-                    {"quality": "auto:good", "fetch_format": "auto"}
-                ]
-            
-            # Upload
-            result = cloudinary.uploader.upload(file_content, **upload_options)
-            
-            return {
-                "success": True,
-                "url": result["secure_url"],
-                "public_id": result["public_id"],
-                "format": result.get("format"),
-                "width": result.get("width"),
-                "height": result.get("height"),
-                "size": file_size
-            }
-            
-        except Exception as e:
-            print(f"Cloudinary upload error: {e}")
-            # Fallback vers simulation
-    
-    # Simulation (pour dev sans Cloudinary)
-    simulated_url = f"https://res.cloudinary.com/demo/image/upload/{upload_path}"
-    
-    return {
-        "success": True,
-        "url": simulated_url,
-        "public_id": upload_path,
-        "format": file_ext,
-        "size": file_size,
-        "simulated": True,
-        "message": "Mode simulation - configurez CLOUDINARY_URL pour upload réel"
-    }
+    upload_path = _build_upload_path(folder, event_id, staged.extension)
+    return await _store_asset(staged, upload_path, asset_type)
 
 
 @router.delete("/upload/{public_id:path}")
@@ -146,23 +115,176 @@ async def delete_asset(
     """
     verify_admin_key(x_api_key)
     
-    if CLOUDINARY_URL:
-        try:
-            import cloudinary
-            import cloudinary.uploader
-            
-            cloudinary.config(cloudinary_url=CLOUDINARY_URL)
-            result = cloudinary.uploader.destroy(public_id)
-            
-            return {
-                "success": result.get("result") == "ok",
-                "public_id": public_id
-            }
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    try:
+        deleted = await get_storage().delete(public_id)
+    except StorageError as e:
+        raise HTTPException(status_code=500, detail=str(e))
     
     return {
-        "success": True,
-        "public_id": public_id,
-        "simulated": True
+        "success": deleted,
+        "public_id": public_id
+    }
+
+
+# === Uploads reprenables (gros fichiers / vidéos) ===
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    content_type: str
+    size: int = Field(..., gt=0)
+    folder: str = "assets"
+    event_id: Optional[str] = None
+    asset_type: str = "video"  # image, icon, video
+
+
+def _session_error(e: resumable.UploadSessionError) -> HTTPException:
+    """Convertit une erreur de session ; l'offset courant est renvoyé en en-tête"""
+    headers = {"Upload-Offset": str(e.offset)} if e.offset is not None else None
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers=headers)
+
+
+@router.post("/uploads/sessions", status_code=201)
+async def create_upload_session(
+    data: UploadSessionCreate,
+    x_api_key: Optional[str] = Header(None)
+):
+    """
+    Démarre un upload reprenable.
+    Le client envoie ensuite le fichier par morceaux avec PUT.
+    """
+    verify_admin_key(x_api_key)
+    _check_content_type(data.content_type, data.asset_type)
+    
+    max_size = MAX_VIDEO_SIZE if data.asset_type == "video" else MAX_IMAGE_SIZE
+    if data.size > max_size:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Fichier trop volumineux. Taille max: {max_size // (1024*1024)} MB"
+        )
+    
+    return resumable.create_session(data.model_dump())
+
+
+@router.get("/uploads/sessions/{upload_id}")
+async def get_upload_session(
+    upload_id: str,
+    x_api_key: Optional[str] = Header(None)
+):
+    """Retourne l'offset à partir duquel reprendre l'envoi"""
+    verify_admin_key(x_api_key)
+    try:
+        return resumable.session_status(upload_id)
+    except resumable.UploadSessionError as e:
+        raise _session_error(e)
+
+
+@router.put("/uploads/sessions/{upload_id}")
+async def upload_session_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Position du premier octet envoyé"),
+    x_api_key: Optional[str] = Header(None)
+):
+    """
+    Envoie un morceau du fichier (corps brut de la requête).
+    En cas de décalage, répond 409 avec l'offset attendu (en-tête Upload-Offset).
+    """
+    verify_admin_key(x_api_key)
+    try:
+        return await resumable.append_chunk(upload_id, offset, request.stream())
+    except resumable.UploadSessionError as e:
+        raise _session_error(e)
+
+
+@router.post("/uploads/sessions/{upload_id}/complete")
+async def complete_upload_session(
+    upload_id: str,
+    x_api_key: Optional[str] = Header(None)
+):
+    """Termine l'upload : le fichier assemblé est envoyé au stockage"""
+    verify_admin_key(x_api_key)
+    try:
+        staged, meta = resumable.finalize_session(upload_id)
+    except resumable.UploadSessionError as e:
+        raise _session_error(e)
+    
+    upload_path = _build_upload_path(meta["folder"], meta.get("event_id"), staged.extension)
+    result = await _store_asset(staged, upload_path, meta["asset_type"])
+    resumable.abort_session(upload_id)
+    return result
+
+
+@router.delete("/uploads/sessions/{upload_id}")
+async def abort_upload_session(
+    upload_id: str,
+    x_api_key: Optional[str] = Header(None)
+):
+    """Annule un upload reprenable"""
+    verify_admin_key(x_api_key)
+    try:
+        resumable.abort_session(upload_id)
+    except resumable.UploadSessionError as e:
+        raise _session_error(e)
+    return {"success": True, "upload_id": upload_id}
+
+
+# === Upload direct (stockage local) ===
+
+@router.put("/uploads/direct/{key:path}")
+async def direct_upload_local(
+    key: str,
+    request: Request,
+    expires: int = Query(...),
+    max_size: int = Query(...),
+    signature: str = Query(...)
+):
+    """
+    Reçoit un upload direct signé quand le stockage est local (dev / tests).
+
+    Remplace l'upload signé Cloudinary : l'URL est générée par
+    sign_upload() et le corps de la requête est le fichier brut.
+    """
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(status_code=404, detail="Not found")
+    
+    # Content-Type signé : celui annoncé lors de la demande d'URL
+    content_type = request.headers.get("content-type", "")
+    try:
+        storage.check_upload_signature(key, expires, max_size, content_type, signature)
+    except StorageError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    
+    try:
+        staged = await stage_stream(request.stream(), max_size, content_type, key)
+    except FileTooLargeError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Fichier trop volumineux. Taille max: {max_size // (1024*1024)} MB"
+        )
+    
+    try:
+        stored = await storage.save(staged, key)
+    except StorageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"success": True, "key": stored["key"], "size": stored["size"]}
+
+
+@router.get("/media/stats")
+async def get_media_stats(
+    x_api_key: Optional[str] = Header(None)
+):
+    """
+    Statistiques du traitement des médias (miniatures, débit)
+    """
+    verify_admin_key(x_api_key)
+    
+    from photos.processing import stats as processing_stats
+    
+    storage = get_storage()
+    return {
+        "storage": storage.name,
+        "storage_calls": storage.stats(),
+        "processing": processing_stats.as_dict()
     }